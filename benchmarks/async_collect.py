@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Poll many DataNode targets from one event loop with collect_async, against collect() on a thread per target.
+Every target is a local jmx server of the test/datanode payload, which answers after -l seconds like a busy host.
+Both ways send at most -c requests at once to a target. Checks that they return the same samples.
+Run from the repository root: python benchmarks/async_collect.py [-t TARGETS] [-c HOST_CONCURRENCY] [-l LATENCY]
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter import HDFSDataNodeMetricCollector, aio, decoder, jmx, utils  # noqa: E402
+
+from compression import load_payload  # noqa: E402
+
+
+def serve(payload, latency):
+    beans = decoder.loads(payload)['beans']
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            query = parse_qs(urlparse(self.path).query)
+            wanted = jmx.query_matcher([{'qry': query['qry'][0]}]) if 'qry' in query else None
+            body = json.dumps({'beans': [b for b in beans if wanted is None or wanted(b['name'])]}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def samples(families):
+    return sorted((s.name, tuple(sorted(s.labels.items())), s.value) for f in families for s in f.samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='collect_async on one event loop against collect() on threads.')
+    parser.add_argument('-t', dest='targets', type=int, default=200,
+                        help='Number of targets. (default: 200)')
+    parser.add_argument('-c', dest='host_concurrency', type=int, default=1,
+                        help='Max number of requests in flight against one target. (default: 1)')
+    parser.add_argument('-l', dest='latency', type=float, default=0.1,
+                        help='Seconds a jmx server takes to answer. (default: 0.1)')
+    parser.add_argument('-d', dest='directory', default='test',
+                        help='Directory of the jmx payloads. (default: test)')
+    args = parser.parse_args()
+
+    payload = load_payload(os.path.join(args.directory, 'datanode'))
+    servers = [serve(payload, args.latency) for _ in range(args.targets)]
+    urls = ['http://127.0.0.1:{0}/jmx'.format(httpd.server_address[1]) for httpd in servers]
+    utils.set_host_concurrency(args.host_concurrency)
+
+    def threads():
+        collectors = [HDFSDataNodeMetricCollector('cluster_{0}'.format(i), url) for i, url in enumerate(urls)]
+        with ThreadPoolExecutor(max_workers=args.targets) as executor:
+            return list(executor.map(lambda c: list(c.collect()), collectors))
+
+    async def event_loop():
+        collectors = [HDFSDataNodeMetricCollector('cluster_{0}'.format(i), url) for i, url in enumerate(urls)]
+        async with aio.Session(host_concurrency=args.host_concurrency) as session:
+            return await asyncio.gather(*[c.collect_async(session) for c in collectors])
+
+    print("{0} targets answering in {1}s".format(args.targets, args.latency))
+    print("{0:<28} {1:>10} {2:>10} {3:>10}".format('way', 'seconds', 'cpu s', 'threads'))
+    results = {}
+    for name, run in (('collect() on threads', threads), ('collect_async on one loop', lambda: asyncio.run(event_loop()))):
+        start, cpu = time.time(), time.process_time()
+        results[name] = run()
+        # the cpu time includes the jmx servers, which are the same for both.
+        print("{0:<28} {1:>10.2f} {2:>10.2f} {3:>10}".format(
+            name, time.time() - start, time.process_time() - cpu, args.targets if 'threads' in name else 1))
+    same = [samples(f) for f in results['collect() on threads']] == [samples(f) for f in results['collect_async on one loop']]
+    print("same samples: {0}".format(same))
+    for httpd in servers:
+        httpd.shutdown()
+    sys.exit(0 if same else 1)
+
+
+if __name__ == '__main__':
+    main()
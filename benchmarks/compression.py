@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Size and time of the gzip responses of the test/ payloads: compressed for every request,
+against the compressed fragments kept by server.ResponseCache until the next poll.
+Run from the repository root: python benchmarks/compression.py [-n NUMBER] [-c COPIES]
+'''
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prometheus_client import CollectorRegistry  # noqa: E402
+
+from hadoop_exporter import (  # noqa: E402
+    HDFSDataNodeMetricCollector, HDFSNameNodeMetricCollector, HBaseRegionServerMetricCollector,
+    YARNResourceManagerMetricCollector, decoder, exposition, server)
+from hadoop_exporter.scheduler import SnapshotCollector  # noqa: E402
+
+FIXTURES = (
+    ('namenode', HDFSNameNodeMetricCollector),
+    ('datanode', HDFSDataNodeMetricCollector),
+    ('yarn', YARNResourceManagerMetricCollector),
+    ('hbase', HBaseRegionServerMetricCollector),
+)
+
+
+def load_payload(directory):
+    beans = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            doc = json.load(f)
+        if isinstance(doc, dict) and 'beans' in doc:
+            beans.extend(doc['beans'])
+        elif isinstance(doc, dict):
+            beans.append(doc)
+        else:
+            beans.extend(doc)
+    return json.dumps({'beans': beans}).encode('utf-8')
+
+
+class PublicRegistry(object):
+    '''
+    A registry with only the public collect(), like one whose private attributes changed.
+    '''
+
+    def __init__(self, registry):
+        self._registry = registry
+
+    def collect(self):
+        return self._registry.collect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gzip responses, compressed per request or cached per snapshot.')
+    parser.add_argument('-n', dest='number', type=int, default=20,
+                        help='Requests per mode. (default: 20)')
+    parser.add_argument('-c', dest='copies', type=int, default=20,
+                        help='Collectors polled from each payload, e.g. one per cluster. (default: 20)')
+    parser.add_argument('-d', dest='directory', default='test',
+                        help='Directory of the jmx payloads. (default: test)')
+    args = parser.parse_args()
+
+    registry = CollectorRegistry(auto_describe=False)
+    for directory, cls in FIXTURES:
+        payload = load_payload(os.path.join(args.directory, directory))
+        for copy in range(args.copies):
+            collector = cls('cluster_{0}'.format(copy), 'http://127.0.0.1/jmx')
+            collector._fetch_beans = lambda payload=payload: decoder.loads(payload)['beans']
+            snapshot = SnapshotCollector(collector)
+            snapshot.poll()
+            registry.register(snapshot)
+
+    cache = server.ResponseCache(registry)
+    text = exposition.generate(registry)
+    body = cache.body('text', 'gzip')
+    same = gzip.decompress(body) == text
+    # without the private attributes, the registry is collected as a whole.
+    fallback = server.ResponseCache(PublicRegistry(registry)).body('text', 'gzip')
+    same = same and gzip.decompress(fallback) == text
+    print("cached and fallback responses match the exposition: {0}".format(same))
+    modes = (
+        ('text', lambda: exposition.generate(registry)),
+        ('gzip per request', lambda: gzip.compress(exposition.generate(registry), server.COMPRESS_LEVEL)),
+        ('gzip cached', lambda: cache.body('text', 'gzip')),
+    )
+    print("{0:<20} {1:>12} {2:>12}".format('response', 'bytes', 'ms'))
+    for name, respond in modes:
+        size = len(respond())
+        seconds = min(timeit.repeat(respond, number=args.number, repeat=3)) / args.number
+        print("{0:<20} {1:>12} {2:>12.2f}".format(name, size, seconds * 1e3))
+    sys.exit(0 if same else 1)
+
+
+if __name__ == '__main__':
+    main()
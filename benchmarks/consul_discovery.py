@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Consul discovery against a local stand-in of the Consul catalog endpoints, which answers blocking queries like
+Consul: a query with the current index waits for a change or for its wait time.
+Registers tagged DataNode and NodeManager services, then changes them and prints how long the targets take to
+follow, and how many requests the watches send while the catalog is idle. Checks that only the changed instances
+are added or removed.
+Run from the repository root: python benchmarks/consul_discovery.py [-n INSTANCES] [-w WAIT] [-i IDLE]
+'''
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter.consul_discovery import ConsulDiscovery, wait_seconds  # noqa: E402
+
+MODULES = {'hdfs.datanode': None, 'yarn.nodemanager': None}
+
+
+class Catalog(object):
+    '''
+    A stand-in of the Consul catalog: /v1/catalog/services and /v1/catalog/service/<name>, with blocking queries.
+    The index of a service is the index of its last change, the index of the services the last change of any.
+    '''
+
+    def __init__(self):
+        self.index = 1
+        # name -> (index, [instances])
+        self.services = {}
+        self.requests = 0
+        self._cond = threading.Condition()
+        catalog = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # the headers and the body are sent apart, Nagle would hold the body for the ack of the headers.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                index = int(query.get('index', ['0'])[0])
+                wait = wait_seconds(query.get('wait', ['5m'])[0])
+                if '/v1/catalog/services' == url.path:
+                    index, body = catalog.wait(None, index, wait)
+                elif url.path.startswith('/v1/catalog/service/'):
+                    index, body = catalog.wait(unquote(url.path[len('/v1/catalog/service/'):]), index, wait)
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('X-Consul-Index', str(index))
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.address = '127.0.0.1:{0}'.format(self.httpd.server_address[1])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def _current(self, name):
+        if name is None:
+            tags = dict((n, sorted(set(t for i in instances for t in i['ServiceTags'])))
+                        for n, (_, instances) in self.services.items() if instances)
+            return self.index, tags
+        index, instances = self.services.get(name, (self.index, []))
+        return index, instances
+
+    def wait(self, name, index, wait):
+        deadline = time.monotonic() + wait
+        with self._cond:
+            self.requests += 1
+            while True:
+                current, body = self._current(name)
+                remaining = deadline - time.monotonic()
+                if current != index or remaining <= 0:
+                    return current, body
+                self._cond.wait(remaining)
+
+    def register(self, name, tags, address, port, meta=None):
+        with self._cond:
+            self.index += 1
+            _, instances = self.services.get(name, (0, []))
+            instance = {'Node': address, 'Address': address, 'ServiceName': name, 'ServiceTags': tags,
+                        'ServiceAddress': address, 'ServicePort': port, 'ServiceMeta': meta or {}}
+            self.services[name] = (self.index, instances + [instance])
+            self._cond.notify_all()
+
+    def deregister(self, name, address=None):
+        with self._cond:
+            self.index += 1
+            _, instances = self.services.get(name, (0, []))
+            self.services[name] = (self.index, [i for i in instances if address is not None and i['Address'] != address])
+            self._cond.notify_all()
+
+
+def until(condition, timeout=10.0):
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            raise SystemExit('timed out')
+        time.sleep(0.001)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='consul discovery against a stand-in consul catalog.')
+    parser.add_argument('-n', dest='instances', type=int, default=50,
+                        help='Instances of each service. (default: 50)')
+    parser.add_argument('-w', dest='wait', default='2s',
+                        help='Wait of the blocking queries. (default: 2s)')
+    parser.add_argument('-i', dest='idle', type=float, default=4.0,
+                        help='Seconds the catalog stays idle. (default: 4)')
+    args = parser.parse_args()
+
+    catalog = Catalog()
+    for i in range(args.instances):
+        catalog.register('datanode', ['hdfs.datanode'], 'dn{0}'.format(i), 9864)
+        catalog.register('nodemanager', ['yarn.nodemanager'], 'nm{0}'.format(i), 8042, {'cluster': 'yarn_a'})
+    catalog.register('web', ['http'], 'web1', 80)
+
+    added, removed = [], []
+
+    def add(cluster, module, url):
+        added.append((cluster, module, url))
+        return url
+
+    discovery = ConsulDiscovery(add, removed.append, MODULES, address=catalog.address, wait=args.wait)
+    targets = 2 * args.instances
+    seconds = {}
+    discovery.start()
+    try:
+        seconds['initial targets'] = until(lambda: len(discovery.services) == targets)
+        requests = catalog.requests
+        time.sleep(args.idle)
+        idle = catalog.requests - requests
+
+        catalog.register('datanode', ['hdfs.datanode'], 'dn-new', 9864)
+        seconds['instance registered'] = until(lambda: len(discovery.services) == targets + 1)
+        catalog.deregister('datanode', 'dn0')
+        seconds['instance deregistered'] = until(lambda: len(discovery.services) == targets)
+        catalog.deregister('nodemanager')
+        seconds['service gone'] = until(lambda: len(discovery.services) == args.instances)
+    finally:
+        discovery.stop()
+
+    print("{0} tagged instances, blocking queries of {1}".format(targets, args.wait))
+    print("{0:<24} {1:>10}".format('change', 'ms'))
+    for name, value in seconds.items():
+        print("{0:<24} {1:>10.1f}".format(name, value * 1e3))
+    print("requests while idle for {0}s: {1} ({2} watches)".format(args.idle, idle, 3))
+    expected = set([('hadoop_cluster', 'hdfs.datanode', 'http://dn{0}:9864/jmx'.format(i))
+                    for i in range(args.instances)] +
+                   [('yarn_a', 'yarn.nodemanager', 'http://nm{0}:8042/jmx'.format(i)) for i in range(args.instances)] +
+                   [('hadoop_cluster', 'hdfs.datanode', 'http://dn-new:9864/jmx')])
+    # every instance is added once, the stable ones are never removed nor added again.
+    ok = len(added) == len(set(added)) and set(added) == expected and \
+        sorted(removed) == sorted(['http://dn0:9864/jmx'] +
+                                  ['http://nm{0}:8042/jmx'.format(i) for i in range(args.instances)])
+    print("only the changed instances were added or removed: {0}".format(ok))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
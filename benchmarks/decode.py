@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Micro-benchmark of the json backends on the jmx payloads under test/.
+Run from the repository root: python benchmarks/decode.py [-n NUMBER]
+'''
+
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter import decoder, jmx  # noqa: E402
+
+
+def available_backends():
+    backends = {}
+    for name, load in decoder.BACKENDS.items():
+        try:
+            backends[name] = load()[0]
+        except ImportError:
+            continue
+    return backends
+
+
+def scan(loads):
+    '''
+    decode bean by bean as done for responses bigger than jmx.WHOLE_SIZE.
+    '''
+    def decode(payload):
+        chunks = (payload[i:i + jmx.CHUNK_SIZE]
+                  for i in range(0, len(payload), jmx.CHUNK_SIZE))
+        return list(jmx.iter_beans(chunks, loads=loads, whole_size=0))
+    return decode
+
+
+def main():
+    parser = argparse.ArgumentParser(description='json decode time per payload.')
+    parser.add_argument('-n', dest='number', type=int, default=200,
+                        help='Decodes per payload and backend. (default: 200)')
+    parser.add_argument('-d', dest='directory', default='test',
+                        help='Directory of the jmx payloads. (default: test)')
+    args = parser.parse_args()
+
+    backends = available_backends()
+    decoders = []
+    for name, loads in backends.items():
+        decoders.append((name, loads))
+        decoders.append((name + '+scan', scan(loads)))
+    print("selected backend: {0}".format(decoder.BACKEND))
+    print("{0:<45} {1:>9} ".format('payload', 'bytes') +
+          ' '.join('{0:>14}'.format(name) for name, _ in decoders))
+
+    for path in sorted(glob.glob(os.path.join(args.directory, '**', '*.json'), recursive=True)):
+        with open(path, 'rb') as f:
+            payload = f.read()
+        timings = []
+        for _, decode in decoders:
+            seconds = min(timeit.repeat(lambda: decode(payload), number=args.number, repeat=3))
+            timings.append(seconds / args.number * 1e6)
+        print("{0:<45} {1:>9} ".format(os.path.relpath(path, args.directory), len(payload)) +
+              ' '.join('{0:>12.1f}us'.format(t) for t in timings))
+
+
+if __name__ == '__main__':
+    main()
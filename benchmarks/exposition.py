@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Check that exposition.render renders the test/ payloads byte for byte like the expected outputs committed next to
+them, e.g. test/namenode/hdfs_namenode.prom, and compare its render time with prometheus_client.generate_latest.
+The payloads are served by a local jmx servlet stand-in.
+The expected outputs are written by prometheus_client.generate_latest with -u, after a change of the collectors
+or of the metrics definitions.
+Run from the repository root: python benchmarks/exposition.py [-n NUMBER] [-u]
+'''
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prometheus_client import CollectorRegistry, generate_latest  # noqa: E402
+
+from hadoop_exporter import (  # noqa: E402
+    HDFSDataNodeMetricCollector, HDFSJournalNodeMetricCollector, HDFSNameNodeMetricCollector,
+    HBaseMasterMetricCollector, HBaseRegionServerMetricCollector, MapredJobHistoryMetricCollector,
+    YARNResourceManagerMetricCollector, exposition, jmx)
+from hadoop_exporter.scheduler import SnapshotCollector  # noqa: E402
+
+FIXTURES = (
+    ('namenode', HDFSNameNodeMetricCollector),
+    ('datanode', HDFSDataNodeMetricCollector),
+    ('journalnode', HDFSJournalNodeMetricCollector),
+    ('yarn', YARNResourceManagerMetricCollector),
+    ('jobhistoryserver', MapredJobHistoryMetricCollector),
+    ('hbase', HBaseMasterMetricCollector),
+    ('hbase', HBaseRegionServerMetricCollector),
+)
+
+
+def load_beans(directory):
+    beans = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            doc = json.load(f)
+        if isinstance(doc, dict) and 'beans' in doc:
+            beans.extend(doc['beans'])
+        elif isinstance(doc, dict):
+            beans.append(doc)
+        else:
+            beans.extend(doc)
+    return beans
+
+
+class JmxHandler(BaseHTTPRequestHandler):
+    '''
+    Answers ?qry= and ?get= like the jmx servlet, from the beans of the served directory.
+    '''
+    beans = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        beans = self.beans
+        if 'qry' in query:
+            match = jmx.object_name_matcher(query['qry'][0])
+            beans = [bean for bean in beans if match(bean['name'])]
+        if 'get' in query:
+            name, _, attribute = query['get'][0].partition('::')
+            beans = [{'name': bean['name'], attribute: bean.get(attribute)} for bean in beans if bean['name'] == name]
+        body = json.dumps({'beans': beans}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(beans):
+    handler = type('JmxHandler', (JmxHandler,), {'beans': beans})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:{0}/jmx'.format(httpd.server_address[1])
+
+
+def expected_path(directory, cls):
+    '''
+    @return the path of the expected output of the collector for the payload of directory.
+    '''
+    return os.path.join(directory, '{0}_{1}.prom'.format(cls.COMPONENT, cls.SERVICE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='exposition.render against the expected outputs.')
+    parser.add_argument('-n', dest='number', type=int, default=50,
+                        help='Renders per payload and serializer. (default: 50)')
+    parser.add_argument('-d', dest='directory', default='test',
+                        help='Directory of the jmx payloads. (default: test)')
+    parser.add_argument('-u', dest='update', action='store_true',
+                        help='Write the expected outputs with generate_latest instead of checking them.')
+    args = parser.parse_args()
+
+    failed = False
+    print("{0:<50} {1:>9} {2:>14} {3:>14} {4:>9}".format(
+        'collector', 'bytes', 'generate_latest', 'render', 'expected'))
+    for directory, cls in FIXTURES:
+        directory = os.path.join(args.directory, directory)
+        url = serve(load_beans(directory))
+        collector = SnapshotCollector(cls('hadoop_cluster', url))
+        collector.poll()
+        registry = CollectorRegistry(auto_describe=False)
+        registry.register(collector)
+
+        path = expected_path(directory, cls)
+        output = exposition.render(collector.collect())
+        if args.update and output:
+            with open(path, 'wb') as f:
+                f.write(generate_latest(registry))
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                same = str(f.read() == output)
+        else:
+            # the collectors which render nothing from their payload have no expected output.
+            same = 'missing' if output else 'empty'
+        failed = failed or same not in ('True', 'empty')
+        timings = [min(timeit.repeat(lambda: render(registry), number=args.number, repeat=3)) / args.number * 1e6
+                   for render in (generate_latest, lambda r: exposition.render(r.collect()))]
+        print("{0:<50} {1:>9} {2:>12.1f}us {3:>12.1f}us {4:>9}".format(
+            '{0} ({1})'.format(cls.__name__, os.path.basename(directory)), len(output), timings[0], timings[1], same))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Poll and render time of the test/ payloads when no bean changed since the last poll,
+with the bean memo of the collectors and with every bean mapped again.
+The beans are decoded again for every poll, like from a jmx response, there is no http in the measure.
+Run from the repository root: python benchmarks/incremental.py [-n NUMBER]
+'''
+
+import argparse
+import glob
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prometheus_client import CollectorRegistry  # noqa: E402
+
+from hadoop_exporter import (  # noqa: E402
+    HDFSDataNodeMetricCollector, HDFSNameNodeMetricCollector, HBaseRegionServerMetricCollector,
+    YARNResourceManagerMetricCollector, decoder, exposition)
+from hadoop_exporter.scheduler import SnapshotCollector  # noqa: E402
+
+FIXTURES = (
+    ('namenode', HDFSNameNodeMetricCollector),
+    ('datanode', HDFSDataNodeMetricCollector),
+    ('yarn', YARNResourceManagerMetricCollector),
+    ('hbase', HBaseRegionServerMetricCollector),
+)
+
+
+def load_payload(directory):
+    beans = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            doc = json.load(f)
+        if isinstance(doc, dict) and 'beans' in doc:
+            beans.extend(doc['beans'])
+        elif isinstance(doc, dict):
+            beans.append(doc)
+        else:
+            beans.extend(doc)
+    return json.dumps({'beans': beans}).encode('utf-8')
+
+
+def _map_again(families, route, bean, handler, *args):
+    handler(bean, *args)
+
+
+def poller(cls, payload, memo):
+    collector = cls('hadoop_cluster', 'http://127.0.0.1/jmx')
+    collector._fetch_beans = lambda: decoder.loads(payload)['beans']
+    if not memo:
+        collector._memo.map = collector._common_memo.map = _map_again
+    snapshot = SnapshotCollector(collector)
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(snapshot)
+
+    def poll():
+        snapshot.poll()
+        return exposition.generate(registry)
+    return poll
+
+
+def main():
+    parser = argparse.ArgumentParser(description='polls of unchanged beans, with and without the bean memo.')
+    parser.add_argument('-n', dest='number', type=int, default=50,
+                        help='Polls per payload and mode. (default: 50)')
+    parser.add_argument('-d', dest='directory', default='test',
+                        help='Directory of the jmx payloads. (default: test)')
+    args = parser.parse_args()
+
+    print("{0:<45} {1:>14} {2:>14} {3:>6}".format('collector', 'map again', 'memo', 'same'))
+    for directory, cls in FIXTURES:
+        payload = load_payload(os.path.join(args.directory, directory))
+        polls = [poller(cls, payload, memo) for memo in (False, True)]
+        outputs = [poll() for poll in polls]
+        timings = [min(timeit.repeat(poll, number=args.number, repeat=3)) / args.number * 1e6 for poll in polls]
+        print("{0:<45} {1:>12.1f}us {2:>12.1f}us {3:>6}".format(
+            '{0} ({1})'.format(cls.__name__, directory), timings[0], timings[1], str(outputs[0] == outputs[1])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Auto discovery on a worker host where only a DataNode runs, among the ten daemons the exporter looks for.
+The DataNode is a local jmx server of the test/datanode payload, one candidate port accepts connections but never
+answers, like a hung daemon or another server, the other ports are closed.
+Compares one round of polls of every candidate, what -ad did before, with the probes of LocalDiscovery and one
+round of polls of the daemons it found.
+Run from the repository root: python benchmarks/local_discovery.py
+'''
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter import decoder, utils  # noqa: E402
+from hadoop_exporter.discovery import LocalDiscovery  # noqa: E402
+from hadoop_exporter.exporter import Exporter  # noqa: E402
+from hadoop_exporter.scheduler import SnapshotCollector  # noqa: E402
+
+from compression import load_payload  # noqa: E402
+
+MODULES = ['hdfs.namenode', 'hdfs.datanode', 'hdfs.journalnode', 'yarn.resourcemanager', 'yarn.nodemanager',
+           'mapred.jobhistory', 'hbase.master', 'hbase.regionserver', 'hive.hiveserver2', 'hive.llapdaemon']
+
+
+def serve_datanode(payload):
+    beans = decoder.loads(payload)['beans']
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            # the check query of the DataNode, and the polls, which get all the beans.
+            wanted = [b for b in beans if 'qry=Hadoop%3Aservice%3DDataNode%2Cname%3DJvmMetrics' not in self.path
+                      or b['name'] == 'Hadoop:service=DataNode,name=JvmMetrics']
+            body = json.dumps({'beans': wanted}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd.server_address[1]
+
+
+def closed_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def main():
+    payload = load_payload(os.path.join('test', 'datanode'))
+    hung = socket.socket()
+    hung.bind(('127.0.0.1', 0))
+    # connections are queued by the kernel and never answered.
+    hung.listen(16)
+    ports = dict((module, closed_port()) for module in MODULES)
+    ports['hdfs.datanode'] = serve_datanode(payload)
+    ports['yarn.resourcemanager'] = hung.getsockname()[1]
+    candidates = [('hadoop_cluster', module, 'http://127.0.0.1:{0}/jmx'.format(port)) for module, port in ports.items()]
+    classes = dict(('{0}.{1}'.format(c, s), cls) for c, services in Exporter.COLLECTOR_MAPPING.items()
+                   for s, cls in services.items())
+    utils.set_host_concurrency(8)
+
+    def poll_round(keys):
+        # polled like the scheduler does, a failed poll is logged and gives an empty snapshot.
+        collectors = [SnapshotCollector(classes[module](cluster, url)) for cluster, module, url in keys]
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda c: c.poll(), collectors))
+        return time.time() - start
+
+    found = []
+    discovery = LocalDiscovery(lambda *key: found.append(key) or key, lambda service: None, candidates)
+    start = time.time()
+    discovery.refresh()
+    probe_seconds = time.time() - start
+    found_modules = sorted(module for _, module, _ in found)
+
+    before = poll_round(candidates)
+    after = poll_round(found)
+    print("candidates: {0}, found: {1} in {2:.2f}s of probes".format(len(candidates), found_modules, probe_seconds))
+    print("{0:<36} {1:>8} {2:>10}".format('poll round', 'polls', 'seconds'))
+    print("{0:<36} {1:>8} {2:>10.2f}".format('every candidate (before)', len(candidates), before))
+    print("{0:<36} {1:>8} {2:>10.2f}".format('found daemons (local discovery)', len(found), after))
+    # the next refresh only probes the candidates which are due, none before the backoff.
+    start = time.time()
+    discovery.refresh()
+    print("next refresh before the backoff: {0:.3f}s".format(time.time() - start))
+    hung.close()
+    sys.exit(0 if ['hdfs.datanode'] == found_modules else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Serialization and parse cost of the RegionServer fixture (test/hbase) in the text format and in delimited protobuf.
+A Regions bean of -r regions is added to the fixture, like a RegionServer holding that many regions.
+Both formats are parsed in python, with the text parser of prometheus_client and a minimal protobuf reader,
+so the parse times compare the formats, not what Prometheus itself spends on them.
+Run from the repository root: python benchmarks/protobuf.py [-n NUMBER] [-r REGIONS]
+'''
+
+import argparse
+import json
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prometheus_client import CollectorRegistry  # noqa: E402
+from prometheus_client.parser import text_string_to_metric_families  # noqa: E402
+
+from hadoop_exporter import HBaseRegionServerMetricCollector, exposition, protobuf  # noqa: E402
+from hadoop_exporter.scheduler import SnapshotCollector  # noqa: E402
+
+
+def regions_bean(regions, metrics):
+    bean = {'name': 'Hadoop:service=HBase,name=RegionServer,sub=Regions', 'tag.Hostname': 'rs1'}
+    for i in range(regions):
+        for metric in metrics:
+            attribute = 'Namespace_default_table_t{0}_region_{1:032x}_metric_{2}'.format(
+                i % 50, i, metric[len('region_metric_'):])
+            bean[attribute] = i
+    return bean
+
+
+def _varint(data, pos):
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(data):
+    pos, end = 0, len(data)
+    while pos < end:
+        key, pos = _varint(data, pos)
+        wire = key & 7
+        if 0 == wire:
+            value, pos = _varint(data, pos)
+        elif 1 == wire:
+            value = struct.unpack_from('<d', data, pos)[0]
+            pos += 8
+        elif 2 == wire:
+            size, pos = _varint(data, pos)
+            value = data[pos:pos + size]
+            pos += size
+        else:
+            raise ValueError('unexpected wire type {0}'.format(wire))
+        yield key >> 3, value
+
+
+def parse_protobuf(data):
+    '''
+    @return (name, sorted label pairs, value) of every gauge, counter and untyped sample of delimited MetricFamily messages.
+    '''
+    samples = []
+    data = memoryview(data)
+    pos = 0
+    while pos < len(data):
+        size, pos = _varint(data, pos)
+        name = None
+        for field, value in _fields(data[pos:pos + size]):
+            if 1 == field:
+                name = bytes(value).decode('utf-8')
+            elif 4 == field:
+                labels, number = [], None
+                for metric_field, metric_value in _fields(value):
+                    if 1 == metric_field:
+                        pair = dict(_fields(metric_value))
+                        labels.append((bytes(pair.get(1, b'')).decode('utf-8'), bytes(pair.get(2, b'')).decode('utf-8')))
+                    elif metric_field in (2, 3, 5):
+                        number = dict(_fields(metric_value)).get(1, 0.0)
+                samples.append((name, tuple(sorted(labels)), number))
+        pos += size
+    return samples
+
+
+def parse_text(data):
+    return [(s.name, tuple(sorted(s.labels.items())), s.value)
+            for family in text_string_to_metric_families(data.decode('utf-8')) for s in family.samples]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='text format against delimited protobuf.')
+    parser.add_argument('-n', dest='number', type=int, default=10,
+                        help='Runs per format and step. (default: 10)')
+    parser.add_argument('-r', dest='regions', type=int, default=1000,
+                        help='Regions of the RegionServer. (default: 1000)')
+    parser.add_argument('-d', dest='directory', default='test',
+                        help='Directory of the jmx payloads. (default: test)')
+    args = parser.parse_args()
+
+    with open(os.path.join(args.directory, 'hbase', 'hbase.json')) as f:
+        doc = json.load(f)
+    beans = [bean for bean in doc['beans'] if bean.get('name') != 'Hadoop:service=HBase,name=RegionServer,sub=Regions']
+    collector = HBaseRegionServerMetricCollector('hadoop_cluster', 'http://127.0.0.1/jmx')
+    beans.append(regions_bean(args.regions, collector._metrics['Regions']))
+    collector._fetch_beans = lambda: beans
+    snapshot = SnapshotCollector(collector)
+    snapshot.poll()
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(snapshot)
+    families = list(registry.collect())
+
+    def text():
+        for family in families:
+            # the rendered samples of the last scrape would be reused, render them again.
+            if getattr(family, 'header', None) is not None and family.header.rendered is not None:
+                family.header.rendered.last = None
+        return exposition.render(families)
+
+    formats = (('text', text, parse_text), ('protobuf', lambda: protobuf.render(families), parse_protobuf))
+    outputs = dict((name, render()) for name, render, _ in formats)
+    parsed = dict((name, parse(outputs[name])) for name, _, parse in formats)
+    same = sorted(parsed['text']) == sorted(parsed['protobuf'])
+
+    print("{0} series, same samples: {1}".format(len(parsed['text']), same))
+    print("{0:<10} {1:>12} {2:>14} {3:>14}".format('format', 'bytes', 'serialize ms', 'parse ms'))
+    for name, render, parse in formats:
+        serialize = min(timeit.repeat(render, number=args.number, repeat=3)) / args.number
+        parsing = min(timeit.repeat(lambda: parse(outputs[name]), number=args.number, repeat=3)) / args.number
+        print("{0:<10} {1:>12} {2:>14.2f} {3:>14.2f}".format(name, len(outputs[name]), serialize * 1e3, parsing * 1e3))
+    sys.exit(0 if same else 1)
+
+
+if __name__ == '__main__':
+    main()
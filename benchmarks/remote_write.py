@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Remote write of the test/ payloads to a local stand-in receiver, which decodes the requests like Prometheus.
+Checks that the pushed samples are those of a scrape, compares the pushed bytes with the scrape responses,
+then takes the receiver down and up again to check that the queued requests are sent, in order, once it is back.
+Run from the repository root: python benchmarks/remote_write.py [-c COPIES] [-b BATCH_SIZE]
+'''
+
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prometheus_client import CollectorRegistry  # noqa: E402
+from prometheus_client.parser import text_string_to_metric_families  # noqa: E402
+
+from hadoop_exporter import decoder, exposition, server, snappy_codec  # noqa: E402
+from hadoop_exporter.remote_write import RemoteWriter  # noqa: E402
+from hadoop_exporter.scheduler import SnapshotCollector  # noqa: E402
+
+from compression import FIXTURES, load_payload  # noqa: E402
+
+
+def _varint(data, pos):
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(data):
+    pos, end = 0, len(data)
+    while pos < end:
+        key, pos = _varint(data, pos)
+        wire = key & 7
+        if 0 == wire:
+            value, pos = _varint(data, pos)
+        elif 1 == wire:
+            value = struct.unpack_from('<d', data, pos)[0]
+            pos += 8
+        elif 2 == wire:
+            size, pos = _varint(data, pos)
+            value = bytes(data[pos:pos + size])
+            pos += size
+        else:
+            raise ValueError('unexpected wire type {0}'.format(wire))
+        yield key >> 3, value
+
+
+def parse_write_request(body):
+    '''
+    @return (name, sorted label pairs, value, timestamp ms) of every sample of a snappy compressed WriteRequest.
+    '''
+    samples = []
+    for field, series in _fields(snappy_codec.decompress(body)):
+        if 1 != field:
+            continue
+        labels, values = [], []
+        for series_field, value in _fields(series):
+            if 1 == series_field:
+                pair = dict(_fields(value))
+                labels.append((pair.get(1, b'').decode('utf-8'), pair.get(2, b'').decode('utf-8')))
+            elif 2 == series_field:
+                sample = dict(_fields(value))
+                values.append((sample.get(1, 0.0), sample.get(2, 0)))
+        if labels != sorted(labels):
+            raise ValueError('labels are not sorted: {0}'.format(labels))
+        name = dict(labels).pop('__name__')
+        rest = tuple(pair for pair in labels if '__name__' != pair[0])
+        samples.extend((name, rest, value, timestamp) for value, timestamp in values)
+    return samples
+
+
+class Receiver(object):
+    '''
+    A stand-in remote write receiver. While it is down it answers 503, like a receiver which is overloaded.
+    '''
+
+    def __init__(self):
+        self.up = True
+        self.requests = []
+        self.bytes = 0
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if not receiver.up:
+                    self.send_error(503)
+                    return
+                if 'snappy' != self.headers.get('Content-Encoding'):
+                    self.send_error(400)
+                    return
+                receiver.requests.append(parse_write_request(body))
+                receiver.bytes += len(body)
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{0}/api/v1/write'.format(self.httpd.server_address[1])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def samples(self):
+        return [sample for request in self.requests for sample in request]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='remote write to a local stand-in receiver.')
+    parser.add_argument('-c', dest='copies', type=int, default=20,
+                        help='Collectors polled from each payload, e.g. one per cluster. (default: 20)')
+    parser.add_argument('-b', dest='batch_size', type=int, default=2000,
+                        help='Max number of series in one request. (default: 2000)')
+    parser.add_argument('-d', dest='directory', default='test',
+                        help='Directory of the jmx payloads. (default: test)')
+    args = parser.parse_args()
+
+    registry = CollectorRegistry(auto_describe=False)
+    snapshots = []
+    for directory, cls in FIXTURES:
+        payload = load_payload(os.path.join(args.directory, directory))
+        for copy in range(args.copies):
+            collector = cls('cluster_{0}'.format(copy), 'http://127.0.0.1/jmx')
+            collector._fetch_beans = lambda payload=payload: decoder.loads(payload)['beans']
+            snapshot = SnapshotCollector(collector)
+            snapshot.poll()
+            registry.register(snapshot)
+            snapshots.append(snapshot)
+
+    receiver = Receiver()
+    queue_dir = tempfile.mkdtemp(prefix='remote_write_')
+    writer = RemoteWriter(receiver.url, registry=registry, batch_size=args.batch_size, queue_dir=queue_dir)
+    writer.MIN_BACKOFF, writer.RETRIES = 0.01, 1
+    try:
+        start = time.time()
+        count, size = writer.push()
+        seconds = time.time() - start
+
+        scraped = sorted((s.name, tuple(sorted(s.labels.items())), s.value)
+                         for family in text_string_to_metric_families(exposition.generate(registry).decode('utf-8'))
+                         for s in family.samples)
+        pushed = sorted((name, labels, value) for name, labels, value, _ in receiver.samples())
+        same = scraped == pushed
+
+        cache = server.ResponseCache(registry)
+        print("{0} series in {1} requests, same samples as a scrape: {2}, snappy backend: {3}".format(
+            len(pushed), count, same, snappy_codec.BACKEND))
+        print("{0:<24} {1:>12}".format('payload', 'bytes'))
+        print("{0:<24} {1:>12}".format('text scrape', len(cache.body('text'))))
+        print("{0:<24} {1:>12}".format('gzip text scrape', len(cache.body('text', 'gzip'))))
+        print("{0:<24} {1:>12}".format('protobuf scrape', len(cache.body('protobuf'))))
+        print("{0:<24} {1:>12}".format('gzip protobuf scrape', len(cache.body('protobuf', 'gzip'))))
+        print("{0:<24} {1:>12}   ({2:.2f} ms to push)".format('remote write', size, seconds * 1e3))
+
+        again, _ = writer.push()
+        print("push without new polls: {0} requests".format(again))
+
+        # the receiver goes down for two polls.
+        receiver.up = False
+        sent = len(receiver.requests)
+        for _ in range(2):
+            for snapshot in snapshots:
+                snapshot.poll()
+            writer.push()
+        queued = len(writer.queue)
+        receiver.up = True
+        for snapshot in snapshots:
+            snapshot.poll()
+        writer.push()
+        arrived = receiver.requests[sent:]
+        # timestamps of the polls, in the order the requests arrived.
+        stamps = [max(timestamp for _, _, _, timestamp in request) for request in arrived]
+        in_order = stamps == sorted(stamps)
+        print("receiver down for 2 polls: {0} requests queued, {1} sent once it is back, in order: {2}, {3} left".format(
+            queued, len(arrived), in_order, len(writer.queue)))
+        ok = same and 0 == again and queued > 0 and len(arrived) == queued + count and in_order and 0 == len(writer.queue)
+    finally:
+        receiver.httpd.shutdown()
+        shutil.rmtree(queue_dir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Memory and allocations of one scrape of a RegionServer sized family set, GaugeMetricFamily against ColumnarFamily.
+Run from the repository root: python benchmarks/samples.py [-r REGIONS] [-f FAMILIES] [-s SCRAPES]
+'''
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prometheus_client.core import GaugeMetricFamily  # noqa: E402
+
+from hadoop_exporter.samples import ColumnarFamily, FamilyHeader  # noqa: E402
+
+LABELS = ['cluster', 'host', 'region']
+
+
+def gauge_scrape(families, regions):
+    scraped = []
+    for name in families:
+        family = GaugeMetricFamily(name, 'help', labels=LABELS)
+        for region in regions:
+            family.add_metric(['cluster', 'host', region], 1.0)
+        scraped.append(family)
+    return scraped
+
+
+def columnar_scrape(families, regions, reused):
+    for family in reused:
+        family.reset()
+        for region in regions:
+            family.add_metric(['cluster', 'host', region], 1.0)
+    return [family.freeze() for family in reused]
+
+
+def measure(scrape, scrapes):
+    '''
+    Run scrapes scrapes and measure the last one.
+    @return its seconds, the number of memory blocks and bytes it allocated and still holds, and the gen 0 collections it caused.
+    '''
+    result = scrape()
+    for _ in range(scrapes - 1):
+        result = scrape()
+    del result
+    gc.collect()
+    collections = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = scrape()
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    collections = gc.get_stats()[0]['collections'] - collections
+    del result
+    return seconds, blocks, size, collections
+
+
+def main():
+    parser = argparse.ArgumentParser(description='memory and allocations per scrape.')
+    parser.add_argument('-r', dest='regions', type=int, default=3000,
+                        help='Samples per family. (default: 3000)')
+    parser.add_argument('-f', dest='families', type=int, default=20,
+                        help='Number of families. (default: 20)')
+    parser.add_argument('-s', dest='scrapes', type=int, default=3,
+                        help='Scrapes before the measured one. (default: 3)')
+    args = parser.parse_args()
+
+    families = ['hbase_region_metric_{0}'.format(i) for i in range(args.families)]
+    regions = ['{0:032x}'.format(i) for i in range(args.regions)]
+    reused = [ColumnarFamily(FamilyHeader(name, 'help', LABELS)) for name in families]
+
+    print("{0:<20} {1:>10} {2:>12} {3:>10} {4:>12}".format('store', 'ms', 'live blocks', 'gen0 gc', 'live bytes'))
+    for name, scrape in (('GaugeMetricFamily', lambda: gauge_scrape(families, regions)),
+                         ('ColumnarFamily', lambda: columnar_scrape(families, regions, reused))):
+        seconds, blocks, size, collections = measure(scrape, args.scrapes + 1)
+        print("{0:<20} {1:>10.1f} {2:>12} {3:>10} {4:>12}".format(name, seconds * 1e3, blocks, collections, size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Spread of DataNode targets over exporter replicas by the consistent hash ring of hadoop_exporter.shard.
+Checks that every target has exactly one owner, prints the balance of the shards, then adds and removes a
+replica and counts the targets which moved, against the 1/N of an ideal ring and a modulo of the replica count.
+Run from the repository root: python benchmarks/shard.py [-t TARGETS] [-n REPLICAS] [-v VNODES]
+'''
+
+import argparse
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter.shard import Shard  # noqa: E402
+
+
+def owners(targets, members, vnodes):
+    shards = [Shard(i, members=members, vnodes=vnodes) for i in range(len(members))]
+    result = {}
+    for target in targets:
+        owned = [shard.member for shard in shards if shard.owns(target)]
+        if len(owned) != 1:
+            raise SystemExit('{0} is owned by {1}'.format(target, owned))
+        result[target] = owned[0]
+    return result
+
+
+def moved(before, after):
+    return sum(1 for target in before if before[target] != after[target])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='consistent hash sharding of targets across replicas.')
+    parser.add_argument('-t', dest='targets', type=int, default=5000,
+                        help='Number of targets. (default: 5000)')
+    parser.add_argument('-n', dest='replicas', type=int, default=4,
+                        help='Number of exporter replicas. (default: 4)')
+    parser.add_argument('-v', dest='vnodes', type=int, default=128,
+                        help='Points of each replica on the ring. (default: 128)')
+    args = parser.parse_args()
+
+    targets = ['http://dn{0:05d}.example.com:9864/jmx'.format(i) for i in range(args.targets)]
+    members = ['exporter-{0}'.format(i) for i in range(args.replicas)]
+
+    start = time.time()
+    base = owners(targets, members, args.vnodes)
+    seconds = time.time() - start
+    counts = [sum(1 for owner in base.values() if owner == member) for member in members]
+    ideal = args.targets / args.replicas
+    print("{0} targets on {1} replicas, {2:.1f} us per owns() call".format(
+        args.targets, args.replicas, seconds / (args.targets * args.replicas) * 1e6))
+    print("targets per replica: {0}, max/ideal {1:.2f}".format(counts, max(counts) / ideal))
+
+    grown = owners(targets, members + ['exporter-{0}'.format(args.replicas)], args.vnodes)
+    shrunk = owners(targets, members[:1] + members[2:], args.vnodes)
+    # what a modulo of the replica count would move.
+    modulo = sum(1 for t in targets
+                 if zlib.crc32(t.encode()) % args.replicas != zlib.crc32(t.encode()) % (args.replicas + 1))
+    print("{0:<28} {1:>8} {2:>8}".format('change', 'moved', 'ideal'))
+    print("{0:<28} {1:>8} {2:>8}".format('add a replica', moved(base, grown), args.targets // (args.replicas + 1)))
+    print("{0:<28} {1:>8} {2:>8}".format('remove replica 1', moved(base, shrunk), counts[1]))
+    print("{0:<28} {1:>8} {2:>8}".format('add a replica, modulo', modulo, args.targets // (args.replicas + 1)))
+    # removing a replica only moves its own targets, adding one only takes targets from the others.
+    ok = all(base[t] == shrunk[t] for t in targets if base[t] != members[1]) and \
+        all(base[t] == grown[t] for t in targets if grown[t] != 'exporter-{0}'.format(args.replicas))
+    print("only the targets of the changed replica moved: {0}".format(ok))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Non-blocking jmx requests for MetricCollector.collect_async, e.g. to poll hundreds of targets from one event loop.
+The client is a small HTTP/1.1 client on asyncio streams, there is no dependency on an async http package.
+Like the blocking transport, connections are kept alive per host, a host gets a bounded number of requests at once,
+hosts are resolved through the DNS cache of the transport, certificates are verified against the same CA bundle,
+redirects are followed, and responses are decoded bean by bean while they are read, see jmx.BeanStream.
+'''
+
+import asyncio
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from hadoop_exporter import jmx, transport, utils
+
+logger = utils.get_logger(__name__)
+
+# seconds, of the connection and of every read, like the timeout of the blocking requests.
+TIMEOUT = 5
+# seconds, of a whole response, from the connection to the end of the body.
+DEADLINE = 30
+# like requests.
+MAX_REDIRECTS = 30
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+_REQUEST = ('GET {0} HTTP/1.1\r\n'
+            'Host: {1}\r\n'
+            'User-Agent: hadoop_exporter\r\n'
+            'Accept: application/json\r\n'
+            'Accept-Encoding: identity\r\n'
+            'Connection: keep-alive\r\n'
+            '\r\n')
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Response(object):
+    '''
+    Response is the status and headers of a response, its body is read with chunks().
+    The connection goes back to the session once the body is read, close() drops it when it is not.
+    '''
+
+    def __init__(self, session, key, connection, status, headers, keep_alive):
+        self.status = status
+        self.headers = headers
+        self._session = session
+        self._key = key
+        self._connection = connection
+        self._keep_alive = keep_alive
+
+    async def _read(self, coroutine):
+        return await asyncio.wait_for(coroutine, self._session.timeout)
+
+    async def chunks(self):
+        '''
+        @return an async generator of the body, by chunks of jmx.CHUNK_SIZE at most.
+        '''
+        reader = self._connection[0]
+        if 'chunked' in self.headers.get('transfer-encoding', '').lower():
+            while True:
+                line = await self._read(reader.readuntil(b'\r\n'))
+                size = int(line.split(b';', 1)[0], 16)
+                if not size:
+                    # the trailers, up to an empty line.
+                    while await self._read(reader.readuntil(b'\r\n')) != b'\r\n':
+                        pass
+                    break
+                while size:
+                    data = await self._read(reader.read(min(size, jmx.CHUNK_SIZE)))
+                    if not data:
+                        raise HTTPError('connection closed in the body')
+                    size -= len(data)
+                    yield data
+                await self._read(reader.readexactly(2))
+        elif 'content-length' in self.headers:
+            size = int(self.headers['content-length'])
+            while size:
+                data = await self._read(reader.read(min(size, jmx.CHUNK_SIZE)))
+                if not data:
+                    raise HTTPError('connection closed in the body')
+                size -= len(data)
+                yield data
+        else:
+            # the body ends with the connection.
+            self._keep_alive = False
+            while True:
+                data = await self._read(reader.read(jmx.CHUNK_SIZE))
+                if not data:
+                    break
+                yield data
+        connection, self._connection = self._connection, None
+        self._session._release(self._key, connection, self._keep_alive)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection[1].close()
+            self._connection = None
+
+
+class Session(object):
+    '''
+    Session holds the keep-alive connections and the host slots of the collectors polled on one event loop.
+    It must only be used from that loop. Close it when done, or use it as an async context manager.
+    '''
+
+    def __init__(self, host_concurrency=utils.HOST_CONCURRENCY_DEFAULT, pool_maxsize=transport.POOL_MAXSIZE_DEFAULT,
+                 max_payload_size=utils.MAX_PAYLOAD_SIZE_DEFAULT, timeout=TIMEOUT, deadline=DEADLINE):
+        '''
+        @param host_concurrency: Max number of requests in flight against the same host:port.
+        @param pool_maxsize: Number of keep-alive connections kept for each host.
+        @param max_payload_size: Max bytes read from one jmx response, bigger ones are dropped, 0 for no limit.
+        @param timeout: Seconds to wait for the connection and for every read.
+        @param deadline: Seconds a whole jmx response may take, its redirects included, 0 for no limit.
+        '''
+        self.host_concurrency = max(1, int(host_concurrency))
+        self.pool_maxsize = pool_maxsize
+        self.max_payload_size = max_payload_size
+        self.timeout = timeout
+        self.deadline = deadline
+        # (scheme, host, port) -> idle (reader, writer) connections, and a semaphore.
+        self._idle = {}
+        self._slots = {}
+        self._ssl = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle = {}
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    def _slot(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = asyncio.Semaphore(self.host_concurrency)
+        return slot
+
+    async def _connect(self, key):
+        scheme, host, port = key
+        context = None
+        if 'https' == scheme:
+            if self._ssl is None:
+                self._ssl = transport.ssl_context()
+            context = self._ssl
+        # a lookup which is not cached yet blocks, it runs on the default executor.
+        address = await asyncio.get_running_loop().run_in_executor(None, transport.resolve, host, port)
+        # the certificate is checked against the host name, not against the address connected to.
+        return await asyncio.wait_for(asyncio.open_connection(
+            address, port, ssl=context, server_hostname=host if context else None), self.timeout)
+
+    def _release(self, key, connection, keep_alive):
+        idle = self._idle.setdefault(key, [])
+        if keep_alive and len(idle) < self.pool_maxsize and not connection[0].at_eof():
+            idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def get(self, url, params=None, redirects=MAX_REDIRECTS):
+        '''
+        Send a GET request, the connection is reused if there is an idle one to the same host.
+        Redirects are followed, up to redirects of them.
+        @return the Response, once its headers are read.
+        '''
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if 'https' == parts.scheme else 80))
+        query = '&'.join(q for q in (parts.query, urlencode(params or {})) if q)
+        target = (parts.path or '/') + ('?' + query if query else '')
+        request = _REQUEST.format(target, parts.netloc).encode('latin-1')
+        idle = self._idle.get(key)
+        while True:
+            reused = bool(idle)
+            connection = idle.pop() if reused else await self._connect(key)
+            reader, writer = connection
+            try:
+                writer.write(request)
+                await asyncio.wait_for(writer.drain(), self.timeout)
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # the host closed the idle connection, send the request on another one.
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            break
+        lines = head.decode('latin-1').split('\r\n')
+        version, status = lines[0].split(' ', 2)[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = 'HTTP/1.1' == version and 'close' != headers.get('connection', '').lower()
+        response = Response(self, key, connection, int(status), headers, keep_alive)
+        if response.status in REDIRECT_CODES and 'location' in headers:
+            response.close()
+            if redirects <= 0:
+                raise HTTPError('exceeded {0} redirects'.format(MAX_REDIRECTS))
+            return await self.get(urljoin(url, headers['location']), redirects=redirects - 1)
+        return response
+
+    async def get_beans(self, url, params=None, wanted=None):
+        '''
+        The non-blocking utils._get_beans: the beans of one jmx query, [] when the request fails
+        or when the response takes more than the deadline.
+        '''
+        if not self.deadline:
+            return await self._get_beans(url, params, wanted)
+        try:
+            return await asyncio.wait_for(self._get_beans(url, params, wanted), self.deadline)
+        except asyncio.TimeoutError:
+            logger.warning("drop the response of {0}: it took more than {1}s.".format(url, self.deadline))
+            return []
+
+    async def _get_beans(self, url, params, wanted):
+        result = []
+        response = None
+        try:
+            async with self._slot(urlsplit(url).netloc):
+                response = await self.get(url, params)
+                if response.status != 200:
+                    logger.warning("get {0} failed, response code is: {1}.".format(url, response.status))
+                    return []
+                stream = jmx.BeanStream(wanted, self.max_payload_size)
+                async for data in response.chunks():
+                    result.extend(stream.feed(data))
+                result.extend(stream.close())
+        except jmx.PayloadTooLarge as e:
+            logger.warning("drop the response of {0}: {1}.".format(url, e))
+            result = []
+        except Exception as e:
+            logger.warning("error in func: get_beans, error msg: {0!r}".format(e))
+            result = []
+        else:
+            if not result:
+                logger.warning("no metrics get in the {0}.".format(url))
+        finally:
+            if response is not None:
+                response.close()
+        return result
+
+    async def get_metrics(self, url, queries=None, wanted=None):
+        '''
+        The non-blocking utils.get_metrics, the queries are sent at once and bounded by the host slot.
+        @return a list of all beans scraped in the jmx url, each bean only once.
+        '''
+        if not queries:
+            return await self.get_beans(url, wanted=wanted)
+        results = await asyncio.gather(*[self.get_beans(url, params, wanted) for params in queries])
+        result, seen = [], set()
+        for beans in results:
+            for bean in beans:
+                # queries may overlap, e.g. FSNamesystem* also matches FSNamesystemState.
+                if bean['name'] not in seen:
+                    seen.add(bean['name'])
+                    result.append(bean)
+        return result
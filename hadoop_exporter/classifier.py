@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+
+# A named group of a rule pattern, renamed to stay unique in the combined regex.
+_GROUP = re.compile(r'\(\?P<(\w+)>')
+
+_MISSING = object()
+
+
+def _identity(attribute):
+    return attribute
+
+
+class AttributeClassifier(object):
+    '''
+    AttributeClassifier maps the attribute names of a bean to the family they are exported to and the label values
+    found in the name, e.g. "CreateFileOps" -> ("Operations", ("CreateFile",)).
+    The rules are compiled into one regex, so an attribute is classified by a single match,
+    and the result is memoized by attribute name, later scrapes only do a dict lookup.
+    '''
+    MAX_ATTRIBUTES = 16384
+
+    def __init__(self, rules, default=_identity):
+        '''
+        @param rules: A sequence of (pattern, family) or (pattern, family, labels), the first matching rule wins.
+                      pattern must match the whole attribute name, its named groups are the label values in order.
+                      It must not use backreferences nor global inline flags.
+                      family is a family key, or a function of the attribute name returning it.
+                      labels replaces the named groups by format strings of them, e.g. ("Login", "{state}").
+        @param default: Function of the attribute name returning the family of the attributes no rule matches,
+                        the label values are empty. None to classify those attributes as None.
+        '''
+        self._default = default
+        self._rules = {}
+        alternatives = []
+        for i, rule in enumerate(rules):
+            pattern, family = rule[0], rule[1]
+            tag = 'r{0}'.format(i)
+            groups = sorted(re.compile(pattern).groupindex.items(), key=lambda item: item[1])
+            self._rules[tag] = (family,
+                                tuple('{0}_{1}'.format(tag, name) for name, _ in groups),
+                                tuple(name for name, _ in groups),
+                                rule[2] if len(rule) > 2 else None)
+            alternatives.append('(?P<{0}>{1})'.format(
+                tag, _GROUP.sub(lambda m: '(?P<{0}_{1}>'.format(tag, m.group(1)), pattern)))
+        self._regex = re.compile('|'.join(alternatives))
+        self._cache = {}
+
+    def classify(self, attribute):
+        '''
+        @return a tuple of the family and a tuple of the label values, see __init__.
+        The result is shared between calls.
+        '''
+        result = self._cache.get(attribute, _MISSING)
+        if result is _MISSING:
+            if len(self._cache) >= self.MAX_ATTRIBUTES:
+                self._cache = {}
+            result = self._cache[attribute] = self._classify(attribute)
+        return result
+
+    def _classify(self, attribute):
+        m = self._regex.fullmatch(attribute)
+        if m is None:
+            if self._default is None:
+                return None
+            return self._default(attribute), ()
+        # the group wrapping a rule closes after the groups of the rule, so it is the last one matched.
+        family, groups, names, labels = self._rules[m.lastgroup]
+        values = tuple(m.group(group) or '' for group in groups)
+        if labels is not None:
+            values = tuple(label.format(**dict(zip(names, values))) for label in labels)
+        if callable(family):
+            family = family(attribute)
+        return family, values
@@ -3,17 +3,183 @@
 
 import os
 import re
+import threading
+from types import MappingProxyType
 from prometheus_client.core import GaugeMetricFamily
-from hadoop_exporter import utils
+from hadoop_exporter import aio, jmx, utils
+from hadoop_exporter.memo import BeanMemo
+from hadoop_exporter.classifier import AttributeClassifier
+from hadoop_exporter.samples import ColumnarFamily, FamilyHeader
 
 EXPORTER_METRICS_DIR = os.environ.get('EXPORTER_METRICS_DIR', 'metrics')
 
+logger = utils.get_logger(__name__)
+
+# ObjectName patterns of the beans read by common_metrics_info, keyed by the metrics/common file name.
+COMMON_BEAN_QUERIES = {
+    'JvmMetrics': 'Hadoop:name=JvmMetrics,*',
+    'OperatingSystem': 'java.lang:type=OperatingSystem',
+    'RpcActivity': 'Hadoop:name=RpcActivity*,*',
+    'RpcDetailedActivity': 'Hadoop:name=RpcDetailedActivity*,*',
+    'UgiMetrics': 'Hadoop:name=UgiMetrics,*',
+    'MetricsSystem': 'Hadoop:name=MetricsSystem,sub=Stats,*',
+    'Runtime': 'java.lang:type=Runtime',
+}
+
+
+class DefinitionRegistry(object):
+    '''
+    DefinitionRegistry loads the metrics definition files of a directory once, and shares them between all collectors.
+    The definitions are read only: {file name: {metric: description}} mappings which can not be modified.
+    '''
+
+    def __init__(self):
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        '''
+        @param path: The definitions directory, e.g. metrics/hdfs/namenode or metrics/common.
+        @return a read only {file name: {metric: description}} mapping, in the order of utils.get_file_list.
+        '''
+        definitions = self._dirs.get(path)
+        if definitions is None:
+            with self._lock:
+                definitions = self._dirs.get(path)
+                if definitions is None:
+                    definitions = self._dirs[path] = self._load(path)
+        return definitions
+
+    def _load(self, path):
+        definitions = {}
+        for name in utils.get_file_list(path):
+            definitions[name] = MappingProxyType(
+                utils.read_json_file(path, name) or {})
+        return MappingProxyType(definitions)
+
+    def reload(self):
+        '''
+        Drop every loaded definition, they are read again from the disk on next use.
+        '''
+        with self._lock:
+            self._dirs = {}
+            _common_descriptors.clear()
+
+
+definitions = DefinitionRegistry()
+
+
+def reload_definitions():
+    '''
+    Reload hook of the metrics definitions: the common definitions are read again by the next poll of every collector,
+    and the definitions of a service by the next collector built for it.
+    '''
+    logger.info("reload metrics definitions from {0}".format(EXPORTER_METRICS_DIR))
+    definitions.reload()
+
+
+class FamilyDescriptor(object):
+    '''
+    FamilyDescriptor keeps everything of a metric family but its samples: type, final name, help and label names.
+    Gauges are stored in ColumnarFamily, the other types, e.g. histograms, stay prometheus_client families.
+    '''
+    __slots__ = ('cls', 'state', 'header')
+
+    def __init__(self, family):
+        '''
+        @param family: An empty family, e.g. GaugeMetricFamily(name, documentation, labels=labels).
+        '''
+        self.cls = type(family)
+        self.state = dict(family.__dict__, samples=None)
+        self.header = FamilyHeader.of(family) if self.cls is GaugeMetricFamily else None
+
+    @property
+    def name(self):
+        return self.state['name']
+
+    @property
+    def documentation(self):
+        return self.state['documentation']
+
+    @property
+    def labels(self):
+        return self.state.get('_labelnames', ())
+
+    def family(self, previous=None):
+        '''
+        @param previous: The family of the same key in the last scrape, a ColumnarFamily is reused.
+        @return an empty family, without running the family constructor again.
+        '''
+        if self.header is not None:
+            if isinstance(previous, ColumnarFamily) and previous.header is self.header:
+                previous.reset()
+                return previous
+            return ColumnarFamily(self.header)
+        family = self.cls.__new__(self.cls)
+        family.__dict__.update(self.state)
+        family.samples = []
+        return family
+
+    def copy(self):
+        '''
+        @return the same descriptor with a header of its own.
+        '''
+        descriptor = FamilyDescriptor.__new__(FamilyDescriptor)
+        descriptor.cls = self.cls
+        descriptor.state = self.state
+        descriptor.header = self.header.copy() if self.header is not None else None
+        return descriptor
+
+
+class DescriptorTable(object):
+    '''
+    DescriptorTable holds the FamilyDescriptor of every family of one metrics file, by family key.
+    Tables are compiled once from the metric definitions, a scrape only resets or copies them into empty families.
+    '''
+
+    def __init__(self, families):
+        '''
+        @param families: The {key: family} dict filled by a _setup_*_labels method.
+        '''
+        self.descriptors = [(key, FamilyDescriptor(family))
+                            for key, family in families.items()]
+
+    def families(self, only=None, previous=None):
+        '''
+        @param only: If set, only the families whose key is in it, e.g. a bean for the families of its attributes.
+        @param previous: The {key: family} dict of the last scrape, its columnar families are reused.
+        @return a new {key: family} dict of empty families.
+        '''
+        previous = previous or {}
+        if only is None:
+            return {key: d.family(previous.get(key)) for key, d in self.descriptors}
+        return {key: d.family(previous.get(key)) for key, d in self.descriptors if key in only}
+
+    def copy(self):
+        '''
+        @return the same table with headers of its own, the serializers keep the last scrape of a family
+                on its header, a table shared by several collectors would make them replace it on every scrape.
+        '''
+        table = DescriptorTable.__new__(DescriptorTable)
+        table.descriptors = [(key, d.copy()) for key, d in self.descriptors]
+        return table
+
 
 class MetricCollector(object):
     '''
     MetricCollector is a super class of all kinds of MetricsColleter classes. It setup common params like cluster, url, component and service.
     '''
 
+    # ObjectName pattern of the beans described by each metrics file, formatted with the file name.
+    # None means the collector does not know its bean names, so the whole jmx dump is fetched.
+    BEAN_QUERY = None
+
+    # ObjectName patterns overriding BEAN_QUERY for some metrics files. {file name: pattern}
+    BEAN_QUERIES = {}
+
+    # Beans of which only one attribute is read, fetched with ?get=bean::attribute. {file name: (bean, attribute)}
+    BEAN_ATTRIBUTES = {}
+
     def __init__(self, cluster, url, component, service):
         '''
         @param cluster: Cluster name, registered in the config file or ran in the command-line.
@@ -30,31 +196,139 @@ class MetricCollector(object):
 
         self._file_path = os.path.join(
             EXPORTER_METRICS_DIR, component, service)
-        self._file_list = utils.get_file_list(self._file_path)
-        self._common_file = utils.get_file_list(
-            os.path.join(EXPORTER_METRICS_DIR, "common"))
+        self._metrics = definitions.get(self._file_path)
+        self._file_list = list(self._metrics)
+        self._common_file = list(definitions.get(
+            os.path.join(EXPORTER_METRICS_DIR, "common")))
         self._merge_list = self._file_list + self._common_file
 
-        self._metrics = {}
-        for i in range(len(self._file_list)):
-            self._metrics.setdefault(self._file_list[i], utils.read_json_file(
-                self._file_path, self._file_list[i]))
+        self._queries = self._setup_queries()
+        self._wanted = jmx.query_matcher(self._queries)
+        self._index = jmx.BeanIndex(self._route)
+        # the beans which did not change since the last poll are not mapped again.
+        self._memo = BeanMemo()
+        self._common_memo = BeanMemo()
+        # the common descriptor tables, copied for this collector, see common_metrics_info.
+        self._common_tables = {}
+        self.logger = logger
+
+    def _setup_queries(self):
+        '''
+        Derive the jmx servlet queries from the metrics files, so that only the beans we export are fetched.
+        @return a list of query params, or None to fetch the whole jmx dump.
+        '''
+        if self.BEAN_QUERY is None:
+            return None
+        queries = []
+        prefix_match = '{0}*' in self.BEAN_QUERY
+        names = sorted(self._file_list)
+        for name in names:
+            if name in self.BEAN_ATTRIBUTES:
+                bean, attribute = self.BEAN_ATTRIBUTES[name]
+                queries.append({'get': '{0}::{1}'.format(bean, attribute)})
+            elif name in self.BEAN_QUERIES:
+                queries.append({'qry': self.BEAN_QUERIES[name]})
+            elif prefix_match and any(name != other and name.startswith(other) and other not in self.BEAN_ATTRIBUTES and other not in self.BEAN_QUERIES for other in names):
+                # already matched by a shorter pattern, e.g. FSNamesystem* covers FSNamesystemState.
+                continue
+            else:
+                queries.append({'qry': self.BEAN_QUERY.format(name)})
+        for name in self._common_file:
+            if name in COMMON_BEAN_QUERIES:
+                queries.append({'qry': COMMON_BEAN_QUERIES[name]})
+        return queries
+
+    def _fetch_beans(self):
+        return utils.get_metrics(self._url, self._queries, self._wanted)
+
+    async def _fetch_beans_async(self, session):
+        return await session.get_metrics(self._url, self._queries, self._wanted)
+
+    def _route(self, key, name):
+        '''
+        Resolve the metrics files of a bean, it is called once per bean name, see jmx.BeanIndex.
+        By default the file whose name is the longest prefix of the bean name= property,
+        e.g. DataNodeActivity for "Hadoop:service=DataNode,name=DataNodeActivity-host-50010".
+        @param key: The jmx.BeanKey of the bean.
+        @param name: The bean name.
+        @return a tuple of metrics file names.
+        '''
+        service = jmx.longest_prefix(key.name, self._metrics)
+        return (service,) if service else ()
+
+    def _compile_descriptors(self, families, setups):
+        '''
+        Run every _setup_*_labels method once and keep the families it creates as a DescriptorTable.
+        @param families: The {file name: {key: family}} dict filled by the setup methods, e.g. self._hdfs_namenode_metrics.
+        @param setups: {file name: function creating the families of the file into families[file name]}
+        @return {file name: DescriptorTable}, the files without metrics definitions are left out.
+        '''
+        tables = {}
+        for service, setup in setups.items():
+            if service not in self._metrics:
+                continue
+            families[service] = {}
+            setup()
+            tables[service] = DescriptorTable(families[service])
+            families[service] = {}
+        return tables
+
+    def _load_families(self, families, services, only=None):
+        '''
+        Replace the families of the given files by empty ones, built from the descriptor tables.
+        The columnar families of the last scrape are reset and reused.
+        @param families: The {file name: {key: family}} dict passed to _compile_descriptors.
+        @param services: The file names.
+        @param only: If set, only the families whose key is in it, e.g. a bean for the families of its attributes.
+        '''
+        for service in services:
+            table = self._descriptors.get(service)
+            if table is not None:
+                families[service].update(table.families(only, families[service]))
 
     def collect(self):
+        '''
+        The collect of prometheus_client, on the blocking _fetch_beans. Same families as collect_async.
+        '''
+        try:
+            beans = self._fetch_beans()
+        except Exception:
+            self.logger.info(
+                "Can't scrape metrics from url: {0}".format(self._url))
+            return iter([])
+        return iter(list(self._families(beans)))
+
+    async def collect_async(self, session=None):
+        '''
+        Fetch the beans without blocking the event loop, and map them into metric families.
+        The families are reused from poll to poll, a collector must not be collected twice at once.
+        @param session: An aio.Session shared by the collectors polled on the same event loop, None for one of this call only.
+        @return a list of metric families.
+        '''
+        if session is None:
+            async with aio.Session() as session:
+                return await self.collect_async(session)
+        try:
+            beans = await self._fetch_beans_async(session)
+        except Exception:
+            self.logger.info(
+                "Can't scrape metrics from url: {0}".format(self._url))
+            return []
+        return list(self._families(beans))
+
+    def _families(self, beans):
         '''
         This method needs to be override by all subclasses.
 
-        # request_data from url/jmx
-        metrics = get_metrics(self._base_url)
-        beans = metrics['beans']
-
         # initial the metircs
         self._setup_metrics_labels()
 
         # add metrics
         self._get_metrics(beans)
+
+        # yield every family
         '''
-        pass
+        return ()
 
     def _setup_metrics_labels(self):
         pass
@@ -63,22 +337,96 @@ class MetricCollector(object):
         pass
 
 
-def common_metrics_info(cluster, beans, component, service):
+# Descriptor tables of the common metrics files, compiled once per metric prefix. {prefix: {file name: DescriptorTable}}
+_common_descriptors = {}
+
+
+def _common_route(key, name):
+    '''
+    @return the common metrics files of a bean, e.g. ("RpcActivity",) for "Hadoop:service=NameNode,name=RpcActivityForPort8020".
+    '''
+    if 'JvmMetrics' == key.name:
+        return ('JvmMetrics',)
+    if 'java.lang' == key.domain and 'OperatingSystem' == key.type:
+        return ('OperatingSystem',)
+    if 'java.lang' == key.domain and 'Runtime' == key.type:
+        return ('Runtime',)
+    if 'UgiMetrics' == key.name:
+        return ('UgiMetrics',)
+    if 'MetricsSystem' == key.name and 'Stats' == key.sub:
+        return ('MetricsSystem',)
+    prefix = jmx.longest_prefix(key.name, ('RpcActivity', 'RpcDetailedActivity'))
+    return (prefix,) if prefix else ()
+
+
+_common_index = jmx.BeanIndex(_common_route)
+
+
+def _jvm_family(metric):
+    return "_".join(["jvm", re.sub('([a-z0-9])([A-Z])', r'\1_\2', metric).lower()])
+
+
+# attribute name -> (family, label values) of the common beans, e.g. "MemHeapUsedM" -> ("jvm_mem_used_mebibytes", ("Heap",))
+JVM_CLASSIFIER = AttributeClassifier([
+    (r'.*?Mem(?P<mode>.*?)Used.*', 'jvm_mem_used_mebibytes'),
+    (r'.*?Mem(?P<mode>.*?)Committed.*', 'jvm_mem_committed_mebibytes'),
+    (r'(?=.*Heap).*?Mem(?P<mode>.*?)Max.*', 'jvm_mem_max_mebibytes'),
+    (r'(?=.*Mem).*Max.*', 'jvm_mem_max_mebibytes', ('max',)),
+    (r'.*Mem.*', lambda metric: "".join([_jvm_family(metric), 'ebibytes'])),
+    (r'GcCount', 'jvm_gc_count', ('total',)),
+    (r'.*?GcCount(?P<type>.*)', 'jvm_gc_count'),
+    (r'GcTimeMillis', 'jvm_gc_time_milliseconds', ('total',)),
+    (r'.*?GcTimeMillis(?P<type>.*)', 'jvm_gc_time_milliseconds'),
+    (r'.*?GcNum(?P<type>.*?)ThresholdExceeded.*', 'jvm_gc_exceeded_threshold_total'),
+    (r'.*Gc.*', _jvm_family),
+    (r'.*?Threads(?P<state>.*)', 'jvm_threads_state_total'),
+    (r'.*?Log(?P<level>.*)', 'jvm_log_level_total'),
+], default=_jvm_family)
+
+# e.g. "RpcQueueTimeNumOps" -> ("MethodNumOps", ("RpcQueueTime",))
+RPC_CLASSIFIER = AttributeClassifier([
+    (r'(?P<method>.*?)NumOps.*', 'MethodNumOps'),
+    (r'(?P<method>.*?)AvgTime.*', 'MethodAvgTime'),
+])
+
+# e.g. "GetFileInfoNumOps" -> ("NumOps", ("GetFileInfo",)), the other attributes are not exported.
+RPC_DETAILED_CLASSIFIER = AttributeClassifier([
+    (r'(?P<method>[A-Z].*?)NumOps.*', 'NumOps'),
+    (r'(?P<method>[A-Z].*?)AvgTime.*', 'AvgTime'),
+], default=None)
+
+# e.g. "LoginSuccessNumOps" -> ("NumOps", ("Login", "Success")), "GetGroupsAvgTime" -> ("AvgTime", ("GetGroups",))
+UGI_CLASSIFIER = AttributeClassifier([
+    (r'.*?Login(?P<state>.*?)NumOps.*', 'NumOps', ('Login', '{state}')),
+    (r'(?P<method>.*?)NumOps.*', 'NumOps'),
+    (r'.*?Login(?P<state>.*?)AvgTime.*', 'AvgTime', ('Login', '{state}')),
+    (r'(?P<method>.*?)AvgTime.*', 'AvgTime'),
+])
+
+# e.g. "PublishNumOps" -> ("NumOps", ("Publish",))
+METRICS_SYSTEM_CLASSIFIER = AttributeClassifier([
+    (r'(?P<oper>.*?)NumOps.*', 'NumOps'),
+    (r'(?P<oper>.*?)AvgTime.*', 'AvgTime'),
+])
+
+
+def common_metrics_info(cluster, beans, component, service, memo=None, tables=None):
     '''
     A closure function was setup to scrape the SAME metrics all services have.
+    @param memo: The BeanMemo of the common beans of the collector, the unchanged beans are not mapped again.
+    @param tables: The dict of the collector where the common descriptor tables are copied, so that it renders
+                   its families on headers of its own, None to use the shared tables.
     @return a closure variable named common_metrics, which contains all the metrics that scraped from the given beans.
     '''
-    tmp_metrics = {}
     common_metrics = {}
     _cluster = cluster
     _prefix = 'hadoop_{0}_{1}'.format(component, service)
-    _common_path = os.path.join(EXPORTER_METRICS_DIR, "common")
-    _metrics_type = utils.get_file_list(_common_path)
+    _tables = tables
+    # loaded once for the whole process, there is no disk access here.
+    tmp_metrics = definitions.get(os.path.join(EXPORTER_METRICS_DIR, "common"))
 
-    for i in range(len(_metrics_type)):
-        common_metrics.setdefault(_metrics_type[i], {})
-        tmp_metrics.setdefault(_metrics_type[i], utils.read_json_file(
-            _common_path, _metrics_type[i]))
+    for metrics_type in tmp_metrics:
+        common_metrics.setdefault(metrics_type, {})
 
     def setup_jvm_labels():
         for metric in tmp_metrics["JvmMetrics"]:
@@ -279,93 +627,52 @@ def common_metrics_info(cluster, beans, component, service):
                                                                   labels=label)
         return common_metrics
 
+    def compile_labels():
+        '''
+        Run every setup function once and keep the families it creates as a DescriptorTable.
+        '''
+        tables = {}
+        setups = (('JvmMetrics', setup_jvm_labels),
+                  ('OperatingSystem', setup_os_labels),
+                  ('RpcActivity', setup_rpc_labels),
+                  ('RpcDetailedActivity', setup_rpc_detailed_labels),
+                  ('UgiMetrics', setup_ugi_labels),
+                  ('MetricsSystem', setup_metric_system_labels),
+                  ('Runtime', setup_runtime_labels))
+        for metrics_type, setup in setups:
+            if metrics_type in tmp_metrics:
+                setup()
+                tables[metrics_type] = DescriptorTable(
+                    common_metrics[metrics_type])
+                common_metrics[metrics_type] = {}
+        return tables
+
     def setup_labels(beans):
         '''
         Preprocessing, analyzing the characteristics of each module, classifying and adding labels
         '''
-        for i in range(len(beans)):
-            if 'name=JvmMetrics' in beans[i]['name']:
-                setup_jvm_labels()
-
-            if 'OperatingSystem' in beans[i]['name']:
-                setup_os_labels()
-
-            if 'RpcActivity' in beans[i]['name']:
-                setup_rpc_labels()
-
-            if 'RpcDetailedActivity' in beans[i]['name']:
-                setup_rpc_detailed_labels()
-
-            if 'UgiMetrics' in beans[i]['name']:
-                setup_ugi_labels()
-
-            if 'MetricsSystem' in beans[i]['name'] and "sub=Stats" in beans[i]['name']:
-                setup_metric_system_labels()
-
-            if 'Runtime' in beans[i]['name']:
-                setup_runtime_labels()
-
+        shared = _common_descriptors.get(_prefix)
+        if shared is None:
+            shared = _common_descriptors[_prefix] = compile_labels()
+        tables = shared
+        if _tables is not None:
+            copied = _tables.get(_prefix)
+            if copied is None or copied[0] is not shared:
+                # copied again once the definitions are reloaded.
+                copied = _tables[_prefix] = (shared, dict((k, t.copy()) for k, t in shared.items()))
+            tables = copied[1]
+
+        metrics_types = set(metrics_type for metrics_type, _ in _common_index.dispatch(beans))
+        for metrics_type in metrics_types:
+            if metrics_type in tables:
+                common_metrics[metrics_type].update(
+                    tables[metrics_type].families())
         return common_metrics
 
     def get_jvm_metrics(bean):
         for metric in tmp_metrics['JvmMetrics']:
-            name = "_".join(
-                ["jvm", re.sub('([a-z0-9])([A-Z])', r'\1_\2', metric).lower()])
-            if 'Mem' in metric:
-                if "Used" in metric:
-                    key = "jvm_mem_used_mebibytes"
-                    mode = metric.split("Used")[0].split("Mem")[1]
-                    label = [_cluster, mode]
-                elif "Committed" in metric:
-                    key = "jvm_mem_committed_mebibytes"
-                    mode = metric.split("Committed")[0].split("Mem")[1]
-                    label = [_cluster, mode]
-                elif "Max" in metric:
-                    key = "jvm_mem_max_mebibytes"
-                    if "Heap" in metric:
-                        mode = metric.split("Max")[0].split("Mem")[1]
-                    else:
-                        mode = "max"
-                    label = [_cluster, mode]
-                else:
-                    key = "".join([name, 'ebibytes'])
-                    label = [_cluster]
-
-            elif 'Gc' in metric:
-                if "GcCount" in metric:
-                    key = "jvm_gc_count"
-                    if "GcCount" == metric:
-                        typo = "total"
-                    else:
-                        typo = metric.split("GcCount")[1]
-                    label = [_cluster, typo]
-                elif "GcTimeMillis" in metric:
-                    key = "jvm_gc_time_milliseconds"
-                    if "GcTimeMillis" == metric:
-                        typo = "total"
-                    else:
-                        typo = metric.split("GcTimeMillis")[1]
-                    label = [_cluster, typo]
-                elif "ThresholdExceeded" in metric:
-                    key = "jvm_gc_exceeded_threshold_total"
-                    typo = metric.split("ThresholdExceeded")[
-                        0].split("GcNum")[1]
-                    label = [_cluster, typo]
-                else:
-                    key = name
-                    label = [_cluster]
-            elif 'Threads' in metric:
-                key = "jvm_threads_state_total"
-                state = metric.split("Threads")[1]
-                label = [_cluster, state]
-            elif 'Log' in metric:
-                key = "jvm_log_level_total"
-                level = metric.split("Log")[1]
-                label = [_cluster, level]
-            else:
-                key = name
-                label = [_cluster]
-            common_metrics['JvmMetrics'][key].add_metric(label,
+            key, values = JVM_CLASSIFIER.classify(metric)
+            common_metrics['JvmMetrics'][key].add_metric((_cluster,) + values,
                                                          bean[metric] if metric in bean else 0)
         return common_metrics
 
@@ -379,84 +686,33 @@ def common_metrics_info(cluster, beans, component, service):
     def get_rpc_metrics(bean):
         rpc_tag = bean['tag.port']
         for metric in tmp_metrics['RpcActivity']:
-            if "NumOps" in metric:
-                method = metric.split('NumOps')[0]
-                label = [_cluster, rpc_tag, method]
-                key = "MethodNumOps"
-            elif "AvgTime" in metric:
-                method = metric.split('AvgTime')[0]
-                label = [_cluster, rpc_tag, method]
-                key = "MethodAvgTime"
-            else:
-                label = [_cluster, rpc_tag]
-                key = metric
-            common_metrics['RpcActivity'][key].add_metric(label,
+            key, values = RPC_CLASSIFIER.classify(metric)
+            common_metrics['RpcActivity'][key].add_metric((_cluster, rpc_tag) + values,
                                                           bean[metric] if metric in bean else 0)
         return common_metrics
 
     def get_rpc_detailed_metrics(bean):
         detail_tag = bean['tag.port']
         for metric in bean:
-            if metric[0].isupper():
-                label = [_cluster, detail_tag]
-                if "NumOps" in metric:
-                    key = "NumOps"
-                    method = metric.split('NumOps')[0]
-                    label = [_cluster, detail_tag, method]
-                elif "AvgTime" in metric:
-                    key = "AvgTime"
-                    method = metric.split("AvgTime")[0]
-                    label = [_cluster, detail_tag, method]
-                else:
-                    pass
-                common_metrics['RpcDetailedActivity'][key].add_metric(label,
+            classified = RPC_DETAILED_CLASSIFIER.classify(metric)
+            if classified is not None:
+                key, values = classified
+                common_metrics['RpcDetailedActivity'][key].add_metric((_cluster, detail_tag) + values,
                                                                       bean[metric])
         return common_metrics
 
     def get_ugi_metrics(bean):
         for metric in tmp_metrics['UgiMetrics']:
-            if 'NumOps' in metric:
-                key = 'NumOps'
-                if 'Login' in metric:
-                    method = 'Login'
-                    state = metric.split('Login')[1].split('NumOps')[0]
-                    label = [_cluster, method, state]
-                else:
-                    method = metric.split('NumOps')[0]
-                    label = [_cluster, method]
-                # common_metrics['UgiMetrics'][key].add_metric(label, bean[metric] if metric in bean and bean[metric] else 0)
-            elif 'AvgTime' in metric:
-                key = 'AvgTime'
-                if 'Login' in metric:
-                    method = 'Login'
-                    state = metric.split('Login')[1].split('AvgTime')[0]
-                    label = [_cluster, method, state]
-                else:
-                    method = metric.split('AvgTime')[0]
-                    label = [_cluster, method]
-                # common_metrics['UgiMetrics'][key].add_metric(label, bean[metric] if metric in bean and bean[metric] else 0)
-            else:
-                key = metric
-                label = [_cluster]
+            key, values = UGI_CLASSIFIER.classify(metric)
             common_metrics['UgiMetrics'][key].add_metric(
-                label, bean[metric] if metric in bean and bean[metric] else 0)
+                (_cluster,) + values, bean[metric] if metric in bean and bean[metric] else 0)
         return common_metrics
 
     def get_metric_system_metrics(bean):
         for metric in tmp_metrics['MetricsSystem']:
-            if 'NumOps' in metric:
-                key = 'NumOps'
-                oper = metric.split('NumOps')[0]
-                label = [_cluster, oper]
-            elif 'AvgTime' in metric:
-                key = 'AvgTime'
-                oper = metric.split('AvgTime')[0]
-                label = [_cluster, oper]
-            else:
-                key = metric
-                label = [_cluster]
+            key, values = METRICS_SYSTEM_CLASSIFIER.classify(metric)
             common_metrics['MetricsSystem'][key].add_metric(
-                label, bean[metric] if metric in bean and bean[metric] else 0)
+                (_cluster,) + values, bean[metric] if metric in bean and bean[metric] else 0)
         return common_metrics
 
     def get_runtime_metrics(bean):
@@ -472,27 +728,22 @@ def common_metrics_info(cluster, beans, component, service):
         get the corresponding data from the url, and assign values ​​one by one
         '''
         common_metrics = setup_labels(beans)
-        for i in range(len(beans)):
-            if 'name=JvmMetrics' in beans[i]['name']:
-                get_jvm_metrics(beans[i])
-
-            if 'OperatingSystem' in beans[i]['name']:
-                get_os_metrics(beans[i])
-
-            if 'RpcActivity' in beans[i]['name']:
-                get_rpc_metrics(beans[i])
-
-            if 'RpcDetailedActivity' in beans[i]['name']:
-                get_rpc_detailed_metrics(beans[i])
-
-            if 'UgiMetrics' in beans[i]['name']:
-                get_ugi_metrics(beans[i])
-
-            if 'MetricsSystem' in beans[i]['name'] and "sub=Stats" in beans[i]['name']:
-                get_metric_system_metrics(beans[i])
-
-            if 'Runtime' in beans[i]['name']:
-                get_runtime_metrics(beans[i])
+        handlers = {
+            'JvmMetrics': get_jvm_metrics,
+            'OperatingSystem': get_os_metrics,
+            'RpcActivity': get_rpc_metrics,
+            'RpcDetailedActivity': get_rpc_detailed_metrics,
+            'UgiMetrics': get_ugi_metrics,
+            'MetricsSystem': get_metric_system_metrics,
+            'Runtime': get_runtime_metrics,
+        }
+        for metrics_type, bean in _common_index.dispatch(beans):
+            if memo is None:
+                handlers[metrics_type](bean)
+            else:
+                memo.map(common_metrics[metrics_type], metrics_type, bean, handlers[metrics_type])
+        if memo is not None:
+            memo.sweep()
 
         return common_metrics
 
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Consul discovery: the targets are the instances of the Consul services tagged with a module, <component>.<service>
+like the ones of the config file, e.g. a DataNode registered with the tag hdfs.datanode.
+Consul is watched with blocking queries: a query returns as soon as the catalog changes, or after the wait time
+with the same index, so changes are seen at once and an idle catalog costs one request per service and wait.
+The catalog services are watched for the tagged service names, then the instances of every name on its own watch.
+'''
+
+import random
+import re
+import threading
+
+import consul
+import requests
+
+from hadoop_exporter import utils
+from hadoop_exporter.discovery import TargetSet
+
+logger = utils.get_logger(__name__)
+
+ADDRESS_DEFAULT = '127.0.0.1:8500'
+# the wait of a blocking query, Consul adds up to wait/16 of jitter and caps it to 10 minutes.
+WAIT_DEFAULT = '5m'
+
+# backoff after a failed query, in seconds.
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# seconds a blocking query may take beyond its wait and jitter before it is dropped.
+TIMEOUT_MARGIN = 15.0
+
+
+def wait_seconds(wait):
+    '''
+    @param wait: The wait of a blocking query, e.g. 5m, 30s or 500ms, a number alone is in seconds.
+    @return the seconds Consul may hold the query, capped to 10 minutes like Consul does.
+    '''
+    match = re.match(r'^(\d+)(ms|s|m|h)?$', str(wait or '').strip())
+    if not match:
+        return 600.0
+    value, unit = int(match.group(1)), match.group(2) or 's'
+    seconds = {'ms': value / 1000.0, 's': float(value), 'm': value * 60.0, 'h': value * 3600.0}[unit]
+    return min(seconds, 600.0)
+
+
+class _TimeoutSession(requests.Session):
+    '''
+    The session of the consul client, python-consul sends its requests without a timeout, so a query whose
+    connection died without a reset would hang its watch forever.
+    '''
+
+    def __init__(self, timeout):
+        requests.Session.__init__(self)
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return requests.Session.request(self, method, url, **kwargs)
+
+
+def _index(previous, index):
+    '''
+    @return the index of the next blocking query, as the Consul documentation requires: None to start over when
+            an index goes backwards, e.g. after a restore of the servers, 1 when it is not above 0, a query with
+            the index 0 would not block.
+    '''
+    try:
+        index = int(index)
+    except (TypeError, ValueError):
+        return 1
+    if index <= 0:
+        return 1
+    if previous is not None and index < previous:
+        return None
+    return index
+
+
+class ConsulDiscovery(TargetSet):
+    '''
+    ConsulDiscovery keeps a service per instance of the tagged Consul services, see TargetSet.
+    Its watches run on daemon threads from start() to stop().
+    '''
+
+    def __init__(self, add, remove, modules, cluster='hadoop_cluster', address=ADDRESS_DEFAULT, tag=None,
+                 wait=WAIT_DEFAULT, scheme='http', token=None):
+        '''
+        @param modules: The modules a service may be tagged with, e.g. the probe modules, {'hdfs.datanode': ...}.
+        @param cluster: The cluster of the instances without a cluster in their service meta.
+        @param address: The host:port of the Consul agent.
+        @param tag: Only watch the services which also have this tag, None for all tagged with a module.
+        @param wait: The wait of the blocking queries, e.g. 5m.
+        '''
+        TargetSet.__init__(self, add, remove)
+        self.modules = modules
+        self.cluster = cluster
+        self.address = address
+        self.tag = tag
+        self.wait = wait
+        host, _, port = address.rpartition(':')
+        self._consul = consul.Consul(host=host or address, port=int(port) if host else 8500, scheme=scheme, token=token)
+        # a query is held for up to wait + wait/16 of jitter.
+        self._consul.http.session = _TimeoutSession(wait_seconds(wait) * 17 / 16 + TIMEOUT_MARGIN)
+        self._stopped = threading.Event()
+        # service name -> the event stopping its watch, set under _watch_lock with the removal of its targets.
+        self._watches = {}
+        self._watch_lock = threading.Lock()
+
+    def __str__(self):
+        return "(consul discovery: {0})".format(self.address)
+
+    def _module(self, tags):
+        tags = tags or []
+        if self.tag is not None and self.tag not in tags:
+            return None
+        return next((tag for tag in tags if tag in self.modules), None)
+
+    def targets_of(self, nodes):
+        '''
+        @param nodes: The instances of a service, as the /v1/catalog/service/<name> endpoint returns them.
+        @return the (cluster, module, url) of the instances.
+        '''
+        result = set()
+        for node in nodes:
+            module = self._module(node.get('ServiceTags'))
+            address = node.get('ServiceAddress') or node.get('Address')
+            if module is None or not address or not node.get('ServicePort'):
+                continue
+            meta = node.get('ServiceMeta') or {}
+            url = '{0}://{1}:{2}{3}'.format(meta.get('scheme', 'http'), address, node['ServicePort'],
+                                           meta.get('jmx_path', '/jmx'))
+            result.add((meta.get('cluster', self.cluster), module, url))
+        return result
+
+    def _backoff(self, backoff):
+        self._stopped.wait(backoff * random.uniform(0.5, 1.0))
+        return min(backoff * 2, MAX_BACKOFF)
+
+    def _watch(self, query, changed, stop, what):
+        '''
+        Run blocking queries until stop is set, calling changed with the result of every query whose index moved.
+        @param query: Called with the index of the last result, returns (index, result).
+        '''
+        index, backoff = None, MIN_BACKOFF
+        while not stop.is_set() and not self._stopped.is_set():
+            try:
+                new, result = query(index)
+            except Exception as e:
+                logger.warning("error when watching {0} on consul {1}: {2!r}".format(what, self.address, e))
+                backoff = self._backoff(backoff)
+                continue
+            backoff = MIN_BACKOFF
+            new = _index(index, new)
+            if new is not None and new == index:
+                # the wait ran out, nothing changed.
+                continue
+            index = new
+            if not stop.is_set():
+                changed(result)
+
+    def _services_changed(self, services):
+        names = set(name for name, tags in services.items() if self._module(tags) is not None)
+        for name in list(self._watches):
+            if name not in names:
+                with self._watch_lock:
+                    self._watches.pop(name).set()
+                    added, removed = self.update(name, None)
+                logger.info("consul service {0} is gone, {1} targets removed".format(name, removed))
+        for name in names:
+            if name not in self._watches:
+                stop = self._watches[name] = threading.Event()
+                self._thread(self._watch_service, name, stop)
+
+    def _watch_service(self, name, stop):
+        def changed(nodes):
+            with self._watch_lock:
+                if stop.is_set():
+                    # the service is gone, its last query must not add its targets back.
+                    return
+                added, removed = self.update(name, self.targets_of(nodes))
+            if added or removed:
+                logger.info("consul service {0} changed: {1} targets added, {2} removed".format(name, added, removed))
+
+        self._watch(lambda index: self._consul.catalog.service(name, index=index, wait=self.wait),
+                    changed, stop, 'service {0}'.format(name))
+
+    def _thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True, name='consul-watch')
+        thread.start()
+        return thread
+
+    def start(self):
+        self._thread(self._watch, lambda index: self._consul.catalog.services(index=index, wait=self.wait),
+                     self._services_changed, threading.Event(), 'the services')
+
+    def stop(self):
+        '''
+        Stop the watches, a blocking query in flight returns within the wait.
+        '''
+        self._stopped.set()
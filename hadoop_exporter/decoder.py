@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+JSON decoding used for jmx payloads and metric definitions.
+The fastest installed backend is picked at import, EXPORTER_JSON_BACKEND may force one of them.
+Every backend decodes bytes directly, there is no decode-to-str copy before parsing.
+'''
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def _orjson():
+    import orjson
+    return orjson.loads, orjson.JSONDecodeError
+
+
+def _ujson():
+    import ujson
+    return ujson.loads, ValueError
+
+
+def _stdlib():
+    return json.loads, json.JSONDecodeError
+
+
+# ordered by preference.
+BACKENDS = {
+    'orjson': _orjson,
+    'ujson': _ujson,
+    'json': _stdlib,
+}
+
+
+def _select(name=None):
+    names = [name] if name else list(BACKENDS)
+    for n in names:
+        try:
+            loads, error = BACKENDS[n]()
+        except (ImportError, KeyError):
+            continue
+        return n, loads, error
+    return ('json',) + _stdlib()
+
+
+BACKEND, loads, DecodeError = _select(
+    os.environ.get('EXPORTER_JSON_BACKEND'))
+
+
+# Number of embedded attributes kept decoded, a few per collector.
+EMBEDDED_CACHE_SIZE = 256
+
+_embedded = OrderedDict()
+_embedded_lock = threading.Lock()
+
+
+def loads_embedded(text, parse=None):
+    '''
+    Decode a bean attribute holding a json document as a string, e.g. RMNMInfo LiveNodeManagers or DataNodeInfo VolumeInfo.
+    The result is memoized by the digest of the text, an attribute which did not change since the last poll is not decoded again.
+    The result is shared between calls, do not modify it.
+    @param text: The attribute value.
+    @param parse: Function decoding the text, loads by default.
+    '''
+    parse = parse or loads
+    data = text.encode('utf-8') if isinstance(text, str) else text
+    # the digest is kept instead of the text, big attributes are not held twice.
+    key = (parse, hashlib.blake2b(data, digest_size=16).digest())
+    with _embedded_lock:
+        value = _embedded.get(key)
+        if value is not None:
+            _embedded.move_to_end(key)
+            return value
+    value = parse(data if parse is loads else text)
+    with _embedded_lock:
+        _embedded[key] = value
+        while len(_embedded) > EMBEDDED_CACHE_SIZE:
+            _embedded.popitem(last=False)
+    return value
+
+
+def load_file(path):
+    '''
+    @param path: Path of a json file.
+    @return the decoded content of the file.
+    '''
+    with open(path, 'rb') as f:
+        return loads(f.read())
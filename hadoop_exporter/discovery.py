@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Fleet discovery: the DataNodes are read from the LiveNodes of the NameNode, the NodeManagers from the
+LiveNodeManagers of the ResourceManager, on a slow refresh. Every worker gets its own service, added when the
+worker shows up and removed when it is gone. The workers which are still there keep their service, so their
+collector, its caches and its keep-alive connections survive the refresh.
+Local discovery, the auto discovery mode, looks for the daemons of the host on their default ports instead, and only
+polls the ones which answer, see LocalDiscovery.
+'''
+
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from hadoop_exporter import decoder, transport, utils
+from hadoop_exporter.scheduler import Snapshot
+
+logger = utils.get_logger(__name__)
+
+REFRESH_DEFAULT = 300
+
+# the NodeManagers of these states are not running anymore, RMNMInfo still lists some of them.
+GONE_STATES = frozenset(['LOST', 'DECOMMISSIONED', 'SHUTDOWN'])
+
+
+def _jmx_url(address, host=None, scheme='http'):
+    '''
+    @param address: The host:port of the web ui of a worker.
+    @param host: The host used when the address is a wildcard one, e.g. 0.0.0.0:9864.
+    '''
+    address_host, _, port = address.rpartition(':')
+    if not port or not port.isdigit() or '0' == port:
+        return None
+    if address_host in ('', '0.0.0.0', '[::]') and host:
+        address_host = host
+    return '{0}://{1}:{2}/jmx'.format(scheme, address_host, port)
+
+
+def datanode_urls(live_nodes, scheme='http'):
+    '''
+    @param live_nodes: The NameNodeInfo LiveNodes attribute, {"host:xferport": {"infoAddr": "ip:port", ...}}.
+    @return the jmx urls of the DataNodes.
+    '''
+    urls = set()
+    for name, node in decoder.loads_embedded(live_nodes).items():
+        address = node.get('infoSecureAddr' if 'https' == scheme else 'infoAddr')
+        url = _jmx_url(address, name.rpartition(':')[0], scheme) if address else None
+        if url:
+            urls.add(url)
+    return urls
+
+
+def nodemanager_urls(live_node_managers, scheme='http'):
+    '''
+    @param live_node_managers: The RMNMInfo LiveNodeManagers attribute, [{"NodeHTTPAddress": "host:port", ...}].
+    @return the jmx urls of the NodeManagers which are not gone.
+    '''
+    urls = set()
+    for node in decoder.loads_embedded(live_node_managers):
+        if node.get('State') in GONE_STATES or not node.get('NodeHTTPAddress'):
+            continue
+        url = _jmx_url(node['NodeHTTPAddress'], node.get('HostName'), scheme)
+        if url:
+            urls.add(url)
+    return urls
+
+
+# a bean only the daemon of the module has, queried to tell it from another server on the same port.
+# HiveServer2 has no such bean under the Hadoop domain, any jvm answering its jmx servlet is taken for it.
+CHECK_QUERIES = {
+    'hdfs.namenode': 'Hadoop:service=NameNode,name=JvmMetrics',
+    'hdfs.datanode': 'Hadoop:service=DataNode,name=JvmMetrics',
+    'hdfs.journalnode': 'Hadoop:service=JournalNode,name=JvmMetrics',
+    'yarn.resourcemanager': 'Hadoop:service=ResourceManager,name=JvmMetrics',
+    'yarn.nodemanager': 'Hadoop:service=NodeManager,name=JvmMetrics',
+    'mapred.jobhistory': 'Hadoop:service=JobHistoryServer,name=JvmMetrics',
+    'hbase.master': 'Hadoop:service=HBase,name=Master,sub=Server',
+    'hbase.regionserver': 'Hadoop:service=HBase,name=RegionServer,sub=Server',
+    'hive.hiveserver2': 'java.lang:type=Runtime',
+    'hive.llapdaemon': 'Hadoop:service=LlapDaemon,name=JvmMetrics',
+}
+
+# seconds of the connect and of the check of a local daemon.
+PROBE_TIMEOUT = 1.0
+# seconds before a missing daemon is looked for again, doubled after every miss up to MAX_BACKOFF.
+MIN_BACKOFF = 30
+MAX_BACKOFF = 960
+
+
+def probe(url, query=None, timeout=PROBE_TIMEOUT):
+    '''
+    @param url: The jmx url of a daemon.
+    @param query: The jmx query which must return a bean, None to only connect.
+    @return True if the port accepts a connection and the query returns a bean.
+    '''
+    parts = urlsplit(url)
+    try:
+        socket.create_connection((parts.hostname, parts.port or 80), timeout).close()
+    except OSError:
+        return False
+    if query is None:
+        return True
+    try:
+        response = transport.get(url, params={'qry': query}, timeout=timeout)
+        return 200 == response.status_code and bool(decoder.loads(response.content).get('beans'))
+    except Exception as e:
+        logger.debug("check of {0} failed: {1!r}".format(url, e))
+        return False
+
+
+# master service -> (bean, attribute, parse function, worker module).
+SOURCES = {
+    'hdfs.namenode': ('Hadoop:service=NameNode,name=NameNodeInfo', 'LiveNodes', datanode_urls, 'hdfs.datanode'),
+    'yarn.resourcemanager': ('Hadoop:service=ResourceManager,name=RMNMInfo', 'LiveNodeManagers',
+                             nodemanager_urls, 'yarn.nodemanager'),
+}
+
+
+class TargetSet(object):
+    '''
+    TargetSet keeps a service per target listed by its sources. When a source lists other targets, only the
+    difference is applied: the new targets get a service, the gone ones lose it, the others keep theirs.
+    '''
+
+    def __init__(self, add, remove):
+        '''
+        @param add: Called with (cluster, module, url) of a new target, e.g. 'hdfs.datanode', returns its service,
+                    None if it is not polled here.
+        @param remove: Called with the service of a target which is gone.
+        '''
+        self._add = add
+        self._remove = remove
+        # source -> the (cluster, module, url) it listed last, e.g. both NameNodes of an HA pair list the same.
+        self._listed = {}
+        # (cluster, module, url) -> service.
+        self.services = {}
+        self._lock = threading.Lock()
+
+    def targets(self):
+        '''
+        @return the jmx urls of the listed targets, including those no service was added for.
+        '''
+        with self._lock:
+            return set(url for listed in self._listed.values() for _, _, url in listed)
+
+    def update(self, source, targets):
+        '''
+        @param targets: The (cluster, module, url) of the targets the source lists now, None to forget the source.
+        @return the number of added and removed targets.
+        '''
+        with self._lock:
+            if targets is None:
+                self._listed.pop(source, None)
+            else:
+                self._listed[source] = set(targets)
+            wanted = set().union(*self._listed.values())
+            gone = [key for key in self.services if key not in wanted]
+            for key in gone:
+                self._remove(self.services.pop(key))
+            added = 0
+            for key in sorted(wanted):
+                if key not in self.services:
+                    service = self._add(*key)
+                    if service is not None:
+                        self.services[key] = service
+                        added += 1
+        return added, len(gone)
+
+
+class FleetDiscovery(TargetSet):
+    '''
+    FleetDiscovery keeps a service per worker of its masters. It is added to the Scheduler like a service,
+    each poll() reads the workers from the masters and applies the difference with the last one.
+    '''
+
+    def __init__(self, add, remove, period=REFRESH_DEFAULT):
+        '''
+        @param add: Called with (cluster, module, url) of a new worker, see TargetSet.
+        @param remove: Called with the service of a worker which is gone.
+        @param period: Seconds between two refreshes.
+        '''
+        TargetSet.__init__(self, add, remove)
+        self.period = period
+        # (cluster, master module, master url)
+        self.masters = []
+
+    def __str__(self):
+        return "(fleet discovery: {0})".format(', '.join(url for _, _, url in self.masters))
+
+    def watch(self, cluster, module, url):
+        '''
+        @param module: The master, one of SOURCES.
+        @param url: The jmx url of the master.
+        '''
+        self.masters.append((cluster, module, url))
+
+    def discover(self, module, url):
+        '''
+        @return the jmx urls of the workers of the master, None if they could not be read.
+        '''
+        bean, attribute, parse, _ = SOURCES[module]
+        beans = utils.get_metrics(url, [{'get': '{0}::{1}'.format(bean, attribute)}])
+        value = beans[0].get(attribute) if beans else None
+        if value is None:
+            return None
+        return parse(value, url.split('://', 1)[0] if '://' in url else 'http')
+
+    def refresh(self):
+        '''
+        Add the services of the new workers and remove those of the workers which are gone.
+        The workers of a master which could not be read are kept until the next refresh.
+        @return the number of added and removed workers.
+        '''
+        added = removed = 0
+        for master in self.masters:
+            cluster, module, url = master
+            urls = self.discover(module, url)
+            if urls is None:
+                logger.warning("could not read the workers of {0}, keep the {1} it listed last".format(
+                    url, len(self._listed.get(master, ()))))
+                continue
+            worker = SOURCES[module][3]
+            changes = self.update(master, ((cluster, worker, u) for u in urls))
+            added += changes[0]
+            removed += changes[1]
+        return added, removed
+
+    def poll(self):
+        start = time.time()
+        try:
+            added, removed = self.refresh()
+            if added or removed:
+                logger.info("fleet changed: {0} workers added, {1} removed, {2} known".format(
+                    added, removed, len(self.services)))
+        except Exception:
+            logger.warning("error when discovering the fleet")
+            traceback.print_exc()
+        return Snapshot((), start, time.time() - start)
+
+
+class _Candidate(object):
+    __slots__ = ('key', 'due', 'backoff')
+
+    def __init__(self, key):
+        self.key = key
+        self.due = 0.0
+        self.backoff = MIN_BACKOFF
+
+
+class LocalDiscovery(TargetSet):
+    '''
+    LocalDiscovery polls the daemons of the host which answer on their default port, instead of all the candidates.
+    The candidates are probed at once, with a connect and a jmx query of one bean. A missing daemon is probed again
+    later, with an exponential backoff, a daemon which stops answering is pruned and probed like a missing one.
+    It is added to the Scheduler like a service.
+    '''
+
+    period = MIN_BACKOFF
+
+    def __init__(self, add, remove, candidates):
+        '''
+        @param add: Called with (cluster, module, url) of a daemon which answers, see TargetSet.
+        @param remove: Called with the service of a daemon which is gone.
+        @param candidates: The (cluster, module, url) of the daemons which may run on the host.
+        '''
+        TargetSet.__init__(self, add, remove)
+        self.candidates = [_Candidate(key) for key in candidates]
+
+    def __str__(self):
+        return "(local discovery: {0} candidates)".format(len(self.candidates))
+
+    def _alive(self, candidate):
+        _, module, url = candidate.key
+        if candidate.key in self.services:
+            # a polled daemon is only checked for its port, its polls tell the rest.
+            return probe(url)
+        return probe(url, CHECK_QUERIES.get(module))
+
+    def refresh(self, now=None):
+        '''
+        Probe the candidates which are due, add the daemons which answer and prune the ones which do not anymore.
+        @return the number of added and removed daemons.
+        '''
+        now = time.monotonic() if now is None else now
+        due = [candidate for candidate in self.candidates if candidate.due <= now]
+        if not due:
+            return 0, 0
+        with ThreadPoolExecutor(max_workers=len(due), thread_name_prefix='local-probe') as executor:
+            alive = list(executor.map(self._alive, due))
+        for candidate, up in zip(due, alive):
+            if up:
+                candidate.due, candidate.backoff = now + MIN_BACKOFF, MIN_BACKOFF
+            else:
+                if candidate.key in self.services:
+                    candidate.backoff = MIN_BACKOFF
+                candidate.due = now + candidate.backoff
+                logger.debug("no {0} on {1}, probed again in {2}s".format(
+                    candidate.key[1], candidate.key[2], candidate.backoff))
+                candidate.backoff = min(candidate.backoff * 2, MAX_BACKOFF)
+        up = set(candidate.key for candidate in self.candidates if candidate.key in self.services)
+        up.difference_update(candidate.key for candidate, ok in zip(due, alive) if not ok)
+        up.update(candidate.key for candidate, ok in zip(due, alive) if ok)
+        return self.update(self, up)
+
+    def poll(self):
+        start = time.time()
+        try:
+            added, removed = self.refresh()
+            if added or removed:
+                logger.info("local daemons changed: {0} added, {1} removed, {2} polled".format(
+                    added, removed, len(self.services)))
+        except Exception:
+            logger.warning("error when discovering the local daemons")
+            traceback.print_exc()
+        return Snapshot((), start, time.time() - start)
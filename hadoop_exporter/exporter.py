@@ -1,13 +1,25 @@
+import functools
 import os
+import socket
 from re import S
-import time
+import signal
+import threading
 import traceback
 from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
 from prometheus_client.core import REGISTRY
-from prometheus_client import start_http_server
 import yaml
-from hadoop_exporter import utils
-from hadoop_exporter.common import MetricCollector
+from hadoop_exporter import utils, transport
+from hadoop_exporter.server import start_http_server
+from hadoop_exporter.common import MetricCollector, reload_definitions
+from hadoop_exporter.scheduler import Scheduler, SnapshotCollector, TargetGroup, EMPTY_SNAPSHOT
+from hadoop_exporter.remote_write import RemoteWriter, BATCH_SIZE_DEFAULT, QUEUE_SIZE_DEFAULT
+from hadoop_exporter.discovery import FleetDiscovery, LocalDiscovery, SOURCES as FLEET_SOURCES, REFRESH_DEFAULT as FLEET_REFRESH_DEFAULT
+from hadoop_exporter.consul_discovery import ConsulDiscovery, WAIT_DEFAULT as CONSUL_WAIT_DEFAULT
+from hadoop_exporter.shard import Shard, ShardCollector
+from hadoop_exporter.probe import Prober, CONCURRENCY_DEFAULT as PROBE_CONCURRENCY_DEFAULT, IDLE_DEFAULT as PROBE_IDLE_DEFAULT, \
+    MAX_TARGETS_DEFAULT as PROBE_MAX_TARGETS_DEFAULT
+from hadoop_exporter.hbase import regionserver as hbase_regionserver
 from hadoop_exporter import \
     HDFSNameNodeMetricCollector, \
     HDFSDataNodeMetricCollector, \
@@ -27,6 +39,22 @@ EXPORTER_ADDRESS_DEFAULT = '127.0.0.1'
 EXPORTER_PORT_DEFAULT = 9130
 EXPORTER_PATH_DEFAULT = '/metrics'
 EXPORTER_PERIOD_DEFAULT=30
+EXPORTER_CONCURRENCY_DEFAULT = 8
+EXPORTER_HOST_CONCURRENCY_DEFAULT = utils.HOST_CONCURRENCY_DEFAULT
+EXPORTER_POOL_CONNECTIONS_DEFAULT = transport.POOL_CONNECTIONS_DEFAULT
+EXPORTER_POOL_MAXSIZE_DEFAULT = transport.POOL_MAXSIZE_DEFAULT
+EXPORTER_DNS_TTL_DEFAULT = transport.DNS_TTL_DEFAULT
+EXPORTER_MAX_PAYLOAD_SIZE_DEFAULT = utils.MAX_PAYLOAD_SIZE_DEFAULT
+EXPORTER_REMOTE_WRITE_BATCH_SIZE_DEFAULT = BATCH_SIZE_DEFAULT
+EXPORTER_REMOTE_WRITE_QUEUE_DIR_DEFAULT = os.path.join(utils.EXPORTER_LOGS_DIR, 'remote_write')
+EXPORTER_REMOTE_WRITE_QUEUE_SIZE_DEFAULT = QUEUE_SIZE_DEFAULT
+EXPORTER_PROBE_CONCURRENCY_DEFAULT = PROBE_CONCURRENCY_DEFAULT
+EXPORTER_PROBE_IDLE_DEFAULT = PROBE_IDLE_DEFAULT
+EXPORTER_PROBE_MAX_TARGETS_DEFAULT = PROBE_MAX_TARGETS_DEFAULT
+EXPORTER_FLEET_REFRESH_DEFAULT = FLEET_REFRESH_DEFAULT
+EXPORTER_SHARD_INDEX_DEFAULT = 0
+EXPORTER_SHARD_COUNT_DEFAULT = 1
+EXPORTER_CONSUL_WAIT_DEFAULT = CONSUL_WAIT_DEFAULT
 
 
 class ExporterEnv:
@@ -54,24 +82,87 @@ class ExporterEnv:
     EXPORTER_PORT = os.environ.get('EXPORTER_PORT', EXPORTER_PORT_DEFAULT)
     EXPORTER_PATH = os.environ.get('EXPORTER_PATH', EXPORTER_PATH_DEFAULT)
     EXPORTER_PERIOD = os.environ.get('EXPORTER_PERIOD', EXPORTER_PERIOD_DEFAULT)
+    EXPORTER_CONCURRENCY = os.environ.get(
+        'EXPORTER_CONCURRENCY', EXPORTER_CONCURRENCY_DEFAULT)
+    EXPORTER_HOST_CONCURRENCY = os.environ.get(
+        'EXPORTER_HOST_CONCURRENCY', EXPORTER_HOST_CONCURRENCY_DEFAULT)
+    EXPORTER_POOL_CONNECTIONS = os.environ.get(
+        'EXPORTER_POOL_CONNECTIONS', EXPORTER_POOL_CONNECTIONS_DEFAULT)
+    EXPORTER_POOL_MAXSIZE = os.environ.get(
+        'EXPORTER_POOL_MAXSIZE', EXPORTER_POOL_MAXSIZE_DEFAULT)
+    EXPORTER_DNS_TTL = os.environ.get('EXPORTER_DNS_TTL', EXPORTER_DNS_TTL_DEFAULT)
+    EXPORTER_MAX_PAYLOAD_SIZE = os.environ.get(
+        'EXPORTER_MAX_PAYLOAD_SIZE', EXPORTER_MAX_PAYLOAD_SIZE_DEFAULT)
+    EXPORTER_REMOTE_WRITE_URL = os.environ.get('EXPORTER_REMOTE_WRITE_URL', None)
+    EXPORTER_REMOTE_WRITE_BATCH_SIZE = os.environ.get(
+        'EXPORTER_REMOTE_WRITE_BATCH_SIZE', EXPORTER_REMOTE_WRITE_BATCH_SIZE_DEFAULT)
+    EXPORTER_REMOTE_WRITE_QUEUE_DIR = os.environ.get(
+        'EXPORTER_REMOTE_WRITE_QUEUE_DIR', EXPORTER_REMOTE_WRITE_QUEUE_DIR_DEFAULT)
+    EXPORTER_REMOTE_WRITE_QUEUE_SIZE = os.environ.get(
+        'EXPORTER_REMOTE_WRITE_QUEUE_SIZE', EXPORTER_REMOTE_WRITE_QUEUE_SIZE_DEFAULT)
+    EXPORTER_PROBE_CONCURRENCY = os.environ.get(
+        'EXPORTER_PROBE_CONCURRENCY', EXPORTER_PROBE_CONCURRENCY_DEFAULT)
+    EXPORTER_PROBE_IDLE = os.environ.get('EXPORTER_PROBE_IDLE', EXPORTER_PROBE_IDLE_DEFAULT)
+    EXPORTER_PROBE_MAX_TARGETS = os.environ.get('EXPORTER_PROBE_MAX_TARGETS', EXPORTER_PROBE_MAX_TARGETS_DEFAULT)
+    EXPORTER_FLEET_DISCOVERY = os.environ.get('EXPORTER_FLEET_DISCOVERY', 'false')
+    EXPORTER_FLEET_REFRESH = os.environ.get('EXPORTER_FLEET_REFRESH', EXPORTER_FLEET_REFRESH_DEFAULT)
+    EXPORTER_SHARD_INDEX = os.environ.get('EXPORTER_SHARD_INDEX', EXPORTER_SHARD_INDEX_DEFAULT)
+    EXPORTER_SHARD_COUNT = os.environ.get('EXPORTER_SHARD_COUNT', EXPORTER_SHARD_COUNT_DEFAULT)
+    EXPORTER_SHARD_MEMBERS = os.environ.get('EXPORTER_SHARD_MEMBERS', None)
+    EXPORTER_CONSUL_ADDRESS = os.environ.get('EXPORTER_CONSUL_ADDRESS', None)
+    EXPORTER_CONSUL_TAG = os.environ.get('EXPORTER_CONSUL_TAG', None)
+    EXPORTER_CONSUL_WAIT = os.environ.get('EXPORTER_CONSUL_WAIT', EXPORTER_CONSUL_WAIT_DEFAULT)
+    EXPORTER_HBASE_LABELED_METRICS = os.environ.get('EXPORTER_HBASE_LABELED_METRICS', 'false')
 
 
 class Service:
-    def __init__(self, cluster: str, url: str, collector: Callable = MetricCollector, name: Optional[str] = None) -> None:
+    def __init__(self, cluster: str, url: str, collector: Callable = MetricCollector, name: Optional[str] = None, period: Optional[int] = None, group: Optional[TargetGroup] = None) -> None:
         self.collector = collector
         self.url = url
         self.cluster = cluster
         self.flag = True
         self.name = name
+        self.period = period
+        # the discovered targets of a module are served by their group, with an instance label.
+        self.group = group
+        self.instance: Optional[SnapshotCollector] = None
 
     def register(self):
         if self.flag:
             logger.info("register new {} listen from {}".format(
                 self.collector.__name__, self.url))
-            REGISTRY.register(self.collector(
+            self.instance = SnapshotCollector(self.collector(
                 cluster=self.cluster, url=self.url))
+            if self.group is not None:
+                self.group.add(self.instance, urlsplit(self.url).netloc)
+            else:
+                REGISTRY.register(self.instance)
             self.flag = not self.flag
 
+    def unregister(self):
+        if self.instance is not None:
+            logger.info("unregister {} listen from {}".format(
+                self.collector.__name__, self.url))
+            if self.group is not None:
+                self.group.remove(self.instance)
+            else:
+                REGISTRY.unregister(self.instance)
+            self.instance = None
+            self.flag = True
+
+    def poll(self):
+        if self.instance is None:
+            return EMPTY_SNAPSHOT
+        return self.instance.poll()
+
+    def reload(self):
+        '''
+        Build a new collector from the current metrics definitions, the next poll uses it.
+        '''
+        if self.instance is not None:
+            self.instance.collector = self.collector(
+                cluster=self.cluster, url=self.url)
+
     def __str__(self) -> str:
         return "(cluster: {}, url: {}, collector: {}{})".format(
             self.cluster, self.url, self.collector.__name__, f', name: {self.name}' if self.name else '')
@@ -88,6 +179,9 @@ class Exporter:
             'resourcemanager': YARNResourceManagerMetricCollector,
             'nodemanager': YARNNodeManagerMetricCollector,
         },
+        'mapred': {
+            'jobhistory': MapredJobHistoryMetricCollector,
+        },
         'hive': {
             'hiveserver2': HiveServer2MetricCollector,
             'llapdaemon': HiveLlapDaemonMetricCollector,
@@ -103,6 +197,10 @@ class Exporter:
         self.config = args.config or ExporterEnv.EXPORTER_CONFIG
         self.auto_discovery = False
         self.discovery_whitelist = []
+        self.cluster_name = ExporterEnv.EXPORTER_CLUSTER_NAME
+        self.prober: Optional[Prober] = None
+        # (cluster, module, url) of the local daemons the auto discovery looks for.
+        self.candidates = []
 
         if self.config:
             logger.info("use provided config: {}".format(self.config))
@@ -118,6 +216,28 @@ class Exporter:
                 self.port = int(server.get('port', EXPORTER_PORT_DEFAULT))
                 self.path = server.get('path', ExporterEnv.EXPORTER_PATH)
                 self.period = int(server.get('period', ExporterEnv.EXPORTER_PERIOD))
+                self.concurrency = int(server.get('concurrency', ExporterEnv.EXPORTER_CONCURRENCY))
+                self.host_concurrency = int(server.get('host_concurrency', ExporterEnv.EXPORTER_HOST_CONCURRENCY))
+                self.pool_connections = int(server.get('pool_connections', ExporterEnv.EXPORTER_POOL_CONNECTIONS))
+                self.pool_maxsize = int(server.get('pool_maxsize', ExporterEnv.EXPORTER_POOL_MAXSIZE))
+                self.dns_ttl = int(server.get('dns_ttl', ExporterEnv.EXPORTER_DNS_TTL))
+                self.max_payload_size = int(server.get('max_payload_size', ExporterEnv.EXPORTER_MAX_PAYLOAD_SIZE))
+                self.remote_write_url = server.get('remote_write_url', ExporterEnv.EXPORTER_REMOTE_WRITE_URL)
+                self.remote_write_batch_size = int(server.get('remote_write_batch_size', ExporterEnv.EXPORTER_REMOTE_WRITE_BATCH_SIZE))
+                self.remote_write_queue_dir = server.get('remote_write_queue_dir', ExporterEnv.EXPORTER_REMOTE_WRITE_QUEUE_DIR)
+                self.remote_write_queue_size = int(server.get('remote_write_queue_size', ExporterEnv.EXPORTER_REMOTE_WRITE_QUEUE_SIZE))
+                self.probe_concurrency = int(server.get('probe_concurrency', ExporterEnv.EXPORTER_PROBE_CONCURRENCY))
+                self.probe_idle = int(server.get('probe_idle', ExporterEnv.EXPORTER_PROBE_IDLE))
+                self.probe_max_targets = int(server.get('probe_max_targets', ExporterEnv.EXPORTER_PROBE_MAX_TARGETS))
+                self.fleet_discovery = str(server.get('fleet_discovery', ExporterEnv.EXPORTER_FLEET_DISCOVERY)).lower() == 'true'
+                self.fleet_refresh = int(server.get('fleet_refresh', ExporterEnv.EXPORTER_FLEET_REFRESH))
+                self.shard_index = int(server.get('shard_index', ExporterEnv.EXPORTER_SHARD_INDEX))
+                self.shard_count = int(server.get('shard_count', ExporterEnv.EXPORTER_SHARD_COUNT))
+                self.shard_members = server.get('shard_members', ExporterEnv.EXPORTER_SHARD_MEMBERS)
+                self.consul_address = server.get('consul_address', ExporterEnv.EXPORTER_CONSUL_ADDRESS)
+                self.consul_tag = server.get('consul_tag', ExporterEnv.EXPORTER_CONSUL_TAG)
+                self.consul_wait = str(server.get('consul_wait', ExporterEnv.EXPORTER_CONSUL_WAIT))
+                self.hbase_labeled_metrics = str(server.get('hbase_labeled_metrics', ExporterEnv.EXPORTER_HBASE_LABELED_METRICS)).lower() == 'true'
                 self.sevices: List[Service] = []
 
                 jmx = cfg.get('jmx', [])
@@ -133,6 +253,28 @@ class Exporter:
             self.port = int(args.port or ExporterEnv.EXPORTER_PORT)
             self.path = args.path or ExporterEnv.EXPORTER_PATH
             self.period = int(args.period or ExporterEnv.EXPORTER_PERIOD)
+            self.concurrency = int(args.concurrency or ExporterEnv.EXPORTER_CONCURRENCY)
+            self.host_concurrency = int(args.host_concurrency or ExporterEnv.EXPORTER_HOST_CONCURRENCY)
+            self.pool_connections = int(args.pool_connections or ExporterEnv.EXPORTER_POOL_CONNECTIONS)
+            self.pool_maxsize = int(args.pool_maxsize or ExporterEnv.EXPORTER_POOL_MAXSIZE)
+            self.dns_ttl = int(args.dns_ttl if args.dns_ttl is not None else ExporterEnv.EXPORTER_DNS_TTL)
+            self.max_payload_size = int(args.max_payload_size if args.max_payload_size is not None else ExporterEnv.EXPORTER_MAX_PAYLOAD_SIZE)
+            self.remote_write_url = args.remote_write_url or ExporterEnv.EXPORTER_REMOTE_WRITE_URL
+            self.remote_write_batch_size = int(args.remote_write_batch_size or ExporterEnv.EXPORTER_REMOTE_WRITE_BATCH_SIZE)
+            self.remote_write_queue_dir = args.remote_write_queue_dir if args.remote_write_queue_dir is not None else ExporterEnv.EXPORTER_REMOTE_WRITE_QUEUE_DIR
+            self.remote_write_queue_size = int(args.remote_write_queue_size or ExporterEnv.EXPORTER_REMOTE_WRITE_QUEUE_SIZE)
+            self.probe_concurrency = int(args.probe_concurrency or ExporterEnv.EXPORTER_PROBE_CONCURRENCY)
+            self.probe_idle = int(args.probe_idle or ExporterEnv.EXPORTER_PROBE_IDLE)
+            self.probe_max_targets = int(args.probe_max_targets or ExporterEnv.EXPORTER_PROBE_MAX_TARGETS)
+            self.fleet_discovery = (args.fleet_discovery or ExporterEnv.EXPORTER_FLEET_DISCOVERY).lower() == 'true'
+            self.fleet_refresh = int(args.fleet_refresh or ExporterEnv.EXPORTER_FLEET_REFRESH)
+            self.shard_index = int(args.shard_index if args.shard_index is not None else ExporterEnv.EXPORTER_SHARD_INDEX)
+            self.shard_count = int(args.shard_count or ExporterEnv.EXPORTER_SHARD_COUNT)
+            self.shard_members = args.shard_members or ExporterEnv.EXPORTER_SHARD_MEMBERS
+            self.consul_address = args.consul_address or ExporterEnv.EXPORTER_CONSUL_ADDRESS
+            self.consul_tag = args.consul_tag or ExporterEnv.EXPORTER_CONSUL_TAG
+            self.consul_wait = args.consul_wait or ExporterEnv.EXPORTER_CONSUL_WAIT
+            self.hbase_labeled_metrics = (args.hbase_labeled_metrics or ExporterEnv.EXPORTER_HBASE_LABELED_METRICS).lower() == 'true'
             self.sevices: List[Service] = []
 
             if (args.auto_discovery or ExporterEnv.EXPORTER_AUTO_DISCOVERY).lower() == 'true':
@@ -141,6 +283,7 @@ class Exporter:
             self.discovery_whitelist = args.discovery_whitelist or ExporterEnv.EXPORTER_DISCOVERY_WHITELIST
 
             cluster_name = args.cluster_name or ExporterEnv.EXPORTER_CLUSTER_NAME
+            self.cluster_name = cluster_name
             namenode_jmx = args.namenode_jmx or ExporterEnv.EXPORTER_NAMENODE_JMX
             datanode_jmx = args.datanode_jmx or ExporterEnv.EXPORTER_DATANODE_JMX
             journalnode_jmx = args.journalnode_jmx or ExporterEnv.EXPORTER_JOURNALNODE_JMX
@@ -152,20 +295,22 @@ class Exporter:
             hiveserver2_jmx = args.hiveserver2_jmx or ExporterEnv.EXPORTER_HIVESERVER2_JMX
             hivellap_jmx = args.hivellap_jmx or ExporterEnv.EXPORTER_HIVELLAP_JMX
 
-            if self.auto_discovery:
-                namenode_jmx = namenode_jmx or 'http://localhost:9870/jmx'
-                datanode_jmx = datanode_jmx or 'http://localhost:9864/jmx'
-                journalnode_jmx = journalnode_jmx or 'http://localhost:8480/jmx'
-                resourcemanager_jmx = resourcemanager_jmx or 'http://localhost:8088/jmx'
-                nodemanager_jmx = nodemanager_jmx or 'http://localhost:8042/jmx'
-                mapred_jobhistory_jmx = mapred_jobhistory_jmx or 'http://localhost:19888/jmx'
-                hmaster_jmx = hmaster_jmx or 'http://localhost:16010/jmx'
-                hregion_jmx = hregion_jmx or 'http://localhost:16030/jmx'
-                hiveserver2_jmx = hiveserver2_jmx or 'http://localhost:10002/jmx'
-                hivellap_jmx = hivellap_jmx or 'http://localhost:15002/jmx'
-
             if self.auto_discovery:
                 logger.info("enable service auto discovery mode")
+                # the daemons which are not given are looked for on their default ports, only those which answer are polled.
+                for key, module, url, given in (
+                        ('nn', 'hdfs.namenode', 'http://localhost:9870/jmx', namenode_jmx),
+                        ('dn', 'hdfs.datanode', 'http://localhost:9864/jmx', datanode_jmx),
+                        ('jn', 'hdfs.journalnode', 'http://localhost:8480/jmx', journalnode_jmx),
+                        ('rm', 'yarn.resourcemanager', 'http://localhost:8088/jmx', resourcemanager_jmx),
+                        ('nm', 'yarn.nodemanager', 'http://localhost:8042/jmx', nodemanager_jmx),
+                        ('mrjh', 'mapred.jobhistory', 'http://localhost:19888/jmx', mapred_jobhistory_jmx),
+                        ('hm', 'hbase.master', 'http://localhost:16010/jmx', hmaster_jmx),
+                        ('hr', 'hbase.regionserver', 'http://localhost:16030/jmx', hregion_jmx),
+                        ('hs2', 'hive.hiveserver2', 'http://localhost:10002/jmx', hiveserver2_jmx),
+                        ('hllap', 'hive.llapdaemon', 'http://localhost:15002/jmx', hivellap_jmx)):
+                    if not given and self._check_whitelist(key):
+                        self.candidates.append((cluster_name, module, url))
 
             if namenode_jmx and self._check_whitelist('nn'):
                 self.sevices.append(self._make_service(
@@ -203,7 +348,8 @@ class Exporter:
             cluster=js.get('cluster', EXPORTER_CLUSTER_NAME_DEFAULT),
             url=js['url'],
             collector=self.COLLECTOR_MAPPING[js['component']][js['service']],
-            name=js.get('name', None)
+            name=js.get('name', None),
+            period=int(js['period']) if 'period' in js else None
         )
         logger.info("added service: {}".format(service))
         return service
@@ -228,17 +374,148 @@ class Exporter:
                 return False
 
     def register_consul(self):
-        start_http_server(self.port, addr=self.address)
+        hbase_regionserver.set_labeled_metrics(self.hbase_labeled_metrics)
+        # the probes of the targets listed in the Prometheus config, see probe.
+        self.prober = Prober(self.COLLECTOR_MAPPING, cluster=self.cluster_name,
+                             concurrency=self.probe_concurrency, idle=self.probe_idle,
+                             max_targets=self.probe_max_targets)
+        start_http_server(self.port, addr=self.address, path=self.path, prober=self.prober)
         logger.info(
-            f"exporter start listening on http://{self.address}:{self.port}")
+            f"exporter start listening on http://{self.address}:{self.port}{self.path}")
+        logger.info(f"probes served on http://{self.address}:{self.port}/probe")
+
+    def reload(self):
+        '''
+        Reload the metrics definitions from the disk and rebuild the collectors of all services.
+        '''
+        reload_definitions()
+        for service in self.sevices:
+            try:
+                service.reload()
+            except Exception:
+                logger.warning(f"error when reload service: {service}")
+                traceback.print_exc()
+        if self.prober is not None:
+            self.prober.reload()
+
+    def _remote_writer(self) -> RemoteWriter:
+        return RemoteWriter(
+            self.remote_write_url,
+            batch_size=self.remote_write_batch_size,
+            queue_dir=self.remote_write_queue_dir or None,
+            queue_size=self.remote_write_queue_size,
+            # what Prometheus would have added when scraping the exporter.
+            labels={'job': 'hadoop_exporter', 'instance': f"{socket.gethostname()}:{self.port}"})
+
+    def _shard(self) -> Optional[Shard]:
+        members = self.shard_members
+        if isinstance(members, str):
+            members = [m.strip() for m in members.split(',') if m.strip()]
+        if not members and self.shard_count <= 1:
+            return None
+        return Shard(self.shard_index, count=self.shard_count, members=members or None)
+
+    def _modules(self) -> Dict[str, Callable]:
+        return {f'{component}.{service}': cls
+                for component, services in self.COLLECTOR_MAPPING.items() for service, cls in services.items()}
+
+    def _target_callbacks(self, scheduler: Scheduler, shard: Optional[Shard] = None):
+        '''
+        @return the add and remove callbacks of a discovery.TargetSet, which poll a discovered target as a service.
+                add takes grouped=True for the targets of a fleet, which are served by the TargetGroup of their module.
+        '''
+        collectors = self._modules()
+        # the urls which are polled, a target found twice, e.g. configured and discovered, is polled once.
+        polled = set(service.url for service in self.sevices)
+        lock = threading.Lock()
+        # module -> TargetGroup, registered with its first target.
+        groups: Dict[str, TargetGroup] = {}
+
+        def add(cluster, module, url, grouped=False):
+            if shard is not None and not shard.owns(url):
+                return None
+            with lock:
+                if url in polled:
+                    return None
+                polled.add(url)
+                group = None
+                if grouped:
+                    group = groups.get(module)
+                    if group is None:
+                        group = groups[module] = TargetGroup()
+                        REGISTRY.register(group)
+                service = Service(cluster=cluster, url=url, collector=collectors[module], group=group)
+                service.register()
+                scheduler.add(service)
+                self.sevices.append(service)
+            return service
+
+        def remove(service):
+            with lock:
+                scheduler.remove(service)
+                service.unregister()
+                self.sevices.remove(service)
+                polled.discard(service.url)
+
+        return add, remove
+
+    def _fleet_discovery(self, add: Callable, remove: Callable) -> FleetDiscovery:
+        collectors = self._modules()
+        discovery = FleetDiscovery(add, remove, period=self.fleet_refresh)
+        for service in self.sevices:
+            module = next((m for m, cls in collectors.items() if cls is service.collector), None)
+            if module in FLEET_SOURCES:
+                discovery.watch(service.cluster, module, service.url)
+        return discovery
 
     def register_prometheus(self):
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+        utils.set_host_concurrency(self.host_concurrency)
+        utils.set_max_payload_size(self.max_payload_size)
+        hbase_regionserver.set_labeled_metrics(self.hbase_labeled_metrics)
+        transport.configure(pool_connections=self.pool_connections,
+                            pool_maxsize=self.pool_maxsize,
+                            dns_ttl=self.dns_ttl)
+        scheduler = Scheduler(self.period, concurrency=self.concurrency)
         try:
-            while True:
-                for service in self.sevices:
-                    service.register()
-                logger.info(f"continue scaping metrics each {self.period}s...")
-                time.sleep(self.period)
+            shard = self._shard()
+            for service in self.sevices:
+                if shard is not None and not shard.owns(service.url):
+                    continue
+                service.register()
+                scheduler.add(service)
+            discoveries = []
+            # shared by the discoveries, a target found by two of them is polled once.
+            add, remove = self._target_callbacks(scheduler, shard)
+            if self.candidates:
+                discovery = LocalDiscovery(add, remove, self.candidates)
+                scheduler.add(discovery)
+                discoveries.append(discovery)
+                logger.info(f"look for {len(self.candidates)} local daemons on their default ports")
+            # the targets of a fleet or of consul share their metric names, see TargetGroup.
+            add_grouped = functools.partial(add, grouped=True)
+            if self.fleet_discovery:
+                discovery = self._fleet_discovery(add_grouped, remove)
+                scheduler.add(discovery)
+                discoveries.append(discovery)
+                logger.info(f"discover the workers of {len(discovery.masters)} masters each {self.fleet_refresh}s")
+            if self.consul_address:
+                discovery = ConsulDiscovery(add_grouped, remove, self._modules(),
+                                            cluster=self.cluster_name, address=self.consul_address,
+                                            tag=self.consul_tag, wait=self.consul_wait)
+                discovery.start()
+                discoveries.append(discovery)
+                logger.info(f"watch the services of consul {self.consul_address}")
+            if shard is not None:
+                REGISTRY.register(ShardCollector(shard, lambda: set(service.url for service in self.sevices).union(
+                    *[discovery.targets() for discovery in discoveries])))
+                logger.info(f"poll the targets of {shard}")
+            if self.remote_write_url:
+                scheduler.add(self._remote_writer(), delay=self.period)
+                logger.info(f"push metrics to {self.remote_write_url} each {self.period}s")
+            logger.info(f"continue scaping metrics each {self.period}s...")
+            scheduler.run()
         except KeyboardInterrupt:
             logger.info("interrupted")
             exit(0)
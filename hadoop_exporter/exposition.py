@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Prometheus text format serializer of the exporter's families.
+The output is the same as prometheus_client.generate_latest, but the "name{label="value",...} " prefix of every series
+is rendered once and kept with the family, a scrape only formats the values.
+The samples of a family which did not change since the last scrape are not rendered again at all.
+'''
+
+import re
+
+from prometheus_client import generate_latest
+from prometheus_client.core import REGISTRY
+from prometheus_client.openmetrics import exposition as openmetrics
+from prometheus_client.utils import floatToGoString
+
+from hadoop_exporter.samples import ColumnarView
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = openmetrics.CONTENT_TYPE_LATEST
+# The end of an OpenMetrics exposition, it comes once after the families of all the collectors.
+OPENMETRICS_EOF = b'# EOF\n'
+
+# Names which prometheus_client writes as they are, the other ones are escaped by it.
+_METRIC_NAME = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*$')
+_LABEL_NAME = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*$')
+
+
+class _Families(object):
+    '''
+    A registry of some families, for families rendered by prometheus_client itself.
+    '''
+
+    def __init__(self, families):
+        self._families = families
+
+    def collect(self):
+        return self._families
+
+
+def _escape_label_value(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class RenderedFamily(object):
+    '''
+    RenderedFamily is the rendered bytes of a FamilyHeader: its HELP and TYPE lines, and the prefix of every series seen.
+    '''
+    __slots__ = ('head', 'labelnames', 'name', 'prefixes', 'direct', 'last')
+
+    # Prefixes of the series which are gone are kept until there are twice as many as series, plus this.
+    PREFIX_SLACK = 64
+
+    def __init__(self, header):
+        self.name = header.name
+        self.labelnames = header.labelnames
+        # a gauge with plain names, anything else is left to prometheus_client.
+        self.direct = ('gauge' == header.type and _METRIC_NAME.match(header.name) is not None
+                       and all(_LABEL_NAME.match(label) is not None for label in header.labelnames))
+        self.head = '# HELP {0} {1}\n# TYPE {0} {2}\n'.format(
+            header.name, header.documentation.replace('\\', r'\\').replace('\n', r'\n'), header.type).encode('utf-8')
+        self.prefixes = {}
+        # (keys, bytes of the values, timestamps, rendered samples) of the last scrape, replaced as a whole.
+        self.last = None
+
+    def prefix(self, key):
+        '''
+        @param key: The label values of a series.
+        @return the bytes of the series up to its value, e.g. b'name{cluster="c",host="h"} '.
+        '''
+        prefix = self.prefixes.get(key)
+        if prefix is None:
+            labels = sorted(dict(zip(self.labelnames, key)).items())
+            if labels:
+                text = '{0}{{{1}}} '.format(self.name, ','.join(
+                    '{0}="{1}"'.format(k, _escape_label_value(str(v))) for k, v in labels))
+            else:
+                text = '{0} '.format(self.name)
+            prefix = self.prefixes[key] = text.encode('utf-8')
+        return prefix
+
+    def prune(self, series):
+        '''
+        Forget the prefixes of the series which are gone, e.g. regions moved to another RegionServer.
+        @param series: The number of series in the last scrape.
+        '''
+        if len(self.prefixes) > 2 * series + self.PREFIX_SLACK:
+            self.prefixes = {}
+
+
+def rendered(header):
+    '''
+    @return the RenderedFamily of a FamilyHeader, built on the first call.
+    '''
+    if header.rendered is None:
+        header.rendered = RenderedFamily(header)
+    return header.rendered
+
+
+def write_family(family, out):
+    '''
+    Append the text format of a family to out.
+    @param family: A ColumnarView, or any prometheus_client family.
+    @param out: A bytearray.
+    '''
+    if not isinstance(family, ColumnarView) or not rendered(family.header).direct:
+        out += generate_latest(_Families([family]))
+        return
+    r = family.header.rendered
+    out += r.head
+    # the values are compared as bytes, e.g. -0.0 is not rendered like 0.0.
+    values = family.values.tobytes()
+    last = r.last
+    if last is not None and last[1] == values and last[0] == family.keys and last[2] == family.timestamps:
+        out += last[3]
+        return
+    r.prune(len(family.keys))
+    start = len(out)
+    _write_samples(r.prefix, family, out)
+    r.last = (family.keys, values, family.timestamps, bytes(out[start:]))
+
+
+def _write_samples(prefix, family, out):
+    if family.timestamps is None:
+        for key, value in zip(family.keys, family.values):
+            out += prefix(key)
+            out += floatToGoString(value).encode('ascii')
+            out += b'\n'
+        return
+    for key, value, timestamp in zip(family.keys, family.values, family.timestamps):
+        out += prefix(key)
+        out += floatToGoString(value).encode('ascii')
+        if timestamp is not None:
+            out += ' {0:d}'.format(int(float(timestamp) * 1000)).encode('ascii')
+        out += b'\n'
+
+
+def render(families):
+    '''
+    @param families: An iterable of families, e.g. collector.collect().
+    @return their text format, as bytes.
+    '''
+    out = bytearray()
+    for family in families:
+        write_family(family, out)
+    return bytes(out)
+
+
+def render_openmetrics(families):
+    '''
+    @param families: An iterable of families, e.g. collector.collect().
+    @return their OpenMetrics text, as rendered by prometheus_client, without the OPENMETRICS_EOF line.
+    '''
+    output = openmetrics.generate_latest(_Families(list(families)))
+    return output[:-len(OPENMETRICS_EOF)] if output.endswith(OPENMETRICS_EOF) else output
+
+
+def generate(registry=REGISTRY):
+    '''
+    The replacement of prometheus_client.generate_latest, the output is the same.
+    @return the text format of all the families of registry, as bytes.
+    '''
+    return render(registry.collect())
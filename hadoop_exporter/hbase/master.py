@@ -1,17 +1,17 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import yaml
 import re
 from prometheus_client.core import GaugeMetricFamily, HistogramMetricFamily
 
-from hadoop_exporter import utils
+from hadoop_exporter import decoder, utils
 from hadoop_exporter.common import MetricCollector, common_metrics_info
 
 
 class HBaseMasterMetricCollector(MetricCollector):
     COMPONENT = "hbase"
     SERVICE = "master"
+    BEAN_QUERY = "Hadoop:service=HBase,name=Master,sub={0}"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -21,34 +21,30 @@ class HBaseMasterMetricCollector(MetricCollector):
         self._hbase_master_metrics = {}
         for i in range(len(self._file_list)):
             self._hbase_master_metrics.setdefault(self._file_list[i], {})
-
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_metrics_labels(beans)
-
-            # add metric value to every metric.
-            self._get_metrics(beans)
-
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._hbase_master_metrics.update(common_metrics())
-
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._hbase_master_metrics[service]:
-                    yield self._hbase_master_metrics[service][metric]
+        self._descriptors = self._compile_descriptors(self._hbase_master_metrics, {
+            'Server': self._setup_server_labels,
+            'Balancer': self._setup_balancer_labels,
+            'AssignmentManger': self._setup_assignmentmanger_labels,
+            'IPC': self._setup_ipc_labels,
+            'FileSystem': self._setup_filesystem_labels,
+        })
+
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_metrics_labels(beans)
+
+        # add metric value to every metric.
+        self._get_metrics(beans)
+
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._hbase_master_metrics.update(common_metrics())
+
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._hbase_master_metrics[service]:
+                yield self._hbase_master_metrics[service][metric]
 
     def _setup_server_labels(self):
         for metric in self._metrics['Server']:
@@ -272,19 +268,14 @@ class HBaseMasterMetricCollector(MetricCollector):
 
     def _setup_metrics_labels(self, beans):
         # The metrics we want to export.
-        for i in range(len(beans)):
-            if 'Server' in beans[i]['name']:
-                self._setup_server_labels()
-            elif 'Balancer' in beans[i]['name']:
-                self._setup_balancer_labels()
-            elif 'AssignmentManger' in beans[i]['name']:
-                self._setup_assignmentmanger_labels()
-            elif 'IPC' in beans[i]['name']:
-                self._setup_ipc_labels()
-            elif 'FileSystem' in beans[i]['name']:
-                self._setup_filesystem_labels()
-            else:
-                continue
+        services = set(service for service, _ in self._index.dispatch(beans))
+        self._load_families(self._hbase_master_metrics, services)
+
+    def _route(self, key, name):
+        # e.g. "Hadoop:service=HBase,name=Master,sub=Server"
+        if 'Master' == key.name and key.sub in self._metrics:
+            return (key.sub,)
+        return ()
 
     def _get_server_metrics(self, bean):
         host = bean['tag.Hostname']
@@ -292,23 +283,19 @@ class HBaseMasterMetricCollector(MetricCollector):
         for metric in self._metrics['Server']:
             if 'RegionServersState' in metric:
                 if 'tag.liveRegionServers' in bean and bean['tag.liveRegionServers']:
-                    live_region_servers = yaml.safe_load(
-                        bean['tag.liveRegionServers'])
-                    live_region_list = live_region_servers.split(';')
-                    for j in range(len(live_region_list)):
-                        server = live_region_list[j].split(',')[0]
+                    live_region_list = decoder.loads_embedded(
+                        bean['tag.liveRegionServers'], _region_server_names)
+                    for server in live_region_list:
                         label = [self._cluster, host, server]
                         self._hbase_master_metrics['Server'][metric].add_metric(
                             label, 1.0)
                 elif 'tag.deadRegionServers' in bean and bean['tag.deadRegionServers']:
-                    dead_region_servers = yaml.safe_load(
-                        bean['tag.deadRegionServers'])
-                    dead_region_list = dead_region_servers.split(';')
-                    for j in range(len(dead_region_list)):
-                        server = dead_region_list[j].split(',')[0]
+                    dead_region_list = decoder.loads_embedded(
+                        bean['tag.deadRegionServers'], _region_server_names)
+                    for server in dead_region_list:
                         label = [self._cluster, host, server]
                         self._hbase_master_metrics['Server'][metric].add_metric(
-                            label + [server], 0.0)
+                            label, 0.0)
                 else:
                     pass
             elif 'ActiveMaster' in metric:
@@ -577,20 +564,23 @@ class HBaseMasterMetricCollector(MetricCollector):
         # bean is a type of <Dict>
         # status is a type of <Str>
 
-        for i in range(len(beans)):
-            if 'Server' in beans[i]['name'] and 'Master' in beans[i]['name']:
-                self._get_server_metrics(beans[i])
-
-            elif 'Balancer' in beans[i]['name']:
-                self._get_balancer_metrics(beans[i])
-
-            elif 'AssignmentManger' in beans[i]['name']:
-                self._get_assignmentmanger_metrics(beans[i])
-
-            elif 'IPC' in beans[i]['name']:
-                self._get_ipc_metrics(beans[i])
-
-            elif 'FileSystem' in beans[i]['name']:
-                self._get_filesystem_metrics(beans[i])
-            else:
-                continue
+        handlers = {
+            'Server': self._get_server_metrics,
+            'Balancer': self._get_balancer_metrics,
+            'AssignmentManger': self._get_assignmentmanger_metrics,
+            'IPC': self._get_ipc_metrics,
+            'FileSystem': self._get_filesystem_metrics,
+        }
+        for service, bean in self._index.dispatch(beans):
+            if service in handlers:
+                # the beans of the files with histograms are always mapped again, see BeanMemo.
+                self._memo.map(self._hbase_master_metrics[service], service, bean, handlers[service])
+        self._memo.sweep()
+
+
+def _region_server_names(servers):
+    '''
+    @param servers: The tag.liveRegionServers or tag.deadRegionServers value, e.g. "host1,16020,1533287125059;host2,16020,1533287125060".
+    @return a tuple of the region server host names.
+    '''
+    return tuple(server.split(',')[0] for server in servers.split(';'))
@@ -1,16 +1,57 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import functools
 import re
+import sys
 from prometheus_client.core import GaugeMetricFamily
 
 from hadoop_exporter import utils
 from hadoop_exporter.common import MetricCollector, common_metrics_info
 
+# The per region, table and user attributes, e.g. "Namespace_default_table_t1_region_5d6f..._metric_storeCount".
+_ATTRIBUTE_PATTERNS = {
+    'Regions': re.compile(r'Namespace_.+?_table_.+_region_(?P<label>[^_]+)_metric_(?P<metric>.+)'),
+    'Tables': re.compile(r'Namespace_.+?_table_(?P<label>.+)_metric_(?P<metric>.+)'),
+    'Users': re.compile(r'User_(?P<label>.+?)_metric_(?P<metric>.+)'),
+}
+
+_FAMILY_PREFIXES = {
+    'Regions': 'region',
+    'Tables': 'table',
+    'Users': 'User',
+}
+
+_labeled_metrics = False
+
+
+def set_labeled_metrics(enabled):
+    '''
+    export the per region, table and user attributes of the RegionServers if enabled, one series per region, table
+    or user, e.g. tens of thousands per RegionServer. Only the attributes of the metrics definitions are exported otherwise.
+    '''
+    global _labeled_metrics
+    _labeled_metrics = bool(enabled)
+
+
+def parse_attribute(service, attribute):
+    '''
+    @param service: Regions, Tables or Users.
+    @param attribute: An attribute name of the bean, e.g. "Namespace_default_table_t1_region_5d6f..._metric_storeCount".
+    @return a tuple of the interned region, table or user and the family key, e.g. ("5d6f...", "region_metric_storeCount"),
+    None for the attributes which are not per region, table or user.
+    '''
+    m = _ATTRIBUTE_PATTERNS[service].fullmatch(attribute)
+    if m is None:
+        return None
+    return (sys.intern(m.group('label')),
+            sys.intern('{0}_metric_{1}'.format(_FAMILY_PREFIXES[service], m.group('metric'))))
+
 
 class HBaseRegionServerMetricCollector(MetricCollector):
     COMPONENT = "hbase"
     SERVICE = "regionserver"
+    BEAN_QUERY = "Hadoop:service=HBase,name=RegionServer,sub={0}"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -18,101 +59,75 @@ class HBaseRegionServerMetricCollector(MetricCollector):
         self.logger = utils.get_logger(
             __name__, log_file=f"{self.COMPONENT}_{self.SERVICE}.log")
         self._hbase_regionserver_metrics = {}
+        # {service: {attribute: parse_attribute(service, attribute)}} of the last scrape of each bean.
+        self._attributes = {}
         for i in range(len(self._file_list)):
             self._hbase_regionserver_metrics.setdefault(self._file_list[i], {})
-
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_labels(beans)
-
-            # add metric value to every metric.
-            self._get_metrics(beans)
-
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._hbase_regionserver_metrics.update(common_metrics())
-
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._hbase_regionserver_metrics[service]:
-                    yield self._hbase_regionserver_metrics[service][metric]
-
-    def _setup_labels(self, beans):
-        for i in range(len(beans)):
-            for service in self._metrics:
-                if service in beans[i]['name']:
-                    for metric in self._metrics[service]:
-                        name = re.sub('[^a-z0-9A-Z]', '_', metric).lower()
-                        if 'region_metric' in metric:
-                            label = ['cluster', 'host', 'region']
-                        elif 'table_metric' in metric:
-                            label = ['cluster', 'host', 'table']
-                        elif 'User_metric' in metric:
-                            label = ['cluster', 'host', 'user']
-                        else:
-                            label = ['cluster', 'host']
-                        self._hbase_regionserver_metrics[service][metric] = GaugeMetricFamily("_".join([self._prefix, service.lower(), name]),
-                                                                                              self._metrics[service][metric],
-                                                                                              labels=label)
-
-    def _get_regions_metrics(self, bean, service, host):
-        for metric in bean:
-            if metric in self._metrics[service]:
-                if "_region_" in metric and 'metric' in metric:
-                    region = metric.split("_metric_")[0].split("region_")[1]
-                    key = "".join(["region", metric.split(region)[-1]])
-                    self._hbase_regionserver_metrics[service][key].add_metric(
-                        [self._cluster, host, region], bean[metric])
-                elif metric in self._metrics[service]:
-                    self._hbase_regionserver_metrics[service][metric].add_metric(
-                        [self._cluster, host], bean[metric])
-                else:
-                    continue
+        self._descriptors = self._compile_descriptors(self._hbase_regionserver_metrics, {
+            service: functools.partial(self._setup_service_labels, service) for service in self._metrics
+        })
+
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_labels(beans)
+
+        # add metric value to every metric.
+        self._get_metrics(beans)
+
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._hbase_regionserver_metrics.update(common_metrics())
+
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._hbase_regionserver_metrics[service]:
+                yield self._hbase_regionserver_metrics[service][metric]
+
+    def _setup_service_labels(self, service):
+        for metric in self._metrics[service]:
+            name = re.sub('[^a-z0-9A-Z]', '_', metric).lower()
+            if 'region_metric' in metric:
+                label = ['cluster', 'host', 'region']
+            elif 'table_metric' in metric:
+                label = ['cluster', 'host', 'table']
+            elif 'User_metric' in metric:
+                label = ['cluster', 'host', 'user']
             else:
-                continue
+                label = ['cluster', 'host']
+            self._hbase_regionserver_metrics[service][metric] = GaugeMetricFamily("_".join([self._prefix, service.lower(), name]),
+                                                                                  self._metrics[service][metric],
+                                                                                  labels=label)
 
-    def _get_tables_metrics(self, bean, service, host):
-        for metric in bean:
-            if metric in self._metrics[service]:
-                if "_table_" in metric and 'metric' in metric:
-                    table = metric.split("_metric_")[0].split("table_")[1]
-                    key = "".join(["table", metric.split(table)[-1]])
-                    self._hbase_regionserver_metrics[service][key].add_metric(
-                        [self._cluster, host, table], bean[metric])
-                elif metric in self._metrics[service]:
-                    self._hbase_regionserver_metrics[service][metric].add_metric(
-                        [self._cluster, host], bean[metric])
-                else:
-                    continue
-            else:
-                continue
+    def _route(self, key, name):
+        # e.g. "Hadoop:service=HBase,name=RegionServer,sub=Regions"
+        if key.sub in self._metrics:
+            return (key.sub,)
+        return ()
 
-    def _get_users_metrics(self, bean, service, host):
+    def _setup_labels(self, beans):
+        services = set(service for service, _ in self._index.dispatch(beans))
+        self._load_families(self._hbase_regionserver_metrics, services)
+
+    def _get_labeled_metrics(self, bean, service, host):
+        # Regions, Tables and Users, whose attributes are per region, table or user.
+        # The names are parsed once per collector, and kept for the attributes of this scrape only,
+        # so those of the regions which moved away are dropped.
+        previous = self._attributes.get(service, {})
+        seen = {}
         for metric in bean:
-            if metric in self._metrics[service]:
-                if "User_" in metric and '_metric_' in metric:
-                    user = metric.split("_metric_")[0].split("User_")[1]
-                    key = "".join(["User", metric.split(user)[-1]])
-                    self._hbase_regionserver_metrics[service][key].add_metric(
-                        [self._cluster, host, user], bean[metric])
-                elif metric in self._metrics[service]:
-                    self._hbase_regionserver_metrics[service][metric].add_metric(
-                        [self._cluster, host], bean[metric])
-                else:
-                    continue
-            else:
+            if metric not in self._metrics[service] and not _labeled_metrics:
                 continue
+            parsed = previous[metric] if metric in previous else parse_attribute(service, metric)
+            seen[metric] = parsed
+            if parsed is not None and parsed[1] in self._metrics[service]:
+                label, key = parsed
+                self._hbase_regionserver_metrics[service][key].add_metric(
+                    [self._cluster, host, label], bean[metric])
+            elif metric in self._metrics[service]:
+                self._hbase_regionserver_metrics[service][metric].add_metric(
+                    [self._cluster, host], bean[metric])
+        self._attributes[service] = seen
 
     def _get_other_metrics(self, bean, service, host):
         for metric in bean:
@@ -131,15 +146,12 @@ class HBaseRegionServerMetricCollector(MetricCollector):
             else:
                 continue
 
-        for i in range(len(beans)):
-            for service in self._metrics:
-                if 'Regions' == service and 'sub={0}'.format(service) in beans[i]['name']:
-                    self._get_regions_metrics(beans[i], service, host)
-                elif 'Tables' == service and 'sub={0}'.format(service) in beans[i]['name']:
-                    self._get_tables_metrics(beans[i], service, host)
-                elif 'Users' == service and 'sub={0}'.format(service) in beans[i]['name']:
-                    self._get_users_metrics(beans[i], service, host)
-                elif 'sub={0}'.format(service) in beans[i]['name']:
-                    self._get_other_metrics(beans[i], service, host)
-                else:
-                    continue
+        handlers = {
+            'Regions': self._get_labeled_metrics,
+            'Tables': self._get_labeled_metrics,
+            'Users': self._get_labeled_metrics,
+        }
+        for service, bean in self._index.dispatch(beans):
+            self._memo.map(self._hbase_regionserver_metrics[service], service, bean,
+                           handlers.get(service, self._get_other_metrics), service, host)
+        self._memo.sweep()
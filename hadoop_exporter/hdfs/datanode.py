@@ -1,17 +1,31 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import yaml
 import re
 from prometheus_client.core import GaugeMetricFamily
 
-from hadoop_exporter import utils
+from hadoop_exporter import decoder, utils
+from hadoop_exporter.classifier import AttributeClassifier
 from hadoop_exporter.common import MetricCollector, common_metrics_info
 
+# attribute name -> (family, label values), e.g. "BlocksRead" -> ("Blocks", ("Read",)),
+# "ReadsFromLocalClient" -> ("Client", ("Reads", "Local"))
+DNACTIVITY_CLASSIFIER = AttributeClassifier([
+    (r'.*?Blocks(?P<oper>.*)', 'Blocks'),
+    (r'(?P<oper>.*?)From(?P<client>.*?)Client.*', 'Client'),
+])
+
+# e.g. "ReadIoRateNumOps" -> ("IoRateNumOps", ("Read",))
+DNVOLUME_CLASSIFIER = AttributeClassifier([
+    (r'(?P<oper>.*?)IoRateNumOps.*', 'IoRateNumOps'),
+    (r'(?P<oper>.*?)IoRateAvgTime.*', 'IoRateAvgTime'),
+])
+
 
 class HDFSDataNodeMetricCollector(MetricCollector):
     COMPONENT = "hdfs"
     SERVICE = "datanode"
+    BEAN_QUERY = "Hadoop:service=DataNode,name={0}*,*"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -21,34 +35,29 @@ class HDFSDataNodeMetricCollector(MetricCollector):
         self._hdfs_datanode_metrics = {}
         for i in range(len(self._file_list)):
             self._hdfs_datanode_metrics.setdefault(self._file_list[i], {})
-
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_metrics_labels(beans)
-
-            # add metric value to every metric.
-            self._get_metrics(beans)
-
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._hdfs_datanode_metrics.update(common_metrics())
-
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._hdfs_datanode_metrics[service]:
-                    yield self._hdfs_datanode_metrics[service][metric]
+        self._descriptors = self._compile_descriptors(self._hdfs_datanode_metrics, {
+            'DataNodeInfo': self._setup_dninfo_labels,
+            'DataNodeActivity': self._setup_dnactivity_labels,
+            'DataNodeVolume': self._setup_dnvolume_labels,
+            'FSDatasetState': self._setup_fsdatasetstate_labels,
+        })
+
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_metrics_labels(beans)
+
+        # add metric value to every metric.
+        self._get_metrics(beans)
+
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._hdfs_datanode_metrics.update(common_metrics())
+
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._hdfs_datanode_metrics[service]:
+                yield self._hdfs_datanode_metrics[service][metric]
 
     def _setup_dninfo_labels(self):
         for metric in self._metrics['DataNodeInfo']:
@@ -152,22 +161,19 @@ class HDFSDataNodeMetricCollector(MetricCollector):
 
     def _setup_metrics_labels(self, beans):
         # The metrics we want to export.
-        for bean in beans:
-            if 'DataNodeInfo' in bean['name']:
-                self._setup_dninfo_labels()
-            if 'DataNodeActivity' in self._metrics:
-                self._setup_dnactivity_labels()
-            if 'DataNodeVolume' in self._metrics:
-                self._setup_dnvolume_labels()
-            if 'FSDatasetState' in self._metrics:
-                self._setup_fsdatasetstate_labels()
+        services = set(service for service, _ in self._index.dispatch(beans)
+                       if service == 'DataNodeInfo')
+        if beans:
+            # files without a metrics definition are skipped by _load_families.
+            services.update(['DataNodeActivity', 'DataNodeVolume', 'FSDatasetState'])
+        self._load_families(self._hdfs_datanode_metrics, services)
 
     def _get_dninfo_metrics(self, bean):
         for metric in self._metrics['DataNodeInfo']:
             version = bean['Version']
             if 'ActorState' in metric:
                 if 'BPServiceActorInfo' in bean:
-                    actor_info_list = yaml.safe_load(
+                    actor_info_list = decoder.loads_embedded(
                         bean['BPServiceActorInfo'])
                     for j in range(len(actor_info_list)):
                         host = actor_info_list[j]['NamenodeAddress'].split(':')[
@@ -182,7 +188,7 @@ class HDFSDataNodeMetricCollector(MetricCollector):
                     continue
             elif 'VolumeInfo' in metric:
                 if 'VolumeInfo' in bean:
-                    volume_info_dict = yaml.safe_load(bean['VolumeInfo'])
+                    volume_info_dict = decoder.loads_embedded(bean['VolumeInfo'])
                     for k, v in volume_info_dict.items():
                         path = k
                         for key, val in v.items():
@@ -200,36 +206,15 @@ class HDFSDataNodeMetricCollector(MetricCollector):
     def _get_dnactivity_metrics(self, bean):
         for metric in self._metrics['DataNodeActivity']:
             host = bean['tag.Hostname']
-            label = [self._cluster, host]
-            if 'Blocks' in metric:
-                oper = metric.split("Blocks")[1]
-                label.append(oper)
-                key = "Blocks"
-            elif 'Client' in metric:
-                oper = metric.split("Client")[0].split("From")[0]
-                client = metric.split("Client")[0].split("From")[1]
-                label.extend([oper, client])
-                key = "Client"
-            else:
-                key = metric
-            self._hdfs_datanode_metrics['DataNodeActivity'][key].add_metric(label,
+            key, values = DNACTIVITY_CLASSIFIER.classify(metric)
+            self._hdfs_datanode_metrics['DataNodeActivity'][key].add_metric((self._cluster, host) + values,
                                                                             bean[metric] if metric in bean else 0)
 
     def _get_dnvolume_metrics(self, bean):
         for metric in self._metrics['DataNodeVolume']:
             host = bean['tag.Hostname']
-            label = [self._cluster, host]
-            if 'IoRateNumOps' in metric:
-                oper = metric.split("IoRateNumOps")[0]
-                label.append(oper)
-                key = "IoRateNumOps"
-            elif 'IoRateAvgTime' in metric:
-                oper = metric.split("IoRateAvgTime")[0]
-                label.append(oper)
-                key = "IoRateAvgTime"
-            else:
-                key = metric
-            self._hdfs_datanode_metrics['DataNodeVolume'][key].add_metric(label,
+            key, values = DNVOLUME_CLASSIFIER.classify(metric)
+            self._hdfs_datanode_metrics['DataNodeVolume'][key].add_metric((self._cluster, host) + values,
                                                                           bean[metric] if metric in bean else 0)
 
     def _get_fsdatasetstate_metrics(self, bean):
@@ -240,12 +225,16 @@ class HDFSDataNodeMetricCollector(MetricCollector):
                 label, bean[metric] if metric in bean else 0)
 
     def _get_metrics(self, beans):
-        for bean in beans:
-            if 'DataNodeInfo' in bean['name']:
-                self._get_dninfo_metrics(bean)
-            if 'DataNodeActivity' in bean['name']:
-                self._get_dnactivity_metrics(bean)
-            if 'DataNodeVolume' in bean['name']:
-                self._get_dnvolume_metrics(bean)
-            if 'FSDatasetState' in bean['name'] and 'FSDatasetState' in bean['modelerType']:
-                self._get_fsdatasetstate_metrics(bean)
+        handlers = {
+            'DataNodeInfo': self._get_dninfo_metrics,
+            'DataNodeActivity': self._get_dnactivity_metrics,
+            'DataNodeVolume': self._get_dnvolume_metrics,
+            'FSDatasetState': self._get_fsdatasetstate_metrics,
+        }
+        for service, bean in self._index.dispatch(beans):
+            if 'FSDatasetState' == service and 'FSDatasetState' not in bean['modelerType']:
+                # the per storage FSDatasetState-<uuid> beans.
+                continue
+            if service in handlers:
+                self._memo.map(self._hdfs_datanode_metrics[service], service, bean, handlers[service])
+        self._memo.sweep()
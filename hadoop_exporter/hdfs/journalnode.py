@@ -11,6 +11,7 @@ from hadoop_exporter.common import MetricCollector, common_metrics_info
 class HDFSJournalNodeMetricCollector(MetricCollector):
     COMPONENT = "hdfs"
     SERVICE = "journalnode"
+    BEAN_QUERY = "Hadoop:service=JournalNode,name={0}*,*"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -20,34 +21,26 @@ class HDFSJournalNodeMetricCollector(MetricCollector):
         self._hdfs_journalnode_metrics = {}
         for i in range(len(self._file_list)):
             self._hdfs_journalnode_metrics.setdefault(self._file_list[i], {})
+        self._descriptors = self._compile_descriptors(self._hdfs_journalnode_metrics, {
+            'Journal-prod': self._setup_journalprod_labels,
+        })
 
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_metrics_labels(beans)
 
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_metrics_labels(beans)
+        # add metric value to every metric.
+        self._get_metrics(beans)
 
-            # add metric value to every metric.
-            self._get_metrics(beans)
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._hdfs_journalnode_metrics.update(common_metrics())
 
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._hdfs_journalnode_metrics.update(common_metrics())
-
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._hdfs_journalnode_metrics[service]:
-                    yield self._hdfs_journalnode_metrics[service][metric]
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._hdfs_journalnode_metrics[service]:
+                yield self._hdfs_journalnode_metrics[service][metric]
 
     def _setup_journalprod_labels(self):
         prod_num_flag, a_60_latency_flag, a_300_latency_flag, a_3600_latency_flag = 1, 1, 1, 1
@@ -98,16 +91,15 @@ class HDFSJournalNodeMetricCollector(MetricCollector):
 
     def _setup_metrics_labels(self, beans):
         # The metrics we want to export.
-        for bean in beans:
-            if 'Journal-prod' in bean['name']:
-                self._setup_journalprod_labels()
+        services = set(service for service, _ in self._index.dispatch(beans))
+        self._load_families(self._hdfs_journalnode_metrics, services)
 
     def _get_metrics(self, beans):
         # bean is a type of <Dict>
         # status is a type of <Str>
 
-        for bean in beans:
-            if 'Journal-prod' in bean['name']:
+        for service, bean in self._index.dispatch(beans):
+            if 'Journal-prod' == service:
                 if 'Journal-prod' in self._metrics:
                     host = bean['tag.Hostname']
                     label = [self._cluster, host]
@@ -5,12 +5,45 @@ import re
 from prometheus_client.core import GaugeMetricFamily
 
 from hadoop_exporter import utils
+from hadoop_exporter.classifier import AttributeClassifier
 from hadoop_exporter.common import MetricCollector, common_metrics_info
 
+# attribute name -> (family, label values), e.g. "CreateFileOps" -> ("Operations", ("CreateFile",))
+NNACTIVITY_CLASSIFIER = AttributeClassifier([
+    (r'(?P<method>.*?)NumOps.*', 'MethodNumOps'),
+    (r'(?P<method>.*?)AvgTime.*', 'MethodAvgTime'),
+    (r'(?P<method>.*?)Ops.*', 'Operations'),
+    (r'(?P<method>.*)', 'Operations'),
+])
+
+# e.g. "LoadingFsImageCount" -> ("PhaseCount", ("LoadingFsImage",)), "ElapsedTime" -> ("ElapsedTime", ())
+STARTUPPROGRESS_CLASSIFIER = AttributeClassifier([
+    (r'(?P<phase>.*?)Count.*', 'PhaseCount'),
+    (r'(?!ElapsedTime$)(?P<phase>.*?)ElapsedTime.*', 'PhaseElapsedTime'),
+    (r'(?P<phase>.*?)Total.*', 'PhaseTotal'),
+    (r'(?!PercentComplete$)(?P<phase>.*?)PercentComplete.*', 'PhasePercentComplete'),
+])
+
+# e.g. "CapacityUsed" -> ("capacity", ("Used",))
+FSNAMESYSTEM_CLASSIFIER = AttributeClassifier([
+    (r'Capacity(?P<mode>.*)', 'capacity'),
+])
+
+# e.g. "NumLiveDataNodes" -> ("datanodes_num", ("Live",))
+FSNAMESYSTEM_STATE_CLASSIFIER = AttributeClassifier([
+    (r'.*?Num(?P<state>.*?)DataNodes.*', 'datanodes_num'),
+])
+
+# e.g. "CacheHit" -> ("cache", ("Hit",))
+RETRYCACHE_CLASSIFIER = AttributeClassifier([
+    (r'.*?Cache(?P<mode>.*)', 'cache'),
+])
+
 
 class HDFSNameNodeMetricCollector(MetricCollector):
     COMPONENT = "hdfs"
     SERVICE = "namenode"
+    BEAN_QUERY = "Hadoop:service=NameNode,name={0}*,*"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -20,34 +53,30 @@ class HDFSNameNodeMetricCollector(MetricCollector):
         self._hdfs_namenode_metrics = {}
         for f in self._file_list:
             self._hdfs_namenode_metrics.setdefault(f, {})
+        self._descriptors = self._compile_descriptors(self._hdfs_namenode_metrics, {
+            'NameNodeActivity': self._setup_nnactivity_labels,
+            'StartupProgress': self._setup_startupprogress_labels,
+            'FSNamesystem': self._setup_fsnamesystem_labels,
+            'FSNamesystemState': self._setup_fsnamesystem_state_labels,
+            'RetryCache': self._setup_retrycache_labels,
+        })
 
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_metrics_labels(beans)
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_metrics_labels(beans)
 
-            # add metric value to every metric.
-            self._get_metrics(beans)
+        # add metric value to every metric.
+        self._get_metrics(beans)
 
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._hdfs_namenode_metrics.update(common_metrics())
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._hdfs_namenode_metrics.update(common_metrics())
 
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._hdfs_namenode_metrics[service]:
-                    yield self._hdfs_namenode_metrics[service][metric]
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._hdfs_namenode_metrics[service]:
+                yield self._hdfs_namenode_metrics[service][metric]
 
     def _setup_nnactivity_labels(self):
         num_namenode_flag, avg_namenode_flag, ops_namenode_flag = 1, 1, 1
@@ -211,71 +240,25 @@ class HDFSNameNodeMetricCollector(MetricCollector):
 
     def _setup_metrics_labels(self, beans):
         # The metrics we want to export.
-        for bean in beans:
-            if 'NameNodeActivity' in bean['name']:
-                self._setup_nnactivity_labels()
-
-            if 'StartupProgress' in bean['name']:
-                self._setup_startupprogress_labels()
-
-            if 'FSNamesystem' in bean['name']:
-                self._setup_fsnamesystem_labels()
-
-            if 'FSNamesystemState' in bean['name']:
-                self._setup_fsnamesystem_state_labels()
-
-            if 'RetryCache' in bean['name']:
-                self._setup_retrycache_labels()
+        services = set(service for service, _ in self._index.dispatch(beans))
+        self._load_families(self._hdfs_namenode_metrics, services)
 
     def _get_nnactivity_metrics(self, bean):
         for metric in self._metrics['NameNodeActivity']:
-            if "NumOps" in metric:
-                method = metric.split('NumOps')[0]
-                labels = [self._cluster, method]
-                key = "MethodNumOps"
-            elif "AvgTime" in metric:
-                method = metric.split('AvgTime')[0]
-                labels = [self._cluster, method]
-                key = "MethodAvgTime"
-            else:
-                if "Ops" in metric:
-                    method = metric.split('Ops')[0]
-                else:
-                    method = metric
-                labels = [self._cluster, method]
-                key = "Operations"
+            key, values = NNACTIVITY_CLASSIFIER.classify(metric)
             self._hdfs_namenode_metrics['NameNodeActivity'][key].add_metric(
-                labels, bean[metric] if metric in bean else 0)
+                (self._cluster,) + values, bean[metric] if metric in bean else 0)
 
     def _get_startupprogress_metrics(self, bean):
         for metric in self._metrics['StartupProgress']:
-            snake_case = re.sub('([a-z0-9])([A-Z])', r'\1_\2', metric).lower()
-            if "Count" in metric:
-                key = "PhaseCount"
-                phase = metric.split("Count")[0]
-                labels = [self._cluster, phase]
-            elif "ElapsedTime" in metric and "ElapsedTime" != metric:
-                key = "PhaseElapsedTime"
-                phase = metric.split("ElapsedTime")[0]
-                labels = [self._cluster, phase]
-            elif "Total" in metric:
-                key = "PhaseTotal"
-                phase = metric.split("Total")[0]
-                labels = [self._cluster, phase]
-            elif "PercentComplete" in metric and "PercentComplete" != metric:
-                key = "PhasePercentComplete"
-                phase = metric.split("PercentComplete")[0]
-                labels = [self._cluster, phase]
-            else:
-                key = metric
-                labels = [self._cluster]
+            key, values = STARTUPPROGRESS_CLASSIFIER.classify(metric)
             self._hdfs_namenode_metrics['StartupProgress'][key].add_metric(
-                labels, bean[metric] if metric in bean else 0)
+                (self._cluster,) + values, bean[metric] if metric in bean else 0)
 
     def _get_fsnamesystem_metrics(self, bean):
         for metric in self._metrics['FSNamesystem']:
-            key = metric
-            if 'HAState' in metric:
+            key, values = FSNAMESYSTEM_CLASSIFIER.classify(metric)
+            if 'HAState' == key:
                 labels = [self._cluster]
                 if 'initializing' == bean['tag.HAState']:
                     value = 0.0
@@ -289,22 +272,15 @@ class HDFSNameNodeMetricCollector(MetricCollector):
                     value = 9999
                 self._hdfs_namenode_metrics['FSNamesystem'][key].add_metric(
                     labels, value)
-            elif metric.startswith("Capacity"):
-                key = 'capacity'
-                mode = metric.split("Capacity")[1]
-                labels = [self._cluster, mode]
-                self._hdfs_namenode_metrics['FSNamesystem'][key].add_metric(
-                    labels, bean[metric] if metric in bean else 0)
             else:
-                labels = [self._cluster]
                 self._hdfs_namenode_metrics['FSNamesystem'][key].add_metric(
-                    labels, bean[metric] if metric in bean else 0)
+                    (self._cluster,) + values, bean[metric] if metric in bean else 0)
 
     def _get_fsnamesystem_state_metrics(self, bean):
         for metric in self._metrics['FSNamesystemState']:
             labels = [self._cluster]
-            key = metric
-            if 'FSState' in metric:
+            key, values = FSNAMESYSTEM_STATE_CLASSIFIER.classify(metric)
+            if 'FSState' == key:
                 if 'Safemode' == bean['FSState']:
                     value = 0.0
                 elif 'Operational' == bean['FSState']:
@@ -313,36 +289,28 @@ class HDFSNameNodeMetricCollector(MetricCollector):
                     value = 9999
                 self._hdfs_namenode_metrics['FSNamesystemState'][key].add_metric(
                     labels, value)
-            elif "TotalSyncTimes" in metric:
+            elif "TotalSyncTimes" == key:
                 self._hdfs_namenode_metrics['FSNamesystemState'][key].add_metric(labels, float(
                     re.sub('\s', '', bean[metric])) if metric in bean and bean[metric] else 0)
-            elif "DataNodes" in metric:
-                key = 'datanodes_num'
-                state = metric.split("DataNodes")[0].split("Num")[1]
-                labels = [self._cluster, state]
-                self._hdfs_namenode_metrics['FSNamesystemState'][key].add_metric(
-                    labels, bean[metric] if metric in bean and bean[metric] else 0)
-
             else:
                 self._hdfs_namenode_metrics['FSNamesystemState'][key].add_metric(
-                    labels, bean[metric] if metric in bean and bean[metric] else 0)
+                    (self._cluster,) + values, bean[metric] if metric in bean and bean[metric] else 0)
 
     def _get_retrycache_metrics(self, bean):
         for metric in self._metrics['RetryCache']:
-            key = "cache"
-            labels = [self._cluster, metric.split('Cache')[1]]
+            key, values = RETRYCACHE_CLASSIFIER.classify(metric)
             self._hdfs_namenode_metrics['RetryCache'][key].add_metric(
-                labels, bean[metric] if metric in bean and bean[metric] else 0)
+                (self._cluster,) + values, bean[metric] if metric in bean and bean[metric] else 0)
 
     def _get_metrics(self, beans):
-        for bean in beans:
-            if 'NameNodeActivity' in bean['name']:
-                self._get_nnactivity_metrics(bean)
-            if 'StartupProgress' in bean['name']:
-                self._get_startupprogress_metrics(bean)
-            if 'FSNamesystem' in bean['name'] and 'FSNamesystemState' not in bean['name']:
-                self._get_fsnamesystem_metrics(bean)
-            if 'FSNamesystemState' in bean['name']:
-                self._get_fsnamesystem_state_metrics(bean)
-            if 'RetryCache' in bean['name']:
-                self._get_retrycache_metrics(bean)
+        handlers = {
+            'NameNodeActivity': self._get_nnactivity_metrics,
+            'StartupProgress': self._get_startupprogress_metrics,
+            'FSNamesystem': self._get_fsnamesystem_metrics,
+            'FSNamesystemState': self._get_fsnamesystem_state_metrics,
+            'RetryCache': self._get_retrycache_metrics,
+        }
+        for service, bean in self._index.dispatch(beans):
+            if service in handlers:
+                self._memo.map(self._hdfs_namenode_metrics[service], service, bean, handlers[service])
+        self._memo.sweep()
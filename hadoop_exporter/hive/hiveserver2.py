@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import functools
 import re
 import time
 from prometheus_client.core import GaugeMetricFamily
@@ -21,43 +22,53 @@ class HiveServer2MetricCollector(MetricCollector):
         self._hive_hiveserver2_metrics = {}
         for i in range(len(self._file_list)):
             self._hive_hiveserver2_metrics.setdefault(self._file_list[i], {})
+        # compiled against all the metrics of a file, a scrape only keeps the ones the bean has.
+        self._descriptors = self._compile_descriptors(self._hive_hiveserver2_metrics, {
+            service: functools.partial(self._setup_service_labels, self._metrics[service], service) for service in self._metrics
+        })
+
+    def _fetch_beans(self):
+        count = 0
+        # In case no metrics we need in the jmx url, a time sleep and while-loop was set here to wait for the KEY metrics
+        while count < 5:
+            beans = MetricCollector._fetch_beans(self)
+            if 'init_total_count_tables' not in beans:
+                count += 1
+                time.sleep(1)
+                continue
+            else:
+                break
+        return beans
+
+    async def _fetch_beans_async(self, session):
+        count = 0
+        # The same wait as _fetch_beans, without blocking the event loop.
+        while count < 5:
+            beans = await MetricCollector._fetch_beans_async(self, session)
+            if 'init_total_count_tables' not in beans:
+                count += 1
+                await session.sleep(1)
+                continue
+            else:
+                break
+        return beans
 
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-        try:
-            count = 0
-            # In case no metrics we need in the jmx url, a time sleep and while-loop was set here to wait for the KEY metrics
-            while count < 5:
-                beans = utils.get_metrics(self._url)
-                if 'init_total_count_tables' not in beans:
-                    count += 1
-                    time.sleep(1)
-                    continue
-                else:
-                    break
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-        else:
-            pass
-        finally:
-            # set up all metrics with labels and descriptions.
-            self._setup_labels(beans)
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_labels(beans)
 
-            # add metric value to every metric.
-            self._get_metrics(beans)
+        # add metric value to every metric.
+        self._get_metrics(beans)
 
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._hive_hiveserver2_metrics.update(common_metrics())
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._hive_hiveserver2_metrics.update(common_metrics())
 
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._hive_hiveserver2_metrics[service]:
-                    yield self._hive_hiveserver2_metrics[service][metric]
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._hive_hiveserver2_metrics[service]:
+                yield self._hive_hiveserver2_metrics[service][metric]
 
     def _setup_node_labels(self, bean, service):
         label = ["cluster", "host", "client_id", "node_id"]
@@ -95,20 +106,26 @@ class HiveServer2MetricCollector(MetricCollector):
                                                                                     self._metrics[service][metric],
                                                                                     labels=label)
 
+    def _setup_service_labels(self, bean, service):
+        if 'producer-node-metrics' == service:
+            self._setup_node_labels(bean, service)
+        elif 'producer-topic-metrics' == service:
+            self._setup_topic_labels(bean, service)
+        elif 'producer-metrics' == service or 'kafka-metrics-count' == service:
+            self._setup_producer_labels(bean, service)
+        else:
+            self._setup_other_labels(bean, service)
+
+    def _route(self, key, name):
+        # hive beans do not follow the Hadoop naming, e.g. "kafka.producer:type=producer-metrics,client-id=...",
+        # a bean goes to every metrics file whose name it contains.
+        return tuple(service for service in self._metrics if service in name)
+
     def _setup_labels(self, beans):
         # The metrics we want to export.
-        for service in self._metrics:
-            for bean in beans:
-                if 'producer-node-metrics' == service and 'type=producer-node-metrics' in bean['name']:
-                    self._setup_node_labels(bean, service)
-                elif 'producer-topic-metrics' == service and 'type=producer-topic-metrics' in bean['name']:
-                    self._setup_topic_labels(bean, service)
-                elif 'producer-metrics' == service and 'type=producer-metrics' in bean['name'] or 'kafka-metrics-count' == service and 'type=kafka-metrics-count' in bean['name']:
-                    self._setup_producer_labels(bean, service)
-                elif service in bean['name']:
-                    self._setup_other_labels(bean, service)
-                else:
-                    continue
+        for service, bean in self._index.dispatch(beans):
+            # only the families of the metrics the bean has.
+            self._load_families(self._hive_hiveserver2_metrics, [service], bean)
 
     def _get_node_metrics(self, bean, service, host):
         client_id = bean['name'].split('client-id=')[1].split(',')[0]
@@ -156,15 +173,11 @@ class HiveServer2MetricCollector(MetricCollector):
                 break
             else:
                 continue
-        for bean in beans:
-            for service in self._metrics:
-                if 'producer-node-metrics' == service and 'type=producer-node-metrics' in bean['name']:
-                    self._get_node_metrics(bean, service, host)
-                elif 'producer-topic-metrics' == service and 'type=producer-topic-metrics' in bean['name']:
-                    self._get_topic_metrics(bean, service, host)
-                elif 'producer-metrics' == service and 'type=producer-metrics' in bean['name'] or 'kafka-metrics-count' == service and 'type=kafka-metrics-count' in bean['name']:
-                    self._get_producer_metrics(bean, service, host)
-                elif service in bean['name']:
-                    self._get_other_metrics(bean, service, host)
-                else:
-                    continue
+        handlers = {
+            'producer-node-metrics': self._get_node_metrics,
+            'producer-topic-metrics': self._get_topic_metrics,
+            'producer-metrics': self._get_producer_metrics,
+            'kafka-metrics-count': self._get_producer_metrics,
+        }
+        for service, bean in self._index.dispatch(beans):
+            handlers.get(service, self._get_other_metrics)(bean, service, host)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import functools
 import re
 from prometheus_client.core import GaugeMetricFamily
 
@@ -11,6 +12,7 @@ from hadoop_exporter.common import MetricCollector, common_metrics_info
 class HiveLlapDaemonMetricCollector(MetricCollector):
     COMPONENT = "hive"
     SERVICE = "llapdaemon"
+    BEAN_QUERY = "Hadoop:service=LlapDaemon,name={0}*,*"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -20,34 +22,27 @@ class HiveLlapDaemonMetricCollector(MetricCollector):
         self._hive_llapdaemon_metrics = {}
         for i in range(len(self._file_list)):
             self._hive_llapdaemon_metrics.setdefault(self._file_list[i], {})
+        # compiled against all the metrics of a file, a scrape only keeps the ones the bean has.
+        self._descriptors = self._compile_descriptors(self._hive_llapdaemon_metrics, {
+            service: functools.partial(self._setup_service_labels, self._metrics[service], service) for service in self._metrics
+        })
 
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_labels(beans)
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_labels(beans)
 
-            # add metric value to every metric.
-            self._get_metrics(beans)
+        # add metric value to every metric.
+        self._get_metrics(beans)
 
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._hive_llapdaemon_metrics.update(common_metrics())
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._hive_llapdaemon_metrics.update(common_metrics())
 
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._hive_llapdaemon_metrics[service]:
-                    yield self._hive_llapdaemon_metrics[service][metric]
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._hive_llapdaemon_metrics[service]:
+                yield self._hive_llapdaemon_metrics[service][metric]
 
     def _setup_executor_labels(self, bean, service):
         for metric in self._metrics[service]:
@@ -74,16 +69,17 @@ class HiveLlapDaemonMetricCollector(MetricCollector):
             else:
                 continue
 
+    def _setup_service_labels(self, bean, service):
+        if 'LlapDaemonExecutorMetrics' == service:
+            self._setup_executor_labels(bean, service)
+        else:
+            self._setup_other_labels(bean, service)
+
     def _setup_labels(self, beans):
         # The metrics we want to export.
-        for service in self._metrics:
-            for bean in beans:
-                if 'LlapDaemonExecutorMetrics' == service and 'LlapDaemonExecutorMetrics' in bean['name']:
-                    self._setup_executor_labels(bean, service)
-                elif service in bean['name']:
-                    self._setup_other_labels(bean, service)
-                else:
-                    continue
+        for service, bean in self._index.dispatch(beans):
+            # only the families of the metrics the bean has.
+            self._load_families(self._hive_llapdaemon_metrics, [service], bean)
 
     def _get_executor_metrics(self, bean, service, host):
         for metric in bean:
@@ -115,11 +111,8 @@ class HiveLlapDaemonMetricCollector(MetricCollector):
                 break
             else:
                 continue
-        for bean in beans:
-            for service in self._metrics:
-                if 'LlapDaemonExecutorMetrics' == service and 'LlapDaemonExecutorMetrics' in bean['name']:
-                    self._get_executor_metrics(bean, service, host)
-                elif service in bean['name']:
-                    self._get_other_metrics(bean, service, host)
-                else:
-                    continue
+        for service, bean in self._index.dispatch(beans):
+            if 'LlapDaemonExecutorMetrics' == service:
+                self._get_executor_metrics(bean, service, host)
+            else:
+                self._get_other_metrics(bean, service, host)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import fnmatch
+import json
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from hadoop_exporter import decoder
+
+CHUNK_SIZE = 64 * 1024
+# Responses up to this size are decoded in one call of the json backend, the bigger ones are scanned bean by bean.
+# A whole decode is several times faster than the scan, but it holds the whole body and decodes the beans which are
+# not wanted too. With one chunk, only the responses read in one go are decoded whole, memory stays bounded by the
+# chunk and the largest wanted bean.
+WHOLE_SIZE = CHUNK_SIZE
+
+# Everything but structural characters, strings are consumed as a whole so their content is never inspected.
+_SKIP = re.compile(rb'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+# The rest of a string which was cut by a chunk boundary, up to (not including) the closing quote.
+_STRING_BODY = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*')
+# Hadoop's jmx servlet always writes the bean name first.
+_NAME = re.compile(rb'\s*"name"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+_QUOTE = ord('"')
+_OPEN = (ord('{'), ord('['))
+_OPEN_BEAN = ord('{')
+
+# Depth of a bean object: {"beans": [ {...}, ... ]}
+_BEAN_DEPTH = 3
+
+
+class PayloadTooLarge(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def parse_object_name(name):
+    '''
+    parse a jmx ObjectName, e.g. "Hadoop:service=NameNode,name=FSNamesystem".
+    @return a tuple of the domain and a dict of its key properties. The dict is shared, do not modify it.
+    '''
+    domain, _, keys = name.partition(':')
+    props = {}
+    for kv in keys.split(','):
+        k, sep, v = kv.partition('=')
+        if sep:
+            props[k.strip()] = v
+    return domain, props
+
+
+# The key properties of a bean name which Hadoop uses to tell beans apart, the others are kept in extra.
+BeanKey = namedtuple('BeanKey', ['domain', 'service', 'name', 'sub', 'type', 'extra'])
+
+_KEY_PROPERTIES = frozenset(['service', 'name', 'sub', 'type'])
+
+
+@lru_cache(maxsize=4096)
+def bean_key(name):
+    '''
+    @param name: A bean name, e.g. "Hadoop:service=HBase,name=RegionServer,sub=Regions".
+    @return a BeanKey, the missing properties are None and extra is a sorted tuple of (key, value) of the other properties.
+    '''
+    domain, props = parse_object_name(name)
+    extra = tuple(sorted((k, v) for k, v in props.items() if k not in _KEY_PROPERTIES))
+    return BeanKey(domain, props.get('service'), props.get('name'), props.get('sub'), props.get('type'), extra)
+
+
+def longest_prefix(value, candidates):
+    '''
+    @return the longest of candidates which value starts with, e.g. "FSNamesystemState" for "FSNamesystemState"
+    among ["FSNamesystem", "FSNamesystemState"], None if there is none.
+    '''
+    if value is None:
+        return None
+    best = None
+    for candidate in candidates:
+        if value.startswith(candidate) and (best is None or len(candidate) > len(best)):
+            best = candidate
+    return best
+
+
+class BeanIndex(object):
+    '''
+    BeanIndex routes each bean to the metrics files describing it.
+    The routes of a bean name are resolved once from its parsed BeanKey, later scrapes only do a dict lookup.
+    '''
+    MAX_ROUTES = 4096
+
+    def __init__(self, resolve):
+        '''
+        @param resolve: A function of (BeanKey, bean name) returning a tuple of routes, e.g. metrics file names,
+                        empty for the beans which are not exported.
+        '''
+        self._resolve = resolve
+        self._routes = {}
+
+    def routes(self, name):
+        routes = self._routes.get(name)
+        if routes is None:
+            if len(self._routes) >= self.MAX_ROUTES:
+                self._routes = {}
+            routes = self._routes[name] = tuple(self._resolve(bean_key(name), name))
+        return routes
+
+    def dispatch(self, beans):
+        '''
+        @return an iterator of (route, bean) for every route of every bean, in the order of beans.
+        '''
+        for bean in beans:
+            for route in self.routes(bean['name']):
+                yield route, bean
+
+
+@lru_cache(maxsize=256)
+def object_name_matcher(pattern):
+    '''
+    @param pattern: A jmx ObjectName pattern as accepted by the jmx servlet ?qry=, e.g. "Hadoop:name=RpcActivity*,*".
+    @return a function telling whether a bean name matches the pattern.
+    '''
+    domain, _, keys = pattern.partition(':')
+    wildcard = False
+    props = []
+    for kv in keys.split(','):
+        if kv == '*':
+            wildcard = True
+            continue
+        k, _, v = kv.partition('=')
+        props.append((k, v))
+    keyset = frozenset(k for k, _ in props)
+
+    def match(name):
+        name_domain, name_props = parse_object_name(name)
+        if not fnmatch.fnmatchcase(name_domain, domain):
+            return False
+        if not wildcard and keyset != name_props.keys():
+            return False
+        for k, v in props:
+            if k not in name_props or not fnmatch.fnmatchcase(name_props[k], v):
+                return False
+        return True
+    return match
+
+
+def query_matcher(queries):
+    '''
+    @param queries: The jmx servlet query params of a collector, see MetricCollector._setup_queries.
+    @return a function telling whether a bean name is wanted by one of the queries, or None if all beans are wanted.
+    '''
+    if not queries:
+        return None
+    exact, matchers = set(), []
+    for params in queries:
+        if 'get' in params:
+            exact.add(params['get'].split('::')[0])
+        else:
+            matchers.append(object_name_matcher(params['qry']))
+
+    def wanted(name):
+        return name in exact or any(m(name) for m in matchers)
+    return wanted
+
+
+def iter_beans(chunks, wanted=None, max_size=None, loads=decoder.loads, whole_size=WHOLE_SIZE):
+    '''
+    Decode a jmx servlet response incrementally and yield its beans one at a time.
+    Only the bytes of the bean being decoded are kept, and the beans not wanted are skipped without being decoded.
+    @param chunks: An iterable of bytes, e.g. response.iter_content(CHUNK_SIZE).
+    @param wanted: A function of the bean name telling whether the bean is wanted, None for all beans.
+    @param max_size: Max number of bytes to read, PayloadTooLarge is raised beyond it. None or 0 for no limit.
+    @param loads: The json decoder applied on the bytes of each wanted bean.
+    @param whole_size: A response which ends within this many bytes is decoded at once, 0 to always scan.
+                       Decoding at once is faster, scanning keeps less in memory, see WHOLE_SIZE.
+    '''
+    stream = BeanStream(wanted, max_size, loads, whole_size)
+    for data in chunks:
+        for bean in stream.feed(data):
+            yield bean
+    for bean in stream.close():
+        yield bean
+
+
+class BeanStream(object):
+    '''
+    BeanStream is iter_beans for responses which are not read by an iterator, e.g. an asyncio stream:
+    feed() it the chunks as they arrive, then close() it at the end of the response.
+    Both return the beans completed by the call, the arguments are those of iter_beans.
+    '''
+
+    def __init__(self, wanted=None, max_size=None, loads=decoder.loads, whole_size=WHOLE_SIZE):
+        self._wanted = wanted
+        self._max_size = max_size
+        self._loads = loads
+        self._whole_size = whole_size
+        self._size = 0
+        self._head = bytearray()
+        self._scanner = None
+
+    def feed(self, data):
+        self._size += len(data)
+        if self._max_size and self._size > self._max_size:
+            raise PayloadTooLarge(
+                "jmx payload is larger than {0} bytes".format(self._max_size))
+        if self._scanner is not None:
+            return self._scanner.feed(data)
+        self._head += data
+        if len(self._head) <= self._whole_size:
+            return []
+        self._scanner = _Scanner(self._wanted, self._loads)
+        head, self._head = bytes(self._head), None
+        return self._scanner.feed(head)
+
+    def close(self):
+        if self._scanner is not None:
+            return []
+        doc = self._loads(bytes(self._head)) if self._head else None
+        wanted = self._wanted
+        return [bean for bean in (doc or {}).get('beans', ())
+                if wanted is None or wanted(bean.get('name', ''))]
+
+
+class _Scanner(object):
+    '''
+    The bean by bean decoder of the responses bigger than the whole size, its state is kept between two chunks.
+    '''
+
+    def __init__(self, wanted, loads):
+        self.wanted = wanted
+        self.loads = loads
+        self.depth = 0
+        self.in_string = self.escape = False
+        # state of the current bean: None (outside), 'head' (name still unknown), 'keep' or 'skip'.
+        self.state = None
+        self.buf = bytearray()
+
+    def feed(self, data):
+        wanted, loads, buf = self.wanted, self.loads, self.buf
+        depth, in_string, escape, state = self.depth, self.in_string, self.escape, self.state
+        beans = []
+        n = len(data)
+        pos = start = 0
+        while pos < n:
+            if escape:
+                escape = False
+                pos += 1
+                continue
+            if in_string:
+                pos = _STRING_BODY.match(data, pos).end()
+                if pos == n:
+                    break
+                if data[pos] == _QUOTE:
+                    in_string = False
+                else:
+                    # a backslash ending the chunk, the escaped byte is in the next chunk.
+                    escape = True
+                pos += 1
+                continue
+
+            pos = _SKIP.match(data, pos).end()
+            if pos == n:
+                break
+            c = data[pos]
+            if c == _QUOTE:
+                # a string cut by the chunk boundary.
+                in_string = True
+                pos += 1
+                continue
+
+            if c in _OPEN:
+                depth += 1
+                if depth == _BEAN_DEPTH and c == _OPEN_BEAN:
+                    state, start = 'head', pos
+                    del buf[:]
+                    if wanted is not None:
+                        m = _NAME.match(data, pos + 1)
+                        if m is not None:
+                            state = 'keep' if wanted(_unescape(m.group(1))) else 'skip'
+                    else:
+                        state = 'keep'
+            else:
+                depth -= 1
+                if depth == _BEAN_DEPTH - 1 and state is not None:
+                    if state != 'skip':
+                        if buf:
+                            buf += data[start:pos + 1]
+                            bean = loads(bytes(buf))
+                            del buf[:]
+                        else:
+                            bean = loads(data[start:pos + 1])
+                        if state == 'keep' or wanted(bean.get('name', '')):
+                            beans.append(bean)
+                    state = None
+            pos += 1
+
+        if state == 'head' or state == 'keep':
+            buf += data[start:]
+            start = 0
+            if state == 'head':
+                m = _NAME.match(buf, 1)
+                if m is not None:
+                    state = 'keep' if wanted(_unescape(m.group(1))) else 'skip'
+                    if state == 'skip':
+                        del buf[:]
+        self.depth, self.in_string, self.escape, self.state = depth, in_string, escape, state
+        return beans
+
+
+def _unescape(raw):
+    if b'\\' in raw:
+        return json.loads(b'"' + raw + b'"')
+    return raw.decode('utf-8')
@@ -8,6 +8,7 @@ from hadoop_exporter.common import MetricCollector, common_metrics_info
 class MapredJobHistoryMetricCollector(MetricCollector):
     COMPONENT = "mapred"
     SERVICE = "jobhistory"
+    BEAN_QUERY = "Hadoop:service=JobHistoryServer,name={0}*,*"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -18,30 +19,20 @@ class MapredJobHistoryMetricCollector(MetricCollector):
         # for i in range(len(self._file_list)):
         #     self._mapred_jobhistory_metrics.setdefault(self._file_list[i], {})
 
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            # self._setup_metrics_labels()
-
-            # add metric value to every metric.
-            # self._get_metrics(self._beans)
-
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._mapred_jobhistory_metrics.update(common_metrics())
-
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._mapred_jobhistory_metrics[service]:
-                    yield self._mapred_jobhistory_metrics[service][metric]
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        # self._setup_metrics_labels()
+
+        # add metric value to every metric.
+        # self._get_metrics(self._beans)
+
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._mapred_jobhistory_metrics.update(common_metrics())
+
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            # the metrics of the jobhistory files are not set up yet, only the common ones are there.
+            for metric in self._mapred_jobhistory_metrics.get(service, {}):
+                yield self._mapred_jobhistory_metrics[service][metric]
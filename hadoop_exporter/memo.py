@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Incremental mapping of beans into families.
+Many beans do not change from poll to poll, e.g. Runtime, DataNodeInfo or StartupProgress once the NameNode is up.
+The samples a bean added to the families are remembered with the bean, and added again as they are
+while the next polls return the same bean, without running the mapping code.
+'''
+
+from hadoop_exporter.samples import ColumnarFamily
+
+
+class BeanMemo(object):
+    '''
+    BeanMemo remembers, per route and bean name, the bean last mapped and the samples it added to each family.
+    The fingerprint of a bean is the decoded bean itself: comparing it with the last one walks the values once
+    like hashing would, but never mistakes a changed bean for an unchanged one.
+    A collector is never polled twice at once, a BeanMemo is not shared between collectors.
+    '''
+
+    def __init__(self):
+        # entries of the last poll and of the current one, {(route, bean name): (bean, args, segments)}.
+        # The entries of the beans which are gone are dropped by sweep().
+        self._last = {}
+        self._current = {}
+        self.hits = 0
+        self.misses = 0
+
+    def map(self, families, route, bean, handler, *args):
+        '''
+        Add the samples of a bean to families, with handler(bean, *args) or from the last poll if the bean did not change.
+        @param families: The {key: family} dict handler adds to, e.g. self._hdfs_namenode_metrics['FSNamesystem'].
+        @param route: The route of the bean, e.g. its metrics file name.
+        @param bean: The decoded bean.
+        @param handler: The mapping function of the route, it must only add samples to families
+                        and only depend on the bean and args.
+        @param args: The other arguments of handler, e.g. the host of the collector.
+        '''
+        key = (route, bean.get('name'))
+        entry = self._last.get(key)
+        if entry is not None and entry[0] == bean and entry[1] == args and self._replay(families, entry[2]):
+            self._current[key] = entry
+            self.hits += 1
+            return
+        self.misses += 1
+        marks = self._marks(families)
+        handler(bean, *args)
+        if marks is not None:
+            self._current[key] = (bean, args, self._segments(families, marks))
+
+    def sweep(self):
+        '''
+        End a poll: forget the beans which were not mapped during it.
+        '''
+        self._last = self._current
+        self._current = {}
+
+    @staticmethod
+    def _marks(families):
+        '''
+        @return {key: number of samples} of families, None if one of them is not columnar, e.g. a histogram,
+                whose samples can not be told apart by bean.
+        '''
+        marks = {}
+        for key, family in families.items():
+            if not isinstance(family, ColumnarFamily):
+                return None
+            marks[key] = len(family)
+        return marks
+
+    @staticmethod
+    def _segments(families, marks):
+        '''
+        @return a tuple of (key, label tuples, values, timestamps) of the samples added since marks.
+        '''
+        segments = []
+        for key, family in families.items():
+            start = marks.get(key, 0)
+            if len(family) > start:
+                timestamps = family.timestamps[start:] if family.timestamps is not None else None
+                segments.append((key, family.keys[start:], family.values[start:], timestamps))
+        return tuple(segments)
+
+    @staticmethod
+    def _replay(families, segments):
+        '''
+        Add the remembered samples to the families, nothing is added when one of the families is missing.
+        @return True if they were added.
+        '''
+        for key, _, _, _ in segments:
+            if not isinstance(families.get(key), ColumnarFamily):
+                return False
+        for key, keys, values, timestamps in segments:
+            families[key].extend(keys, values, timestamps)
+        return True
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Multi-target probes, in the style of blackbox_exporter: /probe?target=<jmx url>&module=<component>.<service>
+polls that one target when the request comes and answers its metrics, so that one exporter covers a whole fleet
+of DataNodes or NodeManagers listed in the Prometheus config, instead of one config entry or process per node.
+The collector of a target is kept between its probes, the ones which are not probed anymore are evicted,
+and the least recently probed ones beyond the max number of targets.
+'''
+
+import collections
+import threading
+import time
+from urllib.parse import urlsplit
+
+from prometheus_client.core import GaugeMetricFamily
+
+from hadoop_exporter import samples, utils
+
+logger = utils.get_logger(__name__)
+
+CONCURRENCY_DEFAULT = 32
+IDLE_DEFAULT = 600
+MAX_TARGETS_DEFAULT = 10000
+# seconds a probe waits for a free slot when the scraper does not tell its timeout.
+TIMEOUT_DEFAULT = 10
+
+
+class ProbeError(Exception):
+    '''
+    ProbeError is a probe which can not be answered, status is the HTTP status of the response.
+    '''
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def target_url(target):
+    '''
+    @param target: A jmx url, or the host:port of the jmx servlet, e.g. the address of a Prometheus target.
+    @return the jmx url, e.g. http://dn1:9864/jmx for dn1:9864.
+    '''
+    if '://' not in target:
+        target = 'http://' + target
+    parts = urlsplit(target)
+    if not parts.hostname:
+        raise ProbeError(400, 'invalid target {0}'.format(target))
+    if parts.path in ('', '/'):
+        target = target.rstrip('/') + '/jmx'
+    return target
+
+
+class _Target(object):
+    __slots__ = ('collector', 'cluster', 'lock', 'used')
+
+    def __init__(self, collector, cluster):
+        self.collector = collector
+        self.cluster = cluster
+        # a collector reuses its families from poll to poll, the probes of a target run one at a time.
+        self.lock = threading.Lock()
+        self.used = time.monotonic()
+
+
+def _samples(families):
+    return sum(len(f) if isinstance(f, samples.ColumnarView) else len(f.samples) for f in families)
+
+
+class Prober(object):
+    '''
+    Prober answers the probes of the http server with the collectors of the modules, cached per target.
+    '''
+
+    def __init__(self, modules, cluster='hadoop_cluster', concurrency=CONCURRENCY_DEFAULT, idle=IDLE_DEFAULT,
+                 max_targets=MAX_TARGETS_DEFAULT):
+        '''
+        @param modules: {component: {service: collector class}}, e.g. Exporter.COLLECTOR_MAPPING.
+        @param cluster: The cluster label of the probes which do not set the cluster parameter.
+        @param concurrency: Max number of probes polling at the same time, the others wait for a slot.
+        @param idle: Seconds after which the collector of a target which is not probed anymore is dropped.
+        @param max_targets: Max number of targets whose collector is kept, the least recently probed are dropped.
+        '''
+        self.modules = dict(('{0}.{1}'.format(component, service), cls)
+                            for component, services in modules.items() for service, cls in services.items())
+        self.cluster = cluster
+        self.idle = idle
+        self.max_targets = max(1, int(max_targets))
+        self._slots = threading.BoundedSemaphore(concurrency)
+        # (module, url) -> _Target, from the least to the most recently probed.
+        self._targets = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def __len__(self):
+        return len(self._targets)
+
+    def _target(self, module, url, cluster):
+        # keyed without the cluster, a probe with another cluster rebuilds the collector of the target,
+        # so the cluster parameter can not grow the cache.
+        key = (module, url)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept > self.idle / 2:
+                self._sweep(now)
+            target = self._targets.get(key)
+            if target is not None:
+                self._targets.move_to_end(key)
+                target.used = now
+                return target
+        # a new collector reads its metrics definitions, the other probes do not wait on it.
+        # Two first probes of a target may both build one, the first inserted is kept.
+        built = _Target(self.modules[module](cluster, url), cluster)
+        with self._lock:
+            target = self._targets.setdefault(key, built)
+            self._targets.move_to_end(key)
+            target.used = now
+            evicted = 0
+            while len(self._targets) > self.max_targets:
+                self._targets.popitem(last=False)
+                evicted += 1
+        if evicted:
+            logger.info("dropped the collectors of {0} least recently probed targets, over {1} targets".format(
+                evicted, self.max_targets))
+        return target
+
+    def _sweep(self, now):
+        gone = 0
+        # the least recently probed come first.
+        while self._targets:
+            key, target = next(iter(self._targets.items()))
+            if now - target.used <= self.idle:
+                break
+            del self._targets[key]
+            gone += 1
+        self._swept = now
+        if gone:
+            logger.info("dropped the collectors of {0} targets not probed for {1}s".format(gone, self.idle))
+
+    def reload(self):
+        '''
+        Drop every cached collector, the next probes build them from the current metrics definitions.
+        '''
+        with self._lock:
+            self._targets = collections.OrderedDict()
+
+    def probe(self, params, timeout=None):
+        '''
+        @param params: The query parameters of the request, {name: [values]}: target, module and an optional cluster.
+        @param timeout: Seconds to wait for a free slot, e.g. the scrape timeout of Prometheus.
+        @return the families of the target, followed by probe_success and probe_duration_seconds.
+        '''
+        target = params.get('target', [None])[0]
+        module = params.get('module', [None])[0]
+        if not target:
+            raise ProbeError(400, 'target parameter is missing')
+        if module not in self.modules:
+            raise ProbeError(400, 'unknown module {0}, one of: {1}'.format(module, ', '.join(sorted(self.modules))))
+        url = target_url(target)
+        cluster = params.get('cluster', [self.cluster])[0]
+
+        deadline = time.monotonic() + (timeout or TIMEOUT_DEFAULT)
+        entry = self._target(module, url, cluster)
+        # the probes of the same target queue on its lock, not on a slot, so they can not starve the others.
+        if not entry.lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise ProbeError(503, 'a probe of {0} is still in flight'.format(url))
+        try:
+            if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise ProbeError(503, 'too many probes in flight')
+            try:
+                if entry.cluster != cluster:
+                    entry.collector, entry.cluster = self.modules[module](cluster, url), cluster
+                start = time.time()
+                try:
+                    # the columns are frozen, the next probe of the target does not change what is being served.
+                    families = [samples.freeze(family) for family in entry.collector.collect()]
+                except Exception as e:
+                    logger.warning("error when probing {0}: {1!r}".format(url, e))
+                    families = []
+                duration = time.time() - start
+            finally:
+                self._slots.release()
+        finally:
+            entry.lock.release()
+
+        success = GaugeMetricFamily('probe_success', 'Whether the jmx of the target returned metrics.')
+        success.add_metric([], 1 if _samples(families) else 0)
+        seconds = GaugeMetricFamily('probe_duration_seconds', 'Seconds the probe of the target took.')
+        seconds.add_metric([], duration)
+        return families + [success, seconds]
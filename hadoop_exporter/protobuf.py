@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Prometheus protobuf exposition format: length delimited io.prometheus.client.MetricFamily messages.
+The messages are small and fixed, they are written by hand and there is no dependency on the protobuf package.
+Like the text serializer, the encoded labels of every series of a gauge family are kept with the family,
+a scrape only encodes the values.
+'''
+
+import math
+import struct
+
+from hadoop_exporter.samples import ColumnarView
+
+CONTENT_TYPE = 'application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; encoding=delimited'
+
+# io.prometheus.client.MetricType
+COUNTER, GAUGE, SUMMARY, UNTYPED, HISTOGRAM, GAUGE_HISTOGRAM = range(6)
+
+# prometheus_client family type -> (MetricType, suffix of the family name)
+_TYPES = {
+    'counter': (COUNTER, '_total'),
+    'gauge': (GAUGE, ''),
+    'summary': (SUMMARY, ''),
+    'histogram': (HISTOGRAM, ''),
+    'gaugehistogram': (GAUGE_HISTOGRAM, ''),
+    'info': (GAUGE, '_info'),
+    'stateset': (GAUGE, ''),
+    'unknown': (UNTYPED, ''),
+    'untyped': (UNTYPED, ''),
+}
+
+_LENGTH_DELIMITED = 2
+_FIXED64 = 1
+_VARINT = 0
+
+_pack_double = struct.Struct('<d').pack
+
+
+def _varint(n):
+    n &= 0xffffffffffffffff
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _tag(field, wire):
+    return _varint(field << 3 | wire)
+
+
+def _message(field, data):
+    return _tag(field, _LENGTH_DELIMITED) + _varint(len(data)) + data
+
+
+def _string(field, text):
+    return _message(field, text.encode('utf-8'))
+
+
+def _double(field, value):
+    return _tag(field, _FIXED64) + _pack_double(value)
+
+
+def _uint(field, value):
+    return _tag(field, _VARINT) + _varint(value)
+
+
+# the encoded value of a Gauge, Counter or Untyped message: field 1, a double.
+_VALUE = _tag(1, _FIXED64)
+# Metric fields.
+_METRIC = _tag(4, _LENGTH_DELIMITED)
+_GAUGE = _tag(2, _LENGTH_DELIMITED)
+_GAUGE_LENGTH = _varint(len(_VALUE) + 8)
+_TIMESTAMP_MS = _tag(6, _VARINT)
+
+
+def _labels(labels):
+    '''
+    @param labels: (name, value) pairs.
+    @return the LabelPair fields of a Metric, sorted by label name.
+    '''
+    return b''.join(_message(1, _string(1, name) + _string(2, value)) for name, value in sorted(labels))
+
+
+def _timestamp_ms(timestamp):
+    if timestamp is None:
+        return b''
+    return _TIMESTAMP_MS + _varint(int(float(timestamp) * 1000))
+
+
+def _timestamp(field, seconds):
+    '''
+    @return a google.protobuf.Timestamp field.
+    '''
+    nanos = int(round((seconds - math.floor(seconds)) * 1e9))
+    whole = int(math.floor(seconds))
+    if nanos >= 1000000000:
+        whole, nanos = whole + 1, nanos - 1000000000
+    return _message(field, _uint(1, whole) + (_uint(2, nanos) if nanos else b''))
+
+
+class EncodedFamily(object):
+    '''
+    EncodedFamily is the encoded part of a FamilyHeader: the name, help and type fields, and the labels of every series seen.
+    '''
+    __slots__ = ('head', 'labelnames', 'labels')
+
+    # Labels of the series which are gone are kept until there are twice as many as series, plus this.
+    LABEL_SLACK = 64
+
+    def __init__(self, header):
+        self.labelnames = header.labelnames
+        self.head = _string(1, header.name) + _string(2, header.documentation) + _uint(3, GAUGE)
+        self.labels = {}
+
+    def metric_head(self, key):
+        '''
+        @param key: The label values of a series.
+        @return the labels of its Metric, followed by the tag and length of its Gauge field.
+        '''
+        head = self.labels.get(key)
+        if head is None:
+            head = self.labels[key] = _labels(zip(self.labelnames, (str(v) for v in key))) + _GAUGE + _GAUGE_LENGTH
+        return head
+
+    def prune(self, series):
+        if len(self.labels) > 2 * series + self.LABEL_SLACK:
+            self.labels = {}
+
+
+def encoded(header):
+    '''
+    @return the EncodedFamily of a FamilyHeader, built on the first call.
+    '''
+    if header.encoded is None:
+        header.encoded = EncodedFamily(header)
+    return header.encoded
+
+
+def _encode_columnar(family):
+    e = encoded(family.header)
+    e.prune(len(family.keys))
+    metric_head = e.metric_head
+    parts = [e.head]
+    timestamps = family.timestamps if family.timestamps is not None else (None,) * len(family.keys)
+    for key, value, timestamp in zip(family.keys, family.values, timestamps):
+        metric = metric_head(key) + _VALUE + _pack_double(value) + _timestamp_ms(timestamp)
+        parts.append(_METRIC)
+        parts.append(_varint(len(metric)))
+        parts.append(metric)
+    return b''.join(parts)
+
+
+def _group(samples, ignore):
+    '''
+    @return the samples grouped by their labels but ignore, in the order of their first sample:
+            a list of (labels, [(sample, value of ignore)]).
+    '''
+    groups = {}
+    for s in samples:
+        key = tuple(sorted((k, v) for k, v in s.labels.items() if k != ignore))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = []
+        group.append((s, s.labels.get(ignore)))
+    return list(groups.items())
+
+
+def _count(value):
+    # counts are integers in the messages, a float count goes into the _float field.
+    if float(value).is_integer() and value >= 0:
+        return True, int(value)
+    return False, float(value)
+
+
+def _encode_sampled(family):
+    '''
+    Encode a prometheus_client family from its samples, e.g. a histogram, or the process metrics.
+    '''
+    metric_type, suffix = _TYPES.get(family.type, (UNTYPED, ''))
+    name = family.name + suffix
+    metrics = []
+    if metric_type in (GAUGE, UNTYPED):
+        field = 2 if GAUGE == metric_type else 5
+        for s in family.samples:
+            metrics.append(_labels(s.labels.items()) + _message(field, _double(1, s.value)) + _timestamp_ms(s.timestamp))
+    elif COUNTER == metric_type:
+        for labels, group in _group(family.samples, None):
+            counter, timestamp = b'', None
+            for s, _ in group:
+                if s.name.endswith('_created'):
+                    counter += _timestamp(3, s.value)
+                else:
+                    counter = _double(1, s.value) + counter
+                    timestamp = s.timestamp
+            metrics.append(_labels(labels) + _message(3, counter) + _timestamp_ms(timestamp))
+    elif SUMMARY == metric_type:
+        for labels, group in _group(family.samples, 'quantile'):
+            summary, timestamp = b'', None
+            for s, quantile in group:
+                if s.name.endswith('_count'):
+                    # a Summary has no float count.
+                    summary += _uint(1, int(s.value) if math.isfinite(s.value) else 0)
+                elif s.name.endswith('_sum'):
+                    summary += _double(2, s.value)
+                elif s.name.endswith('_created'):
+                    summary += _timestamp(4, s.value)
+                else:
+                    summary += _message(3, _double(1, float(quantile)) + _double(2, s.value))
+                timestamp = s.timestamp if timestamp is None else timestamp
+            metrics.append(_labels(labels) + _message(4, summary) + _timestamp_ms(timestamp))
+    else:
+        for labels, group in _group(family.samples, 'le'):
+            histogram, timestamp = b'', None
+            for s, bound in group:
+                if s.name.endswith('_bucket'):
+                    if math.isinf(float(bound)):
+                        # implied by the sample count.
+                        continue
+                    integral, count = _count(s.value)
+                    histogram += _message(3, (_uint(1, count) if integral else _double(4, count)) + _double(2, float(bound)))
+                elif s.name.endswith('_count') or s.name.endswith('_gcount'):
+                    integral, count = _count(s.value)
+                    histogram += _uint(1, count) if integral else _double(4, count)
+                elif s.name.endswith('_sum') or s.name.endswith('_gsum'):
+                    histogram += _double(2, s.value)
+                elif s.name.endswith('_created'):
+                    histogram += _timestamp(15, s.value)
+                timestamp = s.timestamp if timestamp is None else timestamp
+            metrics.append(_labels(labels) + _message(7, histogram) + _timestamp_ms(timestamp))
+    if not metrics:
+        return None
+    head = _string(1, name) + _string(2, family.documentation) + _uint(3, metric_type)
+    return head + b''.join(_message(4, metric) for metric in metrics)
+
+
+def write_family(family, out):
+    '''
+    Append the delimited MetricFamily message of a family to out, nothing for a family without samples.
+    @param family: A ColumnarView, or any prometheus_client family.
+    @param out: A bytearray.
+    '''
+    if isinstance(family, ColumnarView) and 'gauge' == family.type:
+        if not len(family):
+            return
+        message = _encode_columnar(family)
+    else:
+        message = _encode_sampled(family)
+        if message is None:
+            return
+    out += _varint(len(message))
+    out += message
+
+
+def render(families):
+    '''
+    @param families: An iterable of families, e.g. collector.collect().
+    @return their delimited MetricFamily messages, as bytes.
+    '''
+    out = bytearray()
+    for family in families:
+        write_family(family, out)
+    return bytes(out)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Prometheus remote write: push mode for exporters which Prometheus cannot scrape, e.g. behind a firewall.
+Every new snapshot of the registry is sent as snappy compressed prometheus.WriteRequest messages,
+cut into requests of a bounded number of series. A request which fails is retried with backoff,
+then kept in a bounded queue on the disk and sent again, oldest first, once the receiver is back.
+'''
+
+import os
+import random
+import time
+import traceback
+
+import requests
+from prometheus_client.core import REGISTRY
+
+from hadoop_exporter import protobuf, snappy_codec, transport, utils
+from hadoop_exporter.samples import ColumnarView
+from hadoop_exporter.scheduler import EMPTY_SNAPSHOT, Snapshot, registry_collectors
+
+logger = utils.get_logger(__name__)
+
+BATCH_SIZE_DEFAULT = 2000
+QUEUE_SIZE_DEFAULT = 64 * 1024 * 1024
+
+# a request is cut before it gets bigger than this, whatever the number of its series.
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+
+HEADERS = {
+    'Content-Encoding': 'snappy',
+    'Content-Type': 'application/x-protobuf',
+    'User-Agent': 'hadoop_exporter',
+    'X-Prometheus-Remote-Write-Version': '0.1.0',
+}
+
+# WriteRequest.timeseries
+_TIMESERIES = protobuf._tag(1, protobuf._LENGTH_DELIMITED)
+# TimeSeries.samples
+_SAMPLE = protobuf._tag(2, protobuf._LENGTH_DELIMITED)
+_SAMPLE_VALUE = protobuf._tag(1, protobuf._FIXED64)
+_SAMPLE_TIMESTAMP = protobuf._tag(2, protobuf._VARINT)
+
+
+def _labels(name, labels, extra):
+    '''
+    @param name: The metric name.
+    @param labels: (name, value) pairs of the series.
+    @param extra: (name, value) pairs added to the series which do not have them, e.g. the instance.
+    @return the Label fields of a TimeSeries, sorted by label name as the receivers require.
+    '''
+    pairs = dict(extra)
+    pairs.update((k, str(v)) for k, v in labels)
+    pairs['__name__'] = name
+    return b''.join(protobuf._message(1, protobuf._string(1, k) + protobuf._string(2, v))
+                    for k, v in sorted(pairs.items()))
+
+
+def _timestamp(seconds):
+    return _SAMPLE_TIMESTAMP + protobuf._varint(int(float(seconds) * 1000))
+
+
+def _timeseries(labels, value, timestamp):
+    '''
+    @param timestamp: The encoded timestamp field of the sample, see _timestamp.
+    @return the WriteRequest field of a TimeSeries of one sample.
+    '''
+    sample = _SAMPLE_VALUE + protobuf._pack_double(value) + timestamp
+    series = labels + _SAMPLE + protobuf._varint(len(sample)) + sample
+    return _TIMESERIES + protobuf._varint(len(series)) + series
+
+
+class DiskQueue(object):
+    '''
+    DiskQueue keeps the compressed requests which could not be sent, one file each, named by their order.
+    When the files grow over max_bytes the oldest ones are dropped. The queue survives a restart of the exporter.
+    '''
+
+    SUFFIX = '.snappy'
+
+    def __init__(self, directory, max_bytes=QUEUE_SIZE_DEFAULT):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._files = []
+        self.size = 0
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(self.SUFFIX):
+                size = os.path.getsize(os.path.join(directory, name))
+                self._files.append((name, size))
+                self.size += size
+        self._seq = int(self._files[-1][0][:-len(self.SUFFIX)]) + 1 if self._files else 0
+
+    def __len__(self):
+        return len(self._files)
+
+    def put(self, body):
+        if len(body) > self.max_bytes:
+            logger.warning("remote write request of {0} bytes dropped, bigger than the queue".format(len(body)))
+            return
+        name = '{0:020d}{1}'.format(self._seq, self.SUFFIX)
+        self._seq += 1
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(body)
+        # a request is in the queue whole, or not at all.
+        os.replace(path + '.tmp', path)
+        self._files.append((name, len(body)))
+        self.size += len(body)
+        dropped = 0
+        while self.size > self.max_bytes:
+            self.pop()
+            dropped += 1
+        if dropped:
+            logger.warning("remote write queue is full, {0} oldest requests dropped".format(dropped))
+
+    def peek(self):
+        '''
+        @return the oldest request, None if the queue is empty.
+        '''
+        if not self._files:
+            return None
+        with open(os.path.join(self.directory, self._files[0][0]), 'rb') as f:
+            return f.read()
+
+    def pop(self):
+        name, size = self._files.pop(0)
+        self.size -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+
+class RemoteWriter(object):
+    '''
+    RemoteWriter pushes the registry to a remote write endpoint. It is added to the Scheduler like a service:
+    each poll() sends the snapshots which were polled since the last one, and the other collectors of the registry.
+    '''
+
+    # backoff between the attempts of one request, in seconds.
+    MIN_BACKOFF = 0.5
+    MAX_BACKOFF = 8.0
+    RETRIES = 3
+    TIMEOUT = 30
+
+    def __init__(self, url, registry=REGISTRY, period=None, batch_size=BATCH_SIZE_DEFAULT,
+                 queue_dir=None, queue_size=QUEUE_SIZE_DEFAULT, labels=None):
+        '''
+        @param url: The remote write endpoint, e.g. http://prometheus:9090/api/v1/write.
+        @param period: Seconds between two pushes, None for the period of the scheduler.
+        @param batch_size: Max number of series in one request.
+        @param queue_dir: Directory of the requests which could not be sent, None to drop them.
+        @param queue_size: Max bytes kept in queue_dir.
+        @param labels: Labels added to every series which does not have them, e.g. {'instance': 'host:9130'}.
+        '''
+        self.url = url
+        self.registry = registry
+        self.period = period
+        self.batch_size = batch_size
+        self.labels = tuple(sorted((labels or {}).items()))
+        self.queue = DiskQueue(queue_dir, queue_size) if queue_dir else None
+        # collector -> its last pushed snapshot, and the encoded labels of its series.
+        self._pushed = {}
+        self._encoded = {}
+
+    def __str__(self):
+        return "(remote write: {0})".format(self.url)
+
+    def _series(self, families, timestamp, previous, encoded):
+        '''
+        @param timestamp: Seconds, of the samples which have no timestamp of their own.
+        @param previous: The encoded labels of the last push of the collector, reused.
+        @param encoded: Where the encoded labels of this push are put.
+        @return a generator of the WriteRequest fields of every series of families.
+        '''
+        default = _timestamp(timestamp)
+        for family in families:
+            if isinstance(family, ColumnarView):
+                header = family.header
+                timestamps = family.timestamps if family.timestamps is not None else (None,) * len(family.keys)
+                for key, value, ts in zip(family.keys, family.values, timestamps):
+                    k = (header, key)
+                    labels = previous.get(k) or encoded.get(k)
+                    if labels is None:
+                        labels = _labels(header.name, zip(header.labelnames, key), self.labels)
+                    encoded[k] = labels
+                    yield _timeseries(labels, value, default if ts is None else _timestamp(ts))
+            else:
+                for s in family.samples:
+                    k = (s.name, tuple(sorted(s.labels.items())))
+                    labels = previous.get(k) or encoded.get(k)
+                    if labels is None:
+                        labels = _labels(s.name, k[1], self.labels)
+                    encoded[k] = labels
+                    ts = s.timestamp
+                    yield _timeseries(labels, s.value, default if ts is None else _timestamp(ts))
+
+    def series(self):
+        '''
+        @return a generator of the WriteRequest fields of the series to push: those of the snapshots which were
+                not pushed yet, and those of the collectors without snapshot, e.g. the process metrics.
+        '''
+        pushed, encoded = {}, {}
+        for collector in registry_collectors(self.registry):
+            snapshot = getattr(collector, 'snapshot', None)
+            if snapshot is None:
+                families, timestamp = collector.collect(), time.time()
+            elif snapshot is EMPTY_SNAPSHOT or snapshot is self._pushed.get(collector):
+                pushed[collector] = snapshot
+                encoded[collector] = self._encoded.get(collector, {})
+                continue
+            else:
+                families, timestamp = snapshot.families, snapshot.timestamp
+            pushed[collector] = snapshot
+            encoded[collector] = {}
+            yield from self._series(families, timestamp, self._encoded.get(collector, {}), encoded[collector])
+        # the collectors which are gone are dropped.
+        self._pushed, self._encoded = pushed, encoded
+
+    def requests(self, series):
+        '''
+        @param series: WriteRequest fields of TimeSeries.
+        @return a generator of the compressed requests, of batch_size series and MAX_REQUEST_BYTES at most.
+        '''
+        batch, size = [], 0
+        for s in series:
+            if batch and (len(batch) >= self.batch_size or size + len(s) > MAX_REQUEST_BYTES):
+                yield snappy_codec.compress(b''.join(batch))
+                batch, size = [], 0
+            batch.append(s)
+            size += len(s)
+        if batch:
+            yield snappy_codec.compress(b''.join(batch))
+
+    def _send(self, body):
+        '''
+        @return True when the request is done with, sent or refused for good, False if it may be sent again.
+        '''
+        try:
+            response = transport.session().post(self.url, data=body, headers=HEADERS, timeout=self.TIMEOUT)
+        except requests.RequestException as e:
+            logger.warning("error when sending to {0}: {1}".format(self.url, e))
+            return False
+        if response.status_code < 300:
+            return True
+        if 429 == response.status_code or response.status_code >= 500:
+            logger.warning("{0} answered {1}, request will be sent again".format(self.url, response.status_code))
+            return False
+        # e.g. out of order samples, sending them again would fail the same way.
+        logger.warning("{0} refused a request of {1} bytes: {2} {3}".format(
+            self.url, len(body), response.status_code, response.text[:256]))
+        return True
+
+    def deliver(self, body):
+        '''
+        Send a request, retried RETRIES times with an exponential backoff.
+        @return False if it could not be sent.
+        '''
+        backoff = self.MIN_BACKOFF
+        for attempt in range(self.RETRIES + 1):
+            if attempt:
+                # the jitter spreads the retries of the exporters which lost the same receiver.
+                time.sleep(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+            if self._send(body):
+                return True
+        return False
+
+    def drain(self):
+        '''
+        Send the queued requests, oldest first.
+        @return True when the queue is empty.
+        '''
+        if self.queue is None:
+            return True
+        sent = 0
+        while len(self.queue):
+            if not self.deliver(self.queue.peek()):
+                break
+            self.queue.pop()
+            sent += 1
+        if sent:
+            logger.info("sent {0} queued requests to {1}, {2} left".format(sent, self.url, len(self.queue)))
+        return not len(self.queue)
+
+    def push(self):
+        '''
+        Send what changed since the last push. While the receiver is down, the requests go to the queue,
+        after the older ones, so that the samples of a series always arrive in order.
+        @return the number of requests and their bytes.
+        '''
+        count = size = 0
+        drained = self.drain()
+        for body in self.requests(self.series()):
+            count += 1
+            size += len(body)
+            if drained and self.deliver(body):
+                continue
+            drained = False
+            if self.queue is not None:
+                self.queue.put(body)
+            else:
+                logger.warning("remote write request of {0} bytes dropped".format(len(body)))
+        return count, size
+
+    def poll(self):
+        start = time.time()
+        try:
+            count, size = self.push()
+            logger.debug("pushed {0} requests, {1} bytes to {2}".format(count, size, self.url))
+        except Exception:
+            logger.warning("error when pushing to {0}".format(self.url))
+            traceback.print_exc()
+        return Snapshot((), start, time.time() - start)
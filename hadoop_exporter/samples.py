@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Columnar storage of gauge samples.
+A family keeps one shared header, its values in an array of doubles and its label values as pooled tuples,
+there is no Sample tuple nor label dict per sample until the family is serialized.
+'''
+
+import sys
+from array import array
+
+from prometheus_client.samples import Sample
+
+
+class FamilyHeader(object):
+    '''
+    FamilyHeader is everything of a gauge family but its samples, it is shared by every scrape of the family.
+    '''
+    __slots__ = ('name', 'documentation', 'type', 'unit', 'labelnames', 'rendered', 'encoded')
+
+    def __init__(self, name, documentation, labelnames, type='gauge', unit=''):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.unit = unit
+        self.labelnames = tuple(labelnames)
+        # what the serializers keep of the family between scrapes, see exposition and protobuf.
+        self.rendered = None
+        self.encoded = None
+
+    @staticmethod
+    def of(family):
+        '''
+        @param family: An empty prometheus_client family, e.g. GaugeMetricFamily(name, documentation, labels=labels).
+        '''
+        return FamilyHeader(family.name, family.documentation, getattr(family, '_labelnames', ()),
+                            family.type, getattr(family, 'unit', ''))
+
+    def copy(self):
+        '''
+        @return the same header without what the serializers kept, e.g. for another collector of the family.
+        '''
+        return FamilyHeader(self.name, self.documentation, self.labelnames, self.type, self.unit)
+
+
+class ColumnarView(object):
+    '''
+    ColumnarView is a read only scrape of a ColumnarFamily, it reads like a prometheus_client Metric.
+    '''
+    __slots__ = ('header', 'keys', 'values', 'timestamps')
+
+    def __init__(self, header, keys, values, timestamps=None):
+        '''
+        @param header: The FamilyHeader.
+        @param keys: The label values of every sample, a list of tuples.
+        @param values: The value of every sample, an array('d') in the order of keys.
+        @param timestamps: None, or the timestamp of every sample in the order of keys.
+        '''
+        self.header = header
+        self.keys = keys
+        self.values = values
+        self.timestamps = timestamps
+
+    @property
+    def name(self):
+        return self.header.name
+
+    @property
+    def documentation(self):
+        return self.header.documentation
+
+    @property
+    def type(self):
+        return self.header.type
+
+    @property
+    def unit(self):
+        return self.header.unit
+
+    @property
+    def _labelnames(self):
+        return self.header.labelnames
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def samples(self):
+        '''
+        The samples as prometheus_client Sample tuples, built on each access for the serializers of prometheus_client.
+        '''
+        name, labelnames = self.header.name, self.header.labelnames
+        if self.timestamps is None:
+            return [Sample(name, dict(zip(labelnames, key)), value)
+                    for key, value in zip(self.keys, self.values)]
+        return [Sample(name, dict(zip(labelnames, key)), value, timestamp)
+                for key, value, timestamp in zip(self.keys, self.values, self.timestamps)]
+
+
+class ColumnarFamily(ColumnarView):
+    '''
+    ColumnarFamily replaces GaugeMetricFamily in the collectors, it has the same add_metric.
+    The family is reused from scrape to scrape: reset() starts new columns, and the label tuples seen
+    in the previous scrapes are reused instead of being built again.
+    '''
+    __slots__ = ('_pool',)
+
+    # Label tuples which were not seen in the last scrape are kept until the pool is twice as big as the family, plus this.
+    POOL_SLACK = 64
+
+    def __init__(self, header):
+        ColumnarView.__init__(self, header, [], array('d'))
+        self._pool = {}
+
+    def add_metric(self, labels, value, timestamp=None):
+        '''
+        @param labels: The label values, in the order of the label names.
+        @param value: A number, or a string of a number.
+        @param timestamp: An optional timestamp in seconds.
+        '''
+        key = tuple(labels)
+        pooled = self._pool.get(key)
+        if pooled is None:
+            pooled = tuple(sys.intern(v) if type(v) is str else v for v in key)
+            self._pool[pooled] = pooled
+        self.keys.append(pooled)
+        self.values.append(float(value))
+        if timestamp is not None and self.timestamps is None:
+            self.timestamps = [None] * (len(self.values) - 1)
+        if self.timestamps is not None:
+            self.timestamps.append(timestamp)
+
+    def extend(self, keys, values, timestamps=None):
+        '''
+        Append samples of a previous scrape, e.g. the samples of a bean which did not change, see memo.BeanMemo.
+        @param keys: Label tuples of this family, as found in keys.
+        @param values: Their values, an array('d').
+        @param timestamps: None, or their timestamps.
+        '''
+        if timestamps is not None and self.timestamps is None:
+            self.timestamps = [None] * len(self.values)
+        if self.timestamps is not None:
+            self.timestamps.extend(timestamps if timestamps is not None else [None] * len(keys))
+        self.keys.extend(keys)
+        self.values.extend(values)
+
+    def reset(self):
+        '''
+        Start the columns of a new scrape. The columns of the last scrape are left untouched,
+        a ColumnarView of them may still be served.
+        '''
+        if len(self._pool) > 2 * len(self.keys) + self.POOL_SLACK:
+            # e.g. the labels of the regions which moved to another RegionServer.
+            self._pool = {key: key for key in self.keys}
+        self.keys = []
+        self.values = array('d')
+        self.timestamps = None
+
+    def freeze(self):
+        '''
+        @return a ColumnarView of the current columns, which the next reset() does not change.
+        '''
+        return ColumnarView(self.header, self.keys, self.values, self.timestamps)
+
+
+def freeze(family):
+    '''
+    @return a view of family which stays the same while the collector scrapes again, e.g. to publish it in a snapshot.
+    '''
+    if isinstance(family, ColumnarFamily):
+        return family.freeze()
+    return family
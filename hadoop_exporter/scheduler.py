@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from hadoop_exporter import samples, utils
+
+logger = utils.get_logger(__name__)
+
+
+# The result of one poll of a collector. Scrapes only ever read a published snapshot,
+# they never touch the jmx endpoint themselves.
+Snapshot = namedtuple('Snapshot', ['families', 'timestamp', 'duration'])
+
+EMPTY_SNAPSHOT = Snapshot((), 0.0, 0.0)
+
+
+def registry_collectors(registry):
+    '''
+    The responses and the remote writes reuse the work of every SnapshotCollector until its next poll,
+    so they go through the collectors of a registry instead of registry.collect().
+    prometheus_client has no public way to list them, this reads the attributes of the CollectorRegistry of the
+    version pinned in requirements.txt. Any other registry, one whose attributes changed, or one which adds
+    families of its own (target_info), is returned as its only collector, so it is collected as a whole.
+    @return the collectors of the registry, in the order of registry.collect().
+    '''
+    names = getattr(registry, '_collector_to_names', None)
+    lock = getattr(registry, '_lock', None)
+    if not isinstance(names, dict) or lock is None or getattr(registry, '_target_info', None):
+        return [registry]
+    with lock:
+        return list(names)
+
+
+class SnapshotCollector(object):
+    '''
+    SnapshotCollector is what gets registered into the prometheus REGISTRY instead of the MetricCollector itself.
+    The Scheduler calls poll() in the background, and collect() just returns the latest snapshot.
+    '''
+
+    def __init__(self, collector):
+        '''
+        @param collector: A MetricCollector instance, e.g. HDFSNameNodeMetricCollector(cluster, url).
+        '''
+        self.collector = collector
+        self.snapshot = EMPTY_SNAPSHOT
+
+    def poll(self):
+        start = time.time()
+        try:
+            # the collector reuses its families on the next poll, the snapshot keeps views of this one.
+            families = tuple(samples.freeze(family) for family in self.collector.collect())
+        except Exception:
+            logger.warning("error when polling {0}".format(self.collector._url))
+            traceback.print_exc()
+            families = ()
+        # swapping the reference is atomic, scrapes see either the old or the new snapshot.
+        self.snapshot = Snapshot(families, start, time.time() - start)
+        return self.snapshot
+
+    def collect(self):
+        return iter(self.snapshot.families)
+
+    def describe(self):
+        # Metric names are only known after the first poll, so nothing is checked at registration.
+        return []
+
+
+class TargetGroup(object):
+    '''
+    TargetGroup is registered instead of the SnapshotCollectors of the discovered targets of one module, e.g. every
+    DataNode of the fleet. Their families have the same names, and not every series has a host label, so they are
+    served as one family per name, each series labeled with the instance of its target, e.g. "dn1:9864".
+    The merged snapshot is built again on the first scrape after one of the targets was polled, its timestamp is
+    the one of the last poll.
+    '''
+
+    LABEL = 'instance'
+
+    def __init__(self):
+        # SnapshotCollector -> its instance, in the order the targets were added.
+        self._members = {}
+        # (name, label names) -> the FamilyHeader of the merged family, kept for the render caches on it.
+        self._headers = {}
+        # (SnapshotCollector, name) -> the keys of its last family and the same keys with the instance.
+        self._keys = {}
+        # the member snapshots the merged snapshot was built from.
+        self._merged = ((), EMPTY_SNAPSHOT)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._members)
+
+    def add(self, collector, instance):
+        '''
+        @param collector: The SnapshotCollector of a target.
+        @param instance: The instance label of its series, e.g. the host:port of its jmx url.
+        '''
+        with self._lock:
+            self._members[collector] = instance
+
+    def remove(self, collector):
+        with self._lock:
+            self._members.pop(collector, None)
+            for key in [key for key in self._keys if key[0] is collector]:
+                del self._keys[key]
+
+    def _labeled(self, collector, family, instance):
+        cached = self._keys.get((collector, family.name))
+        # the targets which were not polled keep their keys, the keys of the others are pooled by their collector.
+        if cached is not None and (cached[0] is family.keys or cached[0] == family.keys):
+            return cached[1]
+        size = len(family.header.labelnames)
+        # a key shorter than the label names leaves the last labels out, e.g. UgiMetrics without a state,
+        # they are set empty, which Prometheus reads as no label, so the instance keeps its place.
+        labeled = [key + (instance,) if len(key) == size else key[:size] + ('',) * (size - len(key)) + (instance,)
+                   for key in family.keys]
+        self._keys[(collector, family.name)] = (family.keys, labeled)
+        return labeled
+
+    def _merge(self, parts):
+        '''
+        @param parts: The (family, instance, collector) of every target which has a family of the name.
+        @return one family with the series of all of them.
+        '''
+        first = parts[0][0]
+        labelnames = first.header.labelnames if isinstance(first, samples.ColumnarView) else None
+        if labelnames is not None and all(isinstance(f, samples.ColumnarView) and f.header.labelnames == labelnames
+                                          for f, _, _ in parts):
+            header = self._headers.get((first.name, labelnames))
+            if header is None:
+                header = self._headers[(first.name, labelnames)] = samples.FamilyHeader(
+                    first.name, first.documentation, labelnames + (self.LABEL,), first.type, first.unit)
+            keys, values, timestamps = [], array('d'), None
+            for family, instance, collector in parts:
+                keys.extend(self._labeled(collector, family, instance))
+                if family.timestamps is not None and timestamps is None:
+                    timestamps = [None] * len(values)
+                if timestamps is not None:
+                    timestamps.extend(family.timestamps or [None] * len(family.values))
+                values.extend(family.values)
+            return samples.ColumnarView(header, keys, values, timestamps)
+        # e.g. histograms, their samples are labeled one by one.
+        merged = copy.copy(first)
+        merged.samples = [s._replace(labels=dict(s.labels, **{self.LABEL: instance}))
+                          for family, instance, _ in parts for s in family.samples]
+        return merged
+
+    @property
+    def snapshot(self):
+        with self._lock:
+            members = list(self._members.items())
+            snapshots = tuple(collector.snapshot for collector, _ in members)
+            built = self._merged[0]
+            if len(built) == len(snapshots) and all(a is b for a, b in zip(built, snapshots)):
+                return self._merged[1]
+            names = {}
+            for (collector, instance), snapshot in zip(members, snapshots):
+                for family in snapshot.families:
+                    names.setdefault(family.name, []).append((family, instance, collector))
+            merged = Snapshot(tuple(self._merge(parts) for parts in names.values()),
+                              max([s.timestamp for s in snapshots] or [0.0]), max([s.duration for s in snapshots] or [0.0]))
+            self._merged = (snapshots, merged)
+            return merged
+
+    def collect(self):
+        return iter(self.snapshot.families)
+
+    def describe(self):
+        return []
+
+
+class Scheduler(object):
+    '''
+    Scheduler polls every added service on its own period and keeps polling until stop() is called.
+    Due services are polled in parallel on a bounded thread pool, a service is never polled twice at once.
+    '''
+
+    def __init__(self, period, concurrency=8):
+        '''
+        @param period: Default period (seconds) for services which do not set their own one.
+        @param concurrency: Max number of services polled at the same time.
+        '''
+        self.period = period
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix='poller')
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        # services removed while being polled, they are not scheduled again.
+        self._removed = set()
+
+    def _period_of(self, service):
+        return getattr(service, 'period', None) or self.period
+
+    def add(self, service, delay=0):
+        with self._cond:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._seq), service))
+            self._cond.notify()
+
+    def remove(self, service):
+        '''
+        Stop polling a service. A poll in flight is not interrupted, the service is just not scheduled again.
+        '''
+        with self._cond:
+            queue = [item for item in self._queue if item[2] is not service]
+            if len(queue) == len(self._queue):
+                self._removed.add(service)
+            else:
+                heapq.heapify(queue)
+                self._queue = queue
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def _next_due(self):
+        '''
+        Block until a service is due, return None when the scheduler has been stopped.
+        '''
+        with self._cond:
+            while not self._stopped:
+                if self._queue:
+                    wait = self._queue[0][0] - time.monotonic()
+                    if wait <= 0:
+                        return heapq.heappop(self._queue)
+                else:
+                    wait = None
+                self._cond.wait(wait)
+            return None
+
+    def _reschedule(self, due, service):
+        period = self._period_of(service)
+        now = time.monotonic()
+        next_due = due + period
+        if next_due < now:
+            # the poll took longer than the period, skip the missed rounds instead of bursting.
+            next_due = now + period - (now - due) % period
+        with self._cond:
+            if service in self._removed:
+                self._removed.discard(service)
+                return
+            heapq.heappush(self._queue, (next_due, next(self._seq), service))
+            self._cond.notify()
+
+    def _poll(self, due, service):
+        try:
+            snapshot = service.poll()
+            logger.debug("polled {0} in {1:.3f}s".format(service, snapshot.duration))
+        finally:
+            self._reschedule(due, service)
+
+    def run(self):
+        while True:
+            item = self._next_due()
+            if item is None:
+                return
+            due, _, service = item
+            self._executor.submit(self._poll, due, service)
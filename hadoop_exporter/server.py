@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+HTTP server of the metrics.
+The format of a response is negotiated from the Accept header: the text format by default, OpenMetrics text,
+or delimited protobuf. Responses are compressed with gzip or deflate when the client accepts it.
+What a SnapshotCollector renders and compresses is kept until its next poll, so scrapes of the same snapshot,
+e.g. by the two replicas of an HA Prometheus, neither render nor compress it again.
+With a Prober, /probe answers the metrics of the target of the request, see probe.
+'''
+
+import struct
+import threading
+import traceback
+import zlib
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from prometheus_client.core import REGISTRY
+
+from hadoop_exporter import exposition, protobuf, utils
+from hadoop_exporter.probe import ProbeError
+from hadoop_exporter.scheduler import registry_collectors
+
+logger = utils.get_logger(__name__)
+
+COMPRESS_LEVEL = 6
+
+# Preferred first when the client accepts both with the same quality.
+ENCODINGS = ('gzip', 'deflate')
+
+# A gzip member header: no name nor mtime, unknown OS.
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# A zlib header for the default window and compression level.
+_ZLIB_HEADER = b'\x78\x9c'
+# The final, empty, block of a deflate stream.
+_LAST_BLOCK = b'\x03\x00'
+
+# render: families -> bytes, trailer: what ends the response after the families of all the collectors.
+Format = namedtuple('Format', ['content_type', 'render', 'trailer'])
+
+FORMATS = {
+    'text': Format(exposition.CONTENT_TYPE_LATEST, exposition.render, b''),
+    'openmetrics': Format(exposition.OPENMETRICS_CONTENT_TYPE, exposition.render_openmetrics, exposition.OPENMETRICS_EOF),
+    'protobuf': Format(protobuf.CONTENT_TYPE, protobuf.render, b''),
+}
+
+
+def _header_items(header):
+    '''
+    @return (value, {param: value}, quality) of every item of an Accept or Accept-Encoding header.
+    '''
+    for item in header.split(','):
+        value, _, rest = item.strip().partition(';')
+        params, quality = {}, 1.0
+        for param in rest.split(';'):
+            k, _, v = param.strip().partition('=')
+            k, v = k.strip().lower(), v.strip().strip('"')
+            if 'q' == k:
+                try:
+                    quality = float(v)
+                except ValueError:
+                    quality = 0.0
+            elif k:
+                params[k] = v
+        yield value.strip().lower(), params, quality
+
+
+def accepted_format(header):
+    '''
+    @param header: The Accept header of the request, may be None.
+    @return the name in FORMATS of the format the client prefers, 'text' if it accepts none of them.
+    '''
+    if not header:
+        return 'text'
+    best = None
+    for media, params, quality in _header_items(header):
+        if 'application/vnd.google.protobuf' == media:
+            if 'io.prometheus.client.MetricFamily' != params.get('proto') or 'delimited' != params.get('encoding'):
+                continue
+            name = 'protobuf'
+        elif 'application/openmetrics-text' == media:
+            name = 'openmetrics'
+        elif 'text/plain' == media:
+            name = 'text'
+        else:
+            continue
+        # the first one wins between equal qualities, like Prometheus orders them.
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (name, quality)
+    return best[0] if best else 'text'
+
+
+def accepted_encoding(header):
+    '''
+    @param header: The Accept-Encoding header of the request, may be None.
+    @return the preferred encoding of ENCODINGS which the client accepts, None for the identity.
+    '''
+    if not header:
+        return None
+    qualities = dict((coding, quality) for coding, _, quality in _header_items(header))
+    best = None
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def _deflate(data):
+    '''
+    @return data as raw deflate blocks, which end on a byte boundary and never refer to other data,
+            so that they can be put after or before the blocks of other data in one deflate stream.
+    '''
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+_TRAILERS = dict((name, _deflate(f.trailer)) for name, f in FORMATS.items())
+
+
+class Fragment(object):
+    '''
+    Fragment is the response part of one collector in each format, plain and as raw deflate blocks.
+    The fragments of all collectors make one deflate stream when they are put one after the other.
+    '''
+    __slots__ = ('key', 'families', '_outputs', '_deflated')
+
+    def __init__(self, key, families):
+        '''
+        @param key: What the fragment was rendered from, e.g. a Snapshot.
+        @param families: The families of the collector.
+        '''
+        self.key = key
+        self.families = families
+        self._outputs = {}
+        self._deflated = {}
+
+    def output(self, name):
+        '''
+        @param name: A format of FORMATS.
+        @return the families in this format, rendered on the first use.
+        '''
+        output = self._outputs.get(name)
+        if output is None:
+            output = self._outputs[name] = FORMATS[name].render(self.families)
+        return output
+
+    def deflated(self, name):
+        '''
+        @return output(name) as raw deflate blocks, compressed on the first use.
+        '''
+        deflated = self._deflated.get(name)
+        if deflated is None:
+            deflated = self._deflated[name] = _deflate(self.output(name))
+        return deflated
+
+
+def body(fragments, name='text', encoding=None):
+    '''
+    @param fragments: The Fragment of every collector, in order.
+    @param name: A format of FORMATS.
+    @param encoding: One of ENCODINGS, None for the identity.
+    @return the response body.
+    '''
+    outputs = [fragment.output(name) for fragment in fragments]
+    outputs.append(FORMATS[name].trailer)
+    if encoding is None:
+        return b''.join(outputs)
+    deflated = [fragment.deflated(name) for fragment in fragments]
+    deflated.append(_TRAILERS[name])
+    deflated.append(_LAST_BLOCK)
+    # the checksums run at memory speed, only the compression is worth caching.
+    if 'gzip' == encoding:
+        crc32 = size = 0
+        for output in outputs:
+            crc32 = zlib.crc32(output, crc32)
+            size += len(output)
+        deflated.append(struct.pack('<II', crc32, size & 0xffffffff))
+        return _GZIP_HEADER + b''.join(deflated)
+    adler32 = 1
+    for output in outputs:
+        adler32 = zlib.adler32(output, adler32)
+    deflated.append(struct.pack('>I', adler32))
+    return _ZLIB_HEADER + b''.join(deflated)
+
+
+class ResponseCache(object):
+    '''
+    ResponseCache builds the responses of a registry from one Fragment per collector.
+    The fragment of a SnapshotCollector is kept with its snapshot and reused until the next poll replaces it,
+    the fragments of the other collectors, e.g. the process metrics of prometheus_client, are rendered for every request.
+    '''
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    def fragments(self):
+        '''
+        @return the Fragment of every collector of the registry, in the order of registry.collect().
+        '''
+        fragments, cached = [], {}
+        for collector in registry_collectors(self.registry):
+            snapshot = getattr(collector, 'snapshot', None)
+            if snapshot is None:
+                fragments.append(Fragment(None, list(collector.collect())))
+                continue
+            fragment = self._fragments.get(collector)
+            if fragment is None or fragment.key is not snapshot:
+                fragment = Fragment(snapshot, snapshot.families)
+            fragments.append(fragment)
+            cached[collector] = fragment
+        with self._lock:
+            # the collectors which are gone are dropped with their fragments.
+            self._fragments = cached
+        return fragments
+
+    def body(self, name='text', encoding=None):
+        '''
+        @param name: A format of FORMATS.
+        @param encoding: One of ENCODINGS, None for the identity.
+        @return the response body.
+        '''
+        return body(self.fragments(), name, encoding)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    '''
+    MetricsHandler serves the families of the registry on the metrics path, in the format the client accepts,
+    and the probes on /probe when it has a prober.
+    '''
+    cache = None
+    # None to serve the metrics on every path.
+    metrics_path = None
+    prober = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = accepted_format(self.headers.get('Accept'))
+        encoding = accepted_encoding(self.headers.get('Accept-Encoding'))
+        if self.prober is not None and '/probe' == url.path.rstrip('/'):
+            self._probe(parse_qs(url.query), name, encoding)
+            return
+        if self.metrics_path is not None and url.path.rstrip('/') != self.metrics_path.rstrip('/'):
+            self.send_error(404, 'metrics are served on {0}'.format(self.metrics_path))
+            return
+        try:
+            output = self.cache.body(name, encoding)
+        except Exception:
+            logger.warning("error when rendering metrics")
+            traceback.print_exc()
+            self.send_error(500, 'error when rendering metrics')
+            return
+        self._send(output, name, encoding)
+
+    def _probe(self, params, name, encoding):
+        timeout = None
+        try:
+            # Prometheus tells how long it waits for the scrape.
+            timeout = float(self.headers.get('X-Prometheus-Scrape-Timeout-Seconds'))
+        except (TypeError, ValueError):
+            pass
+        try:
+            families = self.prober.probe(params, timeout)
+            output = body([Fragment(None, families)], name, encoding)
+        except ProbeError as e:
+            self.send_error(e.status, str(e))
+            return
+        except Exception:
+            logger.warning("error when probing {0}".format(params))
+            traceback.print_exc()
+            self.send_error(500, 'error when probing')
+            return
+        self._send(output, name, encoding)
+
+    def _send(self, output, name, encoding):
+        self.send_response(200)
+        self.send_header('Content-Type', FORMATS[name].content_type)
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def log_message(self, format, *args):
+        # one line per scrape is too much for the exporter log.
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def start_http_server(port, addr='', registry=REGISTRY, path=None, prober=None):
+    '''
+    Serve the metrics of registry on http://addr:port/path in a daemon thread, like prometheus_client.start_http_server.
+    @param path: The metrics path, e.g. /metrics, the other paths answer 404. None to serve the metrics on every path.
+    @param prober: A probe.Prober answering /probe, None for no probes.
+    @return the HTTPServer.
+    '''
+    handler = type('MetricsHandler', (MetricsHandler,), {
+        'cache': ResponseCache(registry), 'metrics_path': path, 'prober': prober})
+    httpd = _ThreadingHTTPServer((addr, port), handler)
+    thread = threading.Thread(target=httpd.serve_forever, name='http-server')
+    thread.daemon = True
+    thread.start()
+    return httpd
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Sharding of the targets across exporter replicas, for fleets too big to be polled by one process in a period.
+Each replica is a member of a consistent hash ring and only polls the targets the ring gives to it, so the
+replicas poll disjoint subsets of the same target list without talking to each other. When a member joins or
+leaves, only the targets of the ring segments it takes or gives back move, about 1/N of them.
+'''
+
+import bisect
+import hashlib
+
+from prometheus_client.core import GaugeMetricFamily
+
+from hadoop_exporter import utils
+
+logger = utils.get_logger(__name__)
+
+# points of every member on the ring, more points spread the targets more evenly.
+VNODES_DEFAULT = 128
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing(object):
+    '''
+    HashRing maps a key to one of the members, the first member point clockwise of the hash of the key.
+    '''
+
+    def __init__(self, members, vnodes=VNODES_DEFAULT):
+        '''
+        @param members: The names of the members, e.g. the hostnames of the replicas.
+        @param vnodes: The number of points of each member on the ring.
+        '''
+        if not members:
+            raise ValueError('a hash ring needs at least one member')
+        points = sorted((_hash('{0}#{1}'.format(member, i)), member) for member in set(members) for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, key):
+        i = bisect.bisect(self._points, _hash(key))
+        return self._members[i % len(self._points)]
+
+
+class Shard(object):
+    '''
+    Shard is the replica's member of the ring: it tells which targets this replica polls.
+    '''
+
+    def __init__(self, index, count=None, members=None, vnodes=VNODES_DEFAULT):
+        '''
+        @param index: The position of this replica in members, or in 0..count-1.
+        @param count: The number of replicas, for members named shard-0 to shard-<count-1>.
+        @param members: The names of the replicas, e.g. their hostnames. With names, a replica which leaves
+                        the list does not rename the others, so only its targets move.
+        '''
+        if members is None:
+            members = ['shard-{0}'.format(i) for i in range(count or 1)]
+        if not 0 <= index < len(members):
+            raise ValueError('shard index {0} is not in 0..{1}'.format(index, len(members) - 1))
+        self.members = list(members)
+        self.member = members[index]
+        self.ring = HashRing(members, vnodes)
+
+    def __str__(self):
+        return "(shard {0} of {1})".format(self.member, len(self.members))
+
+    def owns(self, target):
+        '''
+        @param target: The key of a target, its jmx url, the same on every replica.
+        '''
+        return self.ring.owner(target) == self.member
+
+
+class ShardCollector(object):
+    '''
+    ShardCollector exports hadoop_exporter_shard_targets: the known targets this replica polls and those it leaves
+    to the others. A target polled by no replica shows as a sum of owned targets below the number of targets.
+    '''
+
+    def __init__(self, shard, targets):
+        '''
+        @param targets: Returns the keys of the targets known to the replica, configured or discovered.
+        '''
+        self.shard = shard
+        self.targets = targets
+
+    def collect(self):
+        targets = set(self.targets())
+        owned = sum(1 for target in targets if self.shard.owns(target))
+        family = GaugeMetricFamily('hadoop_exporter_shard_targets',
+                                   'Targets known to the exporter replica, by whether this shard polls them.',
+                                   labels=['shard', 'state'])
+        family.add_metric([self.shard.member, 'owned'], owned)
+        family.add_metric([self.shard.member, 'others'], len(targets) - owned)
+        yield family
+
+    def describe(self):
+        return []
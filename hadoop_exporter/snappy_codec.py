@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Snappy block compression, the encoding of the Prometheus remote write requests.
+The fastest installed backend is picked at import, EXPORTER_SNAPPY_BACKEND may force one of them.
+Without python-snappy nor cramjam, a pure python codec is used: it finds fewer matches than the C library,
+but its output is valid snappy and the label names and values repeated from series to series still compress well.
+'''
+
+import os
+
+# The C library works on blocks of 64KB, the pure python codec too, so that every copy fits a 2 bytes offset.
+_BLOCK_SIZE = 1 << 16
+
+_LITERAL, _COPY_1, _COPY_2, _COPY_4 = range(4)
+
+
+def _uvarint(n):
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+
+def _emit_literal(out, data, start, end):
+    n = end - start - 1
+    if n < 60:
+        out.append(n << 2 | _LITERAL)
+    elif n < 0x100:
+        out.append(60 << 2 | _LITERAL)
+        out.append(n)
+    else:
+        # a literal never crosses a block.
+        out.append(61 << 2 | _LITERAL)
+        out += n.to_bytes(2, 'little')
+    out += data[start:end]
+
+
+def _emit_copy(out, offset, length):
+    # a copy element holds 64 bytes at most, the last one at least 4.
+    while length >= 68:
+        out += bytes((63 << 2 | _COPY_2, offset & 0xff, offset >> 8))
+        length -= 64
+    if length > 64:
+        out += bytes((59 << 2 | _COPY_2, offset & 0xff, offset >> 8))
+        length -= 60
+    if length < 12 and offset < 2048:
+        out += bytes(((offset >> 8) << 5 | (length - 4) << 2 | _COPY_1, offset & 0xff))
+    else:
+        out += bytes(((length - 1) << 2 | _COPY_2, offset & 0xff, offset >> 8))
+
+
+def _compress_block(block, out):
+    n = len(block)
+    table = {}
+    i = literal = 0
+    # like the C library, skip faster through data which does not compress.
+    skip = 32
+    while i <= n - 4:
+        key = block[i:i + 4]
+        candidate = table.get(key)
+        table[key] = i
+        if candidate is None:
+            i += skip >> 5
+            skip += 1
+            continue
+        skip = 32
+        length = 4
+        while i + length + 8 <= n and block[candidate + length:candidate + length + 8] == block[i + length:i + length + 8]:
+            length += 8
+        while i + length < n and block[candidate + length] == block[i + length]:
+            length += 1
+        if literal < i:
+            _emit_literal(out, block, literal, i)
+        _emit_copy(out, i - candidate, length)
+        i = literal = i + length
+    if literal < n:
+        _emit_literal(out, block, literal, n)
+
+
+def _compress(data):
+    data = bytes(data)
+    out = _uvarint(len(data))
+    for start in range(0, len(data), _BLOCK_SIZE):
+        _compress_block(data[start:start + _BLOCK_SIZE], out)
+    return bytes(out)
+
+
+def _decompress(data):
+    data = bytes(data)
+    size = shift = pos = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        size |= (b & 0x7f) << shift
+        if b < 0x80:
+            break
+        shift += 7
+    out = bytearray()
+    end = len(data)
+    while pos < end:
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if _LITERAL == kind:
+            length = tag >> 2
+            if length >= 60:
+                width = length - 59
+                length = int.from_bytes(data[pos:pos + width], 'little')
+                pos += width
+            length += 1
+            out += data[pos:pos + length]
+            pos += length
+            continue
+        if _COPY_1 == kind:
+            length = (tag >> 2 & 7) + 4
+            offset = (tag >> 5) << 8 | data[pos]
+            pos += 1
+        elif _COPY_2 == kind:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 2], 'little')
+            pos += 2
+        else:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 4], 'little')
+            pos += 4
+        if offset == 0 or offset > len(out):
+            raise ValueError('invalid snappy copy offset {0}'.format(offset))
+        start = len(out) - offset
+        if offset >= length:
+            out += out[start:start + length]
+        else:
+            # the copy overlaps what it writes, it repeats the last offset bytes.
+            pattern = out[start:]
+            out += (pattern * (length // offset + 1))[:length]
+    if len(out) != size:
+        raise ValueError('snappy data of {0} bytes, {1} expected'.format(len(out), size))
+    return bytes(out)
+
+
+def _python_snappy():
+    import snappy
+    return snappy.compress, snappy.decompress
+
+
+def _cramjam():
+    import cramjam
+    return (lambda data: bytes(cramjam.snappy.compress_raw(data)),
+            lambda data: bytes(cramjam.snappy.decompress_raw(data)))
+
+
+def _python():
+    return _compress, _decompress
+
+
+# ordered by preference.
+BACKENDS = {
+    'snappy': _python_snappy,
+    'cramjam': _cramjam,
+    'python': _python,
+}
+
+
+def _select(name=None):
+    names = [name] if name else list(BACKENDS)
+    for n in names:
+        try:
+            compress, decompress = BACKENDS[n]()
+        except (ImportError, KeyError):
+            continue
+        return n, compress, decompress
+    return ('python',) + _python()
+
+
+BACKEND, compress, decompress = _select(
+    os.environ.get('EXPORTER_SNAPPY_BACKEND'))
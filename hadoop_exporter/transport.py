@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import ssl
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+POOL_CONNECTIONS_DEFAULT = 64
+POOL_MAXSIZE_DEFAULT = 2
+DNS_TTL_DEFAULT = 300
+
+
+class DNSCache(object):
+    '''
+    DNSCache keeps the resolved address of each host for ttl seconds, so new connections to a known host
+    do not pay a DNS lookup again.
+    '''
+
+    def __init__(self, ttl=DNS_TTL_DEFAULT):
+        '''
+        @param ttl: Seconds a resolved address is kept, 0 disables the cache.
+        '''
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        if self.ttl <= 0:
+            return host
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get((host, port))
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        try:
+            address = socket.getaddrinfo(
+                host, port, 0, socket.SOCK_STREAM)[0][4][0]
+        except (socket.gaierror, IndexError):
+            # let the connection itself raise a proper error.
+            return host
+        with self._lock:
+            self._cache[(host, port)] = (address, now + self.ttl)
+        return address
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_dns_cache = DNSCache()
+
+
+def resolve(host, port):
+    '''
+    @return the address of host, through the DNS cache of the transport, e.g. for the connections of aio.Session.
+    '''
+    return _dns_cache.resolve(host, port)
+
+
+def ssl_context():
+    '''
+    @return an ssl context verifying the certificates like the requests of the transport do: against REQUESTS_CA_BUNDLE
+    or CURL_CA_BUNDLE when set, against the CA bundle of requests otherwise.
+    '''
+    path = os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE') or requests.utils.DEFAULT_CA_BUNDLE_PATH
+    if os.path.isdir(path):
+        return ssl.create_default_context(capath=path)
+    return ssl.create_default_context(cafile=path)
+
+
+class _CachedDNSHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        # only the address we connect to changes, the Host header and TLS SNI still use self.host.
+        self._dns_host = _dns_cache.resolve(self.host, self.port)
+        return super(_CachedDNSHTTPConnection, self)._new_conn()
+
+
+class _CachedDNSHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        self._dns_host = _dns_cache.resolve(self.host, self.port)
+        return super(_CachedDNSHTTPSConnection, self)._new_conn()
+
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CachedDNSHTTPConnection
+
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CachedDNSHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter keeping one keep-alive connection pool per host, whose connections resolve through the DNS cache.
+    '''
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PooledAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool,
+            'https': _HTTPSConnectionPool,
+        }
+
+
+_adapter = PooledAdapter(pool_connections=POOL_CONNECTIONS_DEFAULT,
+                         pool_maxsize=POOL_MAXSIZE_DEFAULT)
+_local = threading.local()
+
+
+def configure(pool_connections=POOL_CONNECTIONS_DEFAULT, pool_maxsize=POOL_MAXSIZE_DEFAULT, dns_ttl=DNS_TTL_DEFAULT):
+    '''
+    Replace the shared transport, it must be called before any request is made.
+    @param pool_connections: Number of per host connection pools kept alive.
+    @param pool_maxsize: Number of keep-alive connections kept in each host pool.
+    @param dns_ttl: Seconds a resolved host address is cached, 0 disables the cache.
+    '''
+    global _adapter
+    _dns_cache.ttl = dns_ttl
+    _dns_cache.clear()
+    _adapter = PooledAdapter(pool_connections=pool_connections,
+                             pool_maxsize=pool_maxsize)
+
+
+def session():
+    '''
+    @return a requests session of the current thread. Sessions are not shared between threads,
+    but all of them use the same connection pools.
+    '''
+    s = getattr(_local, 'session', None)
+    if s is None or getattr(_local, 'adapter', None) is not _adapter:
+        s = requests.Session()
+        s.mount('http://', _adapter)
+        s.mount('https://', _adapter)
+        _local.session = s
+        _local.adapter = _adapter
+    return s
+
+
+def get(url, **kwargs):
+    return session().get(url, **kwargs)
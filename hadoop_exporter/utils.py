@@ -3,11 +3,16 @@
 
 import os
 import socket
+import threading
 import requests
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import yaml
 import argparse
 
+from hadoop_exporter import decoder, jmx, transport
+
 EXPORTER_LOGS_DIR = os.environ.get('EXPORTER_LOGS_DIR', '/tmp/exporter')
 
 
@@ -19,6 +24,9 @@ def get_logger(name, log_file="hadoop_exporter.log"):
     '''
 
     logger = logging.getLogger(name)
+    if logger.handlers:
+        # e.g. the logger of a collector class, which is built for every probed target.
+        return logger
     logger.setLevel(logging.DEBUG)
 
     if not os.path.exists(EXPORTER_LOGS_DIR):
@@ -42,33 +50,110 @@ def get_logger(name, log_file="hadoop_exporter.log"):
 
 logger = get_logger(__name__)
 
+HOST_CONCURRENCY_DEFAULT = 1
+MAX_PAYLOAD_SIZE_DEFAULT = 64 * 1024 * 1024
+
+_max_payload_size = MAX_PAYLOAD_SIZE_DEFAULT
+
+_host_concurrency = HOST_CONCURRENCY_DEFAULT
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+# max number of jmx queries of one service sent at the same time, still capped by the host concurrency.
+QUERY_CONCURRENCY = 8
+_executor = None
+
+
+def set_host_concurrency(concurrency):
+    '''
+    set the max number of requests in flight against the same host:port.
+    It must be called before any request is made, existing slots are not resized.
+    '''
+    global _host_concurrency
+    _host_concurrency = max(1, int(concurrency))
+
+
+def set_max_payload_size(size):
+    '''
+    set the max number of bytes read from one jmx response, bigger responses are dropped. 0 means no limit.
+    '''
+    global _max_payload_size
+    _max_payload_size = max(0, int(size))
+
+
+def host_slot(url):
+    '''
+    @param url: Any url of the host, e.g. http://host1:9870/jmx.
+    @return a semaphore shared by all requests against the same host:port.
+    '''
+    netloc = urlsplit(url).netloc
+    with _host_slots_lock:
+        slot = _host_slots.get(netloc)
+        if slot is None:
+            slot = _host_slots[netloc] = threading.BoundedSemaphore(
+                _host_concurrency)
+    return slot
+
 
-def get_metrics(url):
+def get_metrics(url, queries=None, wanted=None):
     '''
     :param url: The jmx url, e.g. http://host1:9870/jmx,http://host1:8088/jmx, http://host2:19888/jmx...
-    :return a dict of all metrics scraped in the jmx url.
+    :param queries: A list of jmx servlet query params, e.g. [{'qry': 'Hadoop:service=NameNode,name=FSNamesystem*,*'}].
+                    Only the beans matched by one of them are fetched. If None, the whole jmx dump is fetched.
+    :param wanted: A function of the bean name telling whether a bean is wanted, see jmx.query_matcher.
+                   The other beans are skipped while the response is read, without being decoded.
+    :return a list of all beans scraped in the jmx url, each bean only once.
     '''
+    if not queries:
+        return _get_beans(url, wanted=wanted)
+
+    if _host_concurrency > 1 and len(queries) > 1:
+        results = _query_executor().map(
+            lambda params: _get_beans(url, params, wanted), queries)
+    else:
+        results = [_get_beans(url, params, wanted) for params in queries]
+
+    result, seen = [], set()
+    for beans in results:
+        for bean in beans:
+            # queries may overlap, e.g. FSNamesystem* also matches FSNamesystemState.
+            if bean['name'] not in seen:
+                seen.add(bean['name'])
+                result.append(bean)
+    return result
+
+
+def _query_executor():
+    global _executor
+    with _host_slots_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=QUERY_CONCURRENCY, thread_name_prefix='jmx-query')
+    return _executor
+
+
+def _get_beans(url, params=None, wanted=None):
     result = []
     try:
-        s = requests.session()
-        response = s.get(url, timeout=5)
+        with host_slot(url):
+            # the body is decoded bean by bean while it is read, it is never held in memory as a whole.
+            with transport.get(url, params=params, timeout=5, stream=True) as response:
+                if response.status_code != requests.codes.ok:
+                    logger.warning("get {0} failed, response code is: {1}.".format(
+                        url, response.status_code))
+                    return []
+                result = list(jmx.iter_beans(response.iter_content(jmx.CHUNK_SIZE),
+                                             wanted, _max_payload_size))
+    except jmx.PayloadTooLarge as e:
+        logger.warning("drop the response of {0}: {1}.".format(url, e))
+        result = []
     except Exception as e:
         logger.warning("error in func: get_metrics, error msg: %s" % e)
         result = []
     else:
-        if response.status_code != requests.codes.ok:
-            logger.warning("get {0} failed, response code is: {1}.".format(
-                url, response.status_code))
-            result = []
-        rlt = response.json()
-        logger.debug(rlt)
-        if rlt and "beans" in rlt:
-            result = rlt['beans']
-        else:
+        logger.debug(result)
+        if not result:
             logger.warning("no metrics get in the {0}.".format(url))
-            result = []
-    finally:
-        s.close()
     return result
 
 
@@ -105,9 +190,12 @@ def read_json_file(path_name, file_name):
     metric_path = os.path.join(parent_path, path_name)
     metric_name = "{0}.json".format(file_name)
     try:
-        with open(os.path.join(metric_path, metric_name), 'r') as f:
-            metrics = yaml.safe_load(f)
-            return metrics
+        try:
+            return decoder.load_file(os.path.join(metric_path, metric_name))
+        except decoder.DecodeError:
+            # hand written definitions may not be strict json, e.g. trailing commas.
+            with open(os.path.join(metric_path, metric_name), 'r') as f:
+                return yaml.safe_load(f)
     except Exception as e:
         logger.info("read metrics json file failed, error msg is: %s" % e)
         return {}
@@ -145,8 +233,8 @@ def get_node_info(url):
     host = get_hostname()
     node_info = {}
     try:
-        s = requests.session()
-        response = s.get(url, timeout=120)
+        with host_slot(url):
+            response = transport.get(url, timeout=120)
     except Exception as e:
         logger.info(
             "error happened while requests url {0}, error msg : {1}".format(url, e))
@@ -156,7 +244,7 @@ def get_node_info(url):
             logger.info("get {0} failed, response code is: {1}.".format(
                 url, response.status_code))
             node_info = {}
-        result = response.json()
+        result = decoder.loads(response.content)
         logger.debug(result)
         if result:
             for k, v in result.items():
@@ -169,8 +257,6 @@ def get_node_info(url):
         else:
             logger.info("No metrics get in the {0}.".format(url))
             node_info = {}
-    finally:
-        s.close()
     return node_info
 
 
@@ -307,4 +393,172 @@ def parse_args():
         help='Period (seconds) to consume jmx service. (default: 30)',
         default=None
     )
+    parser.add_argument(
+        '--concurrency',
+        dest='concurrency',
+        required=False,
+        type=int,
+        help='Max number of jmx services polled at the same time. (default: 8)',
+        default=None
+    )
+    parser.add_argument(
+        '--host-concurrency',
+        dest='host_concurrency',
+        required=False,
+        type=int,
+        help='Max number of requests in flight against the same jmx host. (default: 1)',
+        default=None
+    )
+    parser.add_argument(
+        '--pool-connections',
+        dest='pool_connections',
+        required=False,
+        type=int,
+        help='Number of per host keep-alive connection pools. (default: 64)',
+        default=None
+    )
+    parser.add_argument(
+        '--pool-maxsize',
+        dest='pool_maxsize',
+        required=False,
+        type=int,
+        help='Number of keep-alive connections kept for each host. (default: 2)',
+        default=None
+    )
+    parser.add_argument(
+        '--dns-ttl',
+        dest='dns_ttl',
+        required=False,
+        type=int,
+        help='Seconds a resolved jmx host address is cached, 0 to disable. (default: 300)',
+        default=None
+    )
+    parser.add_argument(
+        '--max-payload-size',
+        dest='max_payload_size',
+        required=False,
+        type=int,
+        help='Max bytes read from one jmx response, bigger ones are dropped, 0 for no limit. (default: 67108864)',
+        default=None
+    )
+    parser.add_argument(
+        '--remote-write-url',
+        dest='remote_write_url',
+        required=False,
+        help='Push the metrics to this Prometheus remote write endpoint. (example "http://prometheus:9090/api/v1/write") (default: None)',
+        default=None
+    )
+    parser.add_argument(
+        '--remote-write-batch-size',
+        dest='remote_write_batch_size',
+        required=False,
+        type=int,
+        help='Max number of series in one remote write request. (default: 2000)',
+        default=None
+    )
+    parser.add_argument(
+        '--remote-write-queue-dir',
+        dest='remote_write_queue_dir',
+        required=False,
+        help='Directory of the remote write requests which could not be sent yet, empty to drop them. (default: "/tmp/exporter/remote_write")',
+        default=None
+    )
+    parser.add_argument(
+        '--remote-write-queue-size',
+        dest='remote_write_queue_size',
+        required=False,
+        type=int,
+        help='Max bytes of requests kept in the remote write queue. (default: 67108864)',
+        default=None
+    )
+    parser.add_argument(
+        '--probe-concurrency',
+        dest='probe_concurrency',
+        required=False,
+        type=int,
+        help='Max number of /probe requests polling their target at once. (default: 32)',
+        default=None
+    )
+    parser.add_argument(
+        '--probe-idle',
+        dest='probe_idle',
+        required=False,
+        type=int,
+        help='Seconds after which the collector of a target which is not probed anymore is dropped. (default: 600)',
+        default=None
+    )
+    parser.add_argument(
+        '--probe-max-targets',
+        dest='probe_max_targets',
+        required=False,
+        type=int,
+        help='Max number of probed targets whose collector is kept, the least recently probed are dropped. (default: 10000)',
+        default=None
+    )
+    parser.add_argument(
+        '--fleet-discovery',
+        dest='fleet_discovery',
+        required=False,
+        help='Poll the DataNodes listed by the NameNode and the NodeManagers listed by the ResourceManager if set true else false. (example "true") (default: "false")',
+        default=None
+    )
+    parser.add_argument(
+        '--fleet-refresh',
+        dest='fleet_refresh',
+        required=False,
+        type=int,
+        help='Seconds between two reads of the DataNodes and NodeManagers of the fleet discovery. (default: 300)',
+        default=None
+    )
+    parser.add_argument(
+        '--shard-index',
+        dest='shard_index',
+        required=False,
+        type=int,
+        help='Index of this exporter replica, in 0..shard count-1 or in the shard members. (default: 0)',
+        default=None
+    )
+    parser.add_argument(
+        '--shard-count',
+        dest='shard_count',
+        required=False,
+        type=int,
+        help='Number of exporter replicas sharing the targets. (default: 1)',
+        default=None
+    )
+    parser.add_argument(
+        '--shard-members',
+        dest='shard_members',
+        required=False,
+        help='Names of the exporter replicas sharing the targets, instead of a count. (example "exp1,exp2,exp3") (default: None)',
+        default=None
+    )
+    parser.add_argument(
+        '--consul-address',
+        dest='consul_address',
+        required=False,
+        help='Poll the instances of the Consul services tagged with a module, from this Consul agent. (example "127.0.0.1:8500") (default: None)',
+        default=None
+    )
+    parser.add_argument(
+        '--consul-tag',
+        dest='consul_tag',
+        required=False,
+        help='Only poll the Consul services which also have this tag. (example "hadoop-exporter") (default: None)',
+        default=None
+    )
+    parser.add_argument(
+        '--consul-wait',
+        dest='consul_wait',
+        required=False,
+        help='Wait of the Consul blocking queries. (default: "5m")',
+        default=None
+    )
+    parser.add_argument(
+        '--hbase-labeled-metrics',
+        dest='hbase_labeled_metrics',
+        required=False,
+        help='Export the per region, table and user metrics of the RegionServers if set true else false. (example "true") (default: "false")',
+        default=None
+    )
     return parser.parse_args()
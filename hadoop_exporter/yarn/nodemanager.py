@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import functools
 import re
 from prometheus_client.core import GaugeMetricFamily
 
@@ -11,6 +12,7 @@ from hadoop_exporter.common import MetricCollector, common_metrics_info
 class YARNNodeManagerMetricCollector(MetricCollector):
     COMPONENT = "yarn"
     SERVICE = "nodemanager"
+    BEAN_QUERY = "Hadoop:service=NodeManager,name={0}*,*"
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -20,48 +22,39 @@ class YARNNodeManagerMetricCollector(MetricCollector):
         self._yarn_nodemanager_metrics = {}
         for i in range(len(self._file_list)):
             self._yarn_nodemanager_metrics.setdefault(self._file_list[i], {})
+        self._descriptors = self._compile_descriptors(self._yarn_nodemanager_metrics, {
+            service: functools.partial(self._setup_service_labels, service) for service in self._metrics
+        })
 
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_metrics_labels(beans)
 
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_metrics_labels(beans)
+        # add metric value to every metric.
+        self._get_metrics(beans)
 
-            # add metric value to every metric.
-            self._get_metrics(beans)
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._yarn_nodemanager_metrics.update(common_metrics())
 
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._yarn_nodemanager_metrics.update(common_metrics())
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._yarn_nodemanager_metrics[service]:
+                yield self._yarn_nodemanager_metrics[service][metric]
 
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._yarn_nodemanager_metrics[service]:
-                    yield self._yarn_nodemanager_metrics[service][metric]
+    def _setup_service_labels(self, service):
+        label = ["cluster", "host"]
+        for metric in self._metrics[service]:
+            name = re.sub('[^a-z0-9A-Z]', '_', metric).lower()
+            self._yarn_nodemanager_metrics[service][metric] = GaugeMetricFamily("_".join([self._prefix, name]),
+                                                                                self._metrics[service][metric],
+                                                                                labels=label)
 
     def _setup_metrics_labels(self, beans):
         # The metrics we want to export.
-        for bean in beans:
-            label = ["cluster", "host"]
-            for service in self._metrics:
-                if service in bean['name']:
-                    for metric in self._metrics[service]:
-                        name = re.sub('[^a-z0-9A-Z]', '_', metric).lower()
-                        self._yarn_nodemanager_metrics[service][metric] = GaugeMetricFamily("_".join([self._prefix, name]),
-                                                                                            self._metrics[service][metric],
-                                                                                            labels=label)
-                else:
-                    continue
+        services = set(service for service, _ in self._index.dispatch(beans))
+        self._load_families(self._yarn_nodemanager_metrics, services)
 
     def _get_metrics(self, beans):
         for bean in beans:
@@ -71,14 +64,10 @@ class YARNNodeManagerMetricCollector(MetricCollector):
                 break
             else:
                 continue
-        for bean in beans:
-            for service in self._metrics:
-                if service in bean['name']:
-                    for metric in bean:
-                        if metric in self._metrics[service]:
-                            self._yarn_nodemanager_metrics[service][metric].add_metric(
-                                label, bean[metric])
-                        else:
-                            pass
+        for service, bean in self._index.dispatch(beans):
+            for metric in bean:
+                if metric in self._metrics[service]:
+                    self._yarn_nodemanager_metrics[service][metric].add_metric(
+                        label, bean[metric])
                 else:
-                    continue
+                    pass
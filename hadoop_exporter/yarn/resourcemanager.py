@@ -1,13 +1,87 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import yaml
 import re
 from prometheus_client.core import GaugeMetricFamily
 
-from hadoop_exporter import utils
+from hadoop_exporter import decoder, utils
+from hadoop_exporter.classifier import AttributeClassifier
 from hadoop_exporter.common import MetricCollector, common_metrics_info
 
+# attribute name -> (family, label values), e.g. "running_60" -> ("running_app", ("60to300",))
+QUEUE_CLASSIFIER = AttributeClassifier([
+    (r'.*running_0.*', 'running_app', ('0to60',)),
+    (r'.*running_60.*', 'running_app', ('60to300',)),
+    (r'.*running_300.*', 'running_app', ('300to1440',)),
+    (r'.*running_1440.*', 'running_app', ('1440up',)),
+])
+
+# e.g. "NumActiveNMs" -> ("NMs", ("Active",)), "AMLaunchDelayNumOps" -> ("NumOps", ("Launch",)),
+# the other attributes are not exported.
+CLUSTER_CLASSIFIER = AttributeClassifier([
+    (r'.*?Num(?P<state>.*?)NMs.*', 'NMs'),
+    (r'.*?AM(?P<type>.*?)DelayNumOps.*', 'NumOps'),
+    (r'.*?AM(?P<type>.*?)DelayAvgTime.*', 'AvgTime'),
+], default=None)
+
+
+class NodeTable(object):
+    '''
+    NodeTable is the RMNMInfo LiveNodeManagers list turned into columns: one (host, version, rack) key per node,
+    and one list of values per node attribute, in the same node order.
+    It is built once per distinct LiveNodeManagers value, see NodeTable.parse.
+    '''
+
+    def __init__(self, live_nodes):
+        '''
+        @param live_nodes: The decoded LiveNodeManagers list.
+        '''
+        self.keys = [(node.get('HostName', ''), node.get('NodeManagerVersion', ''), node.get('Rack', ''))
+                     for node in live_nodes]
+        self.racks = [key[2] for key in self.keys]
+        self.states = [node.get('State', '') for node in live_nodes]
+        self._nodes = live_nodes
+        self._columns = {}
+        self._labels = {}
+
+    @staticmethod
+    def parse(text):
+        return NodeTable(decoder.loads(text))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def column(self, attribute):
+        '''
+        @return the values of a node attribute, 0.0 for the nodes which do not have it.
+        '''
+        values = self._columns.get(attribute)
+        if values is None:
+            values = self._columns[attribute] = [
+                node.get(attribute, 0.0) for node in self._nodes]
+        return values
+
+    def labels(self, cluster):
+        '''
+        @return the (cluster, host, version, rack) label values of every node.
+        '''
+        labels = self._labels.get(cluster)
+        if labels is None:
+            labels = self._labels[cluster] = [
+                (cluster, host, version, rack) for host, version, rack in self.keys]
+        return labels
+
+
+def _quantile(values, q):
+    '''
+    @param values: A sorted non-empty list.
+    @return the q-quantile of values, linearly interpolated between the closest ranks.
+    '''
+    rank = q * (len(values) - 1)
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
 
 class YARNResourceManagerMetricCollector(MetricCollector):
 
@@ -19,9 +93,19 @@ class YARNResourceManagerMetricCollector(MetricCollector):
         'LOST': 5,
         'REBOOTED': 6,
     }
+    # quantiles of the available memory of the nodes.
+    MEMORY_QUANTILES = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
 
     COMPONENT = "yarn"
     SERVICE = "resourcemanager"
+    BEAN_QUERY = "Hadoop:service=ResourceManager,name={0}*,*"
+    BEAN_QUERIES = {
+        # only the root queue is exported.
+        'QueueMetrics': 'Hadoop:service=ResourceManager,name=QueueMetrics,q0=root',
+    }
+    BEAN_ATTRIBUTES = {
+        'RMNMInfo': ('Hadoop:service=ResourceManager,name=RMNMInfo', 'LiveNodeManagers'),
+    }
 
     def __init__(self, cluster, url):
         MetricCollector.__init__(
@@ -32,34 +116,28 @@ class YARNResourceManagerMetricCollector(MetricCollector):
         for i in range(len(self._file_list)):
             self._yarn_resourcemanager_metrics.setdefault(
                 self._file_list[i], {})
+        self._descriptors = self._compile_descriptors(self._yarn_resourcemanager_metrics, {
+            'RMNMInfo': self._setup_rmnminfo_labels,
+            'QueueMetrics': self._setup_queue_labels,
+            'ClusterMetrics': self._setup_cluster_labels,
+        })
 
-    def collect(self):
-        # Request data from ambari Collect Host API
-        # Request exactly the System level information we need from node
-        # beans returns a type of 'List'
-
-        try:
-            beans = utils.get_metrics(self._url)
-        except:
-            self.logger.info(
-                "Can't scrape metrics from url: {0}".format(self._url))
-            pass
-        else:
-            # set up all metrics with labels and descriptions.
-            self._setup_metrics_labels(beans)
-
-            # add metric value to every metric.
-            self._get_metrics(beans)
-
-            # update namenode metrics with common metrics
-            common_metrics = common_metrics_info(
-                self._cluster, beans, self.COMPONENT, self.SERVICE)
-            self._yarn_resourcemanager_metrics.update(common_metrics())
-
-            for i in range(len(self._merge_list)):
-                service = self._merge_list[i]
-                for metric in self._yarn_resourcemanager_metrics[service]:
-                    yield self._yarn_resourcemanager_metrics[service][metric]
+    def _families(self, beans):
+        # set up all metrics with labels and descriptions.
+        self._setup_metrics_labels(beans)
+
+        # add metric value to every metric.
+        self._get_metrics(beans)
+
+        # update namenode metrics with common metrics
+        common_metrics = common_metrics_info(
+            self._cluster, beans, self.COMPONENT, self.SERVICE, self._common_memo, self._common_tables)
+        self._yarn_resourcemanager_metrics.update(common_metrics())
+
+        for i in range(len(self._merge_list)):
+            service = self._merge_list[i]
+            for metric in self._yarn_resourcemanager_metrics[service]:
+                yield self._yarn_resourcemanager_metrics[service][metric]
 
     def _setup_rmnminfo_labels(self):
         for metric in self._metrics['RMNMInfo']:
@@ -77,6 +155,30 @@ class YARNResourceManagerMetricCollector(MetricCollector):
             self._yarn_resourcemanager_metrics['RMNMInfo'][metric] = GaugeMetricFamily(name,
                                                                                        self._metrics['RMNMInfo'][metric],
                                                                                        labels=label)
+            if metric not in ('State', 'AvailableMemoryMB'):
+                continue
+            if 'State' == metric:
+                key = 'NodesByState'
+                name = "_".join([self._prefix, 'nodes_by_state'])
+                descriptions = "Current number of NodeManagers in each state"
+                label = ["cluster", "state"]
+            else:
+                key = 'AvailableMemoryMBQuantile'
+                name = "_".join([self._prefix, 'node_memory_available_quantile'])
+                descriptions = "Quantiles of the memory currently available on the hosts (in MB)"
+                label = ["cluster", "quantile"]
+            self._yarn_resourcemanager_metrics['RMNMInfo'][key] = GaugeMetricFamily(name,
+                                                                                    descriptions,
+                                                                                    labels=label)
+        for metric in self._metrics['RMNMInfo']:
+            if 'State' == metric:
+                continue
+            # sum of the node values of each rack, e.g. node_memory_used -> rack_memory_used.
+            family = self._yarn_resourcemanager_metrics['RMNMInfo'][metric]
+            self._yarn_resourcemanager_metrics['RMNMInfo']['Rack' + metric] = GaugeMetricFamily(
+                family.name.replace('_node_', '_rack_', 1),
+                "Sum per rack: " + family.documentation,
+                labels=["cluster", "rack"])
 
     def _setup_queue_labels(self):
         running_flag = 1
@@ -141,75 +243,64 @@ class YARNResourceManagerMetricCollector(MetricCollector):
 
     def _setup_metrics_labels(self, beans):
         # The metrics we want to export.
-        for bean in beans:
-            if 'RMNMInfo' in bean['name']:
-                self._setup_rmnminfo_labels()
-            if 'QueueMetrics' in self._metrics:
-                self._setup_queue_labels()
-            if 'ClusterMetrics' in self._metrics:
-                self._setup_cluster_labels()
+        services = set(service for service, _ in self._index.dispatch(beans)
+                       if service == 'RMNMInfo')
+        if beans:
+            services.update(['QueueMetrics', 'ClusterMetrics'])
+        self._load_families(self._yarn_resourcemanager_metrics, services)
 
     def _get_rmnminfo_metrics(self, bean):
+        # built once for all the metrics, and not at all when the node list did not change since the last poll.
+        table = decoder.loads_embedded(bean['LiveNodeManagers'], NodeTable.parse)
+        families = self._yarn_resourcemanager_metrics['RMNMInfo']
+        labels = table.labels(self._cluster)
         for metric in self._metrics['RMNMInfo']:
-            live_nm_list = yaml.safe_load(bean['LiveNodeManagers'])
-            for j in range(len(live_nm_list)):
-                host = live_nm_list[j]['HostName']
-                version = live_nm_list[j]['NodeManagerVersion']
-                rack = live_nm_list[j]['Rack']
-                label = [self._cluster, host, version, rack]
-                if 'State' == metric:
-                    value = self.NODE_STATE[live_nm_list[j]['State']]
-                else:
-                    value = live_nm_list[j][metric] if metric in live_nm_list[j] else 0.0
-                self._yarn_resourcemanager_metrics['RMNMInfo'][metric].add_metric(
-                    label, value)
+            family = families[metric]
+            if 'State' == metric:
+                counts = dict.fromkeys(self.NODE_STATE, 0)
+                for label, state in zip(labels, table.states):
+                    family.add_metric(label, self.NODE_STATE.get(state, 0))
+                    counts[state] = counts.get(state, 0) + 1
+                for state, count in counts.items():
+                    families['NodesByState'].add_metric([self._cluster, state], count)
+                continue
+
+            values = table.column(metric)
+            racks = {}
+            for label, rack, value in zip(labels, table.racks, values):
+                family.add_metric(label, value)
+                racks[rack] = racks.get(rack, 0.0) + value
+            for rack, value in racks.items():
+                families['Rack' + metric].add_metric([self._cluster, rack], value)
+            if 'AvailableMemoryMB' == metric and values:
+                ordered = sorted(values)
+                for q in self.MEMORY_QUANTILES:
+                    families['AvailableMemoryMBQuantile'].add_metric(
+                        [self._cluster, str(q)], _quantile(ordered, q))
 
     def _get_queue_metrics(self, bean):
         for metric in self._metrics['QueueMetrics']:
-            label = [self._cluster]
-            snake_case = re.sub('([a-z0-9])([A-Z])', r'\1_\2', metric).lower()
-            if "running_0" in metric:
-                key = "running_app"
-                label.append("0to60")
-            elif "running_60" in metric:
-                key = "running_app"
-                label.append("60to300")
-            elif "running_300" in metric:
-                key = "running_app"
-                label.append("300to1440")
-            elif "running_1440" in metric:
-                key = "running_app"
-                label.append("1440up")
-            else:
-                key = metric
-            self._yarn_resourcemanager_metrics['QueueMetrics'][key].add_metric(label,
+            key, values = QUEUE_CLASSIFIER.classify(metric)
+            self._yarn_resourcemanager_metrics['QueueMetrics'][key].add_metric((self._cluster,) + values,
                                                                                bean[metric] if metric in bean else 0)
 
     def _get_cluster_metrics(self, bean):
         for metric in self._metrics['ClusterMetrics']:
-            label = [self._cluster]
-            if "NMs" in metric:
-                label.append(metric.split('NMs')[0].split('Num')[1])
-                key = "NMs"
-            elif "NumOps" in metric:
-                key = "NumOps"
-                label.append(metric.split("DelayNumOps")[0].split('AM')[1])
-            elif "AvgTime" in metric:
-                key = "AvgTime"
-                label.append(metric.split("DelayAvgTime")[0].split('AM')[1])
-            else:
+            classified = CLUSTER_CLASSIFIER.classify(metric)
+            if classified is None:
                 continue
+            key, values = classified
             self._yarn_resourcemanager_metrics['ClusterMetrics'][key].add_metric(
-                label, bean[metric] if metric in bean else 0)
+                (self._cluster,) + values, bean[metric] if metric in bean else 0)
 
     def _get_metrics(self, beans):
-
-        for bean in beans:
-            if 'RMNMInfo' in bean['name']:
-                self._get_rmnminfo_metrics(bean)
-
-            if 'QueueMetrics' in bean['name'] and 'root' == bean['tag.Queue']:
-                self._get_queue_metrics(bean)
-
-            if 'ClusterMetrics' in bean['name']:
-                self._get_cluster_metrics(bean)
+        handlers = {
+            'RMNMInfo': self._get_rmnminfo_metrics,
+            'QueueMetrics': self._get_queue_metrics,
+            'ClusterMetrics': self._get_cluster_metrics,
+        }
+        for service, bean in self._index.dispatch(beans):
+            if 'QueueMetrics' == service and 'root' != bean.get('tag.Queue'):
+                continue
+            self._memo.map(self._yarn_resourcemanager_metrics[service], service, bean, handlers[service])
+        self._memo.sweep()
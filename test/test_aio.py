@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+aio.Session against a local HTTP/1.1 server whose responses are written by each test.
+Run from the repository root: python -m pytest test
+'''
+
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter import aio, transport  # noqa: E402
+
+BEANS = [{'name': 'Hadoop:service=DataNode,name=JvmMetrics', 'MemHeapUsedM': 12.5},
+         {'name': 'Hadoop:service=DataNode,name=DataNodeActivity-dn1-9866', 'BytesWritten': 7}]
+BODY = json.dumps({'beans': BEANS}).encode('utf-8')
+
+
+def content_length(body=BODY, close=False):
+    head = 'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {0}\r\n'.format(len(body))
+    return (head + ('Connection: close\r\n' if close else '') + '\r\n').encode('latin-1') + body
+
+
+def chunked(body=BODY, size=7):
+    out = b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n'
+    for i in range(0, len(body), size):
+        piece = body[i:i + size]
+        # with a chunk extension, which is ignored.
+        out += '{0:x};ext=1\r\n'.format(len(piece)).encode('ascii') + piece + b'\r\n'
+    return out + b'0\r\nX-Trailer: 1\r\n\r\n'
+
+
+class Server(object):
+    '''
+    Answers the requests with respond(server, path, writer), counts the connections and keeps the request paths.
+    '''
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.connections = 0
+        self.paths = []
+        self._server = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.url = 'http://localhost:{0}/jmx'.format(self.port)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                path = head.split(b' ', 2)[1].decode('latin-1')
+                self.paths.append(path)
+                if not await self.respond(self, path, writer):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def run(respond, scrape):
+    async def main():
+        async with Server(respond) as server:
+            return await scrape(server)
+    return asyncio.run(main())
+
+
+class SessionTest(unittest.TestCase):
+
+    def test_chunked(self):
+        async def respond(server, path, writer):
+            writer.write(chunked())
+            await writer.drain()
+            return True
+
+        async def scrape(server):
+            async with aio.Session() as session:
+                return await session.get_beans(server.url)
+        self.assertEqual(run(respond, scrape), BEANS)
+
+    def test_keep_alive(self):
+        async def respond(server, path, writer):
+            writer.write(content_length() if len(server.paths) % 2 else chunked())
+            await writer.drain()
+            return True
+
+        async def scrape(server):
+            async with aio.Session() as session:
+                results = [await session.get_beans(server.url, {'qry': 'Hadoop:*'}) for _ in range(3)]
+            return results, server.connections, server.paths
+        results, connections, paths = run(respond, scrape)
+        self.assertEqual(results, [BEANS] * 3)
+        self.assertEqual(connections, 1)
+        self.assertEqual(paths, ['/jmx?qry=Hadoop%3A%2A'] * 3)
+
+    def test_connection_close(self):
+        async def respond(server, path, writer):
+            writer.write(content_length(close=True))
+            await writer.drain()
+            return False
+
+        async def scrape(server):
+            async with aio.Session() as session:
+                results = [await session.get_beans(server.url) for _ in range(2)]
+            return results, server.connections
+        self.assertEqual(run(respond, scrape), ([BEANS] * 2, 2))
+
+    def test_retry_on_stale_connection(self):
+        # the response keeps the connection alive, but the server drops it when the next request comes,
+        # like after an idle timeout racing with the request.
+        async def respond(server, path, writer):
+            if 2 == len(server.paths):
+                return False
+            writer.write(content_length())
+            await writer.drain()
+            return True
+
+        async def scrape(server):
+            async with aio.Session() as session:
+                first = await session.get_beans(server.url)
+                second = await session.get_beans(server.url)
+            return first, second, server.connections, server.paths
+        self.assertEqual(run(respond, scrape), (BEANS, BEANS, 2, ['/jmx'] * 3))
+
+    def test_deadline(self):
+        # every read is within the timeout, the whole response is not within the deadline.
+        async def respond(server, path, writer):
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 1000\r\n\r\n')
+            for _ in range(100):
+                writer.write(b' ')
+                await writer.drain()
+                await asyncio.sleep(0.02)
+            return False
+
+        async def scrape(server):
+            async with aio.Session(timeout=1, deadline=0.3) as session:
+                start = asyncio.get_running_loop().time()
+                beans = await session.get_beans(server.url)
+                return beans, asyncio.get_running_loop().time() - start
+        beans, seconds = run(respond, scrape)
+        self.assertEqual(beans, [])
+        self.assertLess(seconds, 1)
+
+    def test_redirect(self):
+        async def respond(server, path, writer):
+            if path.startswith('/jmx'):
+                writer.write(b'HTTP/1.1 302 Found\r\nLocation: /metrics/jmx?qry=Hadoop%3A%2A\r\nContent-Length: 0\r\n\r\n')
+            else:
+                writer.write(content_length())
+            await writer.drain()
+            return True
+
+        async def scrape(server):
+            async with aio.Session() as session:
+                return await session.get_beans(server.url), server.paths
+        self.assertEqual(run(respond, scrape), (BEANS, ['/jmx', '/metrics/jmx?qry=Hadoop%3A%2A']))
+
+    def test_resolve_through_transport_cache(self):
+        async def respond(server, path, writer):
+            writer.write(content_length())
+            await writer.drain()
+            return True
+
+        async def scrape(server):
+            async with aio.Session() as session:
+                await session.get_beans(server.url)
+            return server.port
+        port = run(respond, scrape)
+        self.assertIn(('localhost', port), transport._dns_cache._cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+classifier.AttributeClassifier, on rules whose patterns overlap.
+Run from the repository root: python -m pytest test
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter.classifier import AttributeClassifier  # noqa: E402
+
+RULES = (
+    (r'Login(?P<state>Success|Failure)NumOps', 'Login', ('Login', '{state}')),
+    # also matches the attributes of the rule above, which comes first.
+    (r'(?P<method>\w+)NumOps', 'NumOps'),
+    (r'(?P<method>\w+)AvgTime', 'AvgTime'),
+    # also matches "...NumOps", which the second rule takes.
+    (r'(?P<method>\w+?)(?P<kind>Num)?Ops', 'Ops'),
+    (r'Get(?P<what>\w+)', lambda attribute: attribute.lower()),
+)
+
+
+class AttributeClassifierTest(unittest.TestCase):
+
+    def test_first_matching_rule_wins(self):
+        classifier = AttributeClassifier(RULES)
+        self.assertEqual([classifier.classify(attribute) for attribute in (
+            'LoginSuccessNumOps',
+            'LoginFailureNumOps',
+            'LoginSuccessAvgTime',
+            'GetBlockLocationsNumOps',
+            'GetBlockLocationsAvgTime',
+            'CreateFileOps',
+            'GetBlocks',
+            'Capacity-Total',
+        )], [
+            ('Login', ('Login', 'Success')),
+            ('Login', ('Login', 'Failure')),
+            ('AvgTime', ('LoginSuccess',)),
+            ('NumOps', ('GetBlockLocations',)),
+            ('AvgTime', ('GetBlockLocations',)),
+            # the optional group which did not match is an empty label value.
+            ('Ops', ('CreateFile', '')),
+            ('getblocks', ('Blocks',)),
+            ('Capacity-Total', ()),
+        ])
+
+    def test_rule_order(self):
+        # the same rules with the general NumOps rule first: it takes the Login attributes.
+        classifier = AttributeClassifier((RULES[1], RULES[0]) + RULES[2:])
+        self.assertEqual(classifier.classify('LoginSuccessNumOps'), ('NumOps', ('LoginSuccess',)))
+
+    def test_default(self):
+        self.assertEqual(AttributeClassifier(RULES, default=str.lower).classify('Capacity-Total'),
+                         ('capacity-total', ()))
+        self.assertIsNone(AttributeClassifier(RULES, default=None).classify('Capacity-Total'))
+
+    def test_memo(self):
+        classifier = AttributeClassifier(RULES)
+        first = classifier.classify('GetBlockLocationsNumOps')
+        self.assertIs(classifier.classify('GetBlockLocationsNumOps'), first)
+        classifier.MAX_ATTRIBUTES = 1
+        other = classifier.classify('CreateFileOps')
+        self.assertEqual(other, ('Ops', ('CreateFile', '')))
+        # the memo was dropped when it was full, the result is the same.
+        self.assertIsNot(classifier.classify('GetBlockLocationsNumOps'), first)
+        self.assertEqual(classifier.classify('GetBlockLocationsNumOps'), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
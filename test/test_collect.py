@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+collect() and collect_async() of the collectors, on the DataNode payload of test/datanode.
+Run from the repository root: python -m pytest test
+'''
+
+import asyncio
+import glob
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hadoop_exporter import HDFSDataNodeMetricCollector, exposition  # noqa: E402
+
+
+def load_beans(directory):
+    beans = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            doc = json.load(f)
+        if isinstance(doc, dict) and 'beans' in doc:
+            beans.extend(doc['beans'])
+        elif isinstance(doc, dict):
+            beans.append(doc)
+        else:
+            beans.extend(doc)
+    return beans
+
+
+BEANS = load_beans(os.path.join(ROOT, 'test', 'datanode'))
+with open(os.path.join(ROOT, 'test', 'datanode', 'hdfs_datanode.prom'), 'rb') as f:
+    EXPECTED = f.read()
+
+
+class AwaitingSession(object):
+    '''
+    A session whose requests really wait on the event loop, like aio.Session.
+    '''
+
+    async def get_metrics(self, url, queries=None, wanted=None):
+        await asyncio.sleep(0)
+        return BEANS
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(0)
+
+
+class AwaitingCollector(HDFSDataNodeMetricCollector):
+    '''
+    A collector whose _fetch_beans_async waits before fetching, e.g. a retry after a sleep.
+    '''
+
+    async def _fetch_beans_async(self, session):
+        await asyncio.sleep(0)
+        return await HDFSDataNodeMetricCollector._fetch_beans_async(self, session)
+
+
+def collector(cls=HDFSDataNodeMetricCollector):
+    c = cls('hadoop_cluster', 'http://127.0.0.1:9864/jmx')
+    c._fetch_beans = lambda: BEANS
+    return c
+
+
+class CollectTest(unittest.TestCase):
+
+    def test_collect(self):
+        self.assertEqual(exposition.render(collector().collect()), EXPECTED)
+
+    def test_collect_does_not_run_the_coroutines(self):
+        # collect() must not drive collect_async, whose awaits need an event loop.
+        self.assertEqual(exposition.render(collector(AwaitingCollector).collect()), EXPECTED)
+
+    def test_collect_in_event_loop(self):
+        async def scrape():
+            return exposition.render(collector(AwaitingCollector).collect())
+        self.assertEqual(asyncio.run(scrape()), EXPECTED)
+
+    def test_collect_async(self):
+        families = asyncio.run(collector(AwaitingCollector).collect_async(AwaitingSession()))
+        self.assertEqual(exposition.render(families), EXPECTED)
+
+    def test_collect_failed_fetch(self):
+        c = collector()
+
+        def fail():
+            raise ConnectionError('refused')
+        c._fetch_beans = fail
+        self.assertEqual(list(c.collect()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Bean names and routes: jmx.bean_key, jmx.BeanIndex and the _route of the collectors, unknown beans included.
+Run from the repository root: python -m pytest test
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter import HDFSDataNodeMetricCollector, HiveLlapDaemonMetricCollector, common, jmx  # noqa: E402
+
+
+class BeanKeyTest(unittest.TestCase):
+
+    def test_bean_key(self):
+        self.assertEqual(jmx.bean_key('Hadoop:service=HBase,name=RegionServer,sub=Regions'),
+                         jmx.BeanKey('Hadoop', 'HBase', 'RegionServer', 'Regions', None, ()))
+        self.assertEqual(jmx.bean_key('java.lang:type=GarbageCollector,name=G1 Young Generation'),
+                         jmx.BeanKey('java.lang', None, 'G1 Young Generation', None, 'GarbageCollector', ()))
+        self.assertEqual(jmx.bean_key('kafka.producer:type=producer-node-metrics,client-id=p1,node-id=node-1'),
+                         jmx.BeanKey('kafka.producer', None, None, None, 'producer-node-metrics',
+                                     (('client-id', 'p1'), ('node-id', 'node-1'))))
+
+    def test_longest_prefix(self):
+        candidates = ['FSNamesystem', 'FSNamesystemState']
+        self.assertEqual(jmx.longest_prefix('FSNamesystemState', candidates), 'FSNamesystemState')
+        self.assertEqual(jmx.longest_prefix('FSNamesystem', candidates), 'FSNamesystem')
+        self.assertIsNone(jmx.longest_prefix('NameNodeInfo', candidates))
+        self.assertIsNone(jmx.longest_prefix(None, candidates))
+
+
+class BeanIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.resolved = []
+
+        def resolve(key, name):
+            self.resolved.append(name)
+            if 'Both' == key.name:
+                return ['first', 'second']
+            return [key.name] if key.name in ('A', 'B') else []
+        self.index = jmx.BeanIndex(resolve)
+
+    def test_dispatch(self):
+        beans = [{'name': 'D:name=A'}, {'name': 'D:name=Unknown'}, {'name': 'D:name=Both'}, {'name': 'D:name=B'}]
+        self.assertEqual([(route, bean['name']) for route, bean in self.index.dispatch(beans)],
+                         [('A', 'D:name=A'), ('first', 'D:name=Both'), ('second', 'D:name=Both'), ('B', 'D:name=B')])
+
+    def test_unknown_routes_are_resolved_once(self):
+        for _ in range(3):
+            self.assertEqual(self.index.routes('D:name=Unknown'), ())
+            self.assertEqual(self.index.routes('D:name=A'), ('A',))
+        self.assertEqual(self.resolved, ['D:name=Unknown', 'D:name=A'])
+
+    def test_max_routes(self):
+        self.index.MAX_ROUTES = 2
+        for name in ('D:name=A', 'D:name=B', 'D:name=C', 'D:name=A'):
+            self.index.routes(name)
+        # the routes were dropped when the third name came, A is resolved again.
+        self.assertEqual(self.resolved, ['D:name=A', 'D:name=B', 'D:name=C', 'D:name=A'])
+
+
+class RouteTest(unittest.TestCase):
+
+    def test_common_route(self):
+        routes = dict((name, common._common_route(jmx.bean_key(name), name)) for name in (
+            'Hadoop:service=NameNode,name=JvmMetrics',
+            'java.lang:type=OperatingSystem',
+            'java.lang:type=Runtime',
+            'Hadoop:service=NameNode,name=UgiMetrics',
+            'Hadoop:service=NameNode,name=MetricsSystem,sub=Stats',
+            'Hadoop:service=NameNode,name=MetricsSystem,sub=Control',
+            'Hadoop:service=NameNode,name=RpcActivityForPort8020',
+            'Hadoop:service=NameNode,name=RpcDetailedActivityForPort8020',
+            'Hadoop:service=NameNode,name=FSNamesystem',
+            'java.lang:type=Memory',
+        ))
+        self.assertEqual(routes, {
+            'Hadoop:service=NameNode,name=JvmMetrics': ('JvmMetrics',),
+            'java.lang:type=OperatingSystem': ('OperatingSystem',),
+            'java.lang:type=Runtime': ('Runtime',),
+            'Hadoop:service=NameNode,name=UgiMetrics': ('UgiMetrics',),
+            'Hadoop:service=NameNode,name=MetricsSystem,sub=Stats': ('MetricsSystem',),
+            'Hadoop:service=NameNode,name=MetricsSystem,sub=Control': (),
+            'Hadoop:service=NameNode,name=RpcActivityForPort8020': ('RpcActivity',),
+            'Hadoop:service=NameNode,name=RpcDetailedActivityForPort8020': ('RpcDetailedActivity',),
+            'Hadoop:service=NameNode,name=FSNamesystem': (),
+            'java.lang:type=Memory': (),
+        })
+
+    def test_collector_route(self):
+        # the default route of the collectors: the metrics file whose name is the longest prefix of name=.
+        datanode = HDFSDataNodeMetricCollector('hadoop_cluster', 'http://127.0.0.1:9864/jmx')
+        llap = HiveLlapDaemonMetricCollector('hadoop_cluster', 'http://127.0.0.1:15002/jmx')
+        for collector, name, routes in (
+                (datanode, 'Hadoop:service=DataNode,name=DataNodeActivity-dn1-9866', ('DataNodeActivity',)),
+                (datanode, 'Hadoop:service=DataNode,name=FSDatasetState', ('FSDatasetState',)),
+                (datanode, 'Hadoop:service=DataNode,name=JvmMetrics', ()),
+                (datanode, 'Hadoop:service=DataNode,name=Unknown', ()),
+                (datanode, 'java.lang:type=Memory', ()),
+                (llap, 'Hadoop:service=LlapDaemon,name=LlapDaemonExecutorMetrics-llap1', ('LlapDaemonExecutorMetrics',)),
+                (llap, 'Hadoop:service=LlapDaemon,name=LlapDaemonJvmMetrics-llap1', ('LlapDaemonJvmMetrics',)),
+                (llap, 'Hadoop:service=LlapDaemon,name=LlapDaemonUnknown-llap1', ()),
+        ):
+            self.assertEqual(collector._index.routes(name), routes, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+memo.BeanMemo over polls of the same bean: a hit replays the samples, a changed bean is mapped again.
+Run from the repository root: python -m pytest test
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter.memo import BeanMemo  # noqa: E402
+from hadoop_exporter.samples import ColumnarFamily, FamilyHeader  # noqa: E402
+
+HEADERS = {
+    'Capacity': FamilyHeader('hadoop_hdfs_datanode_capacity', 'Capacity.', ['cluster', 'host']),
+    'Volumes': FamilyHeader('hadoop_hdfs_datanode_volume_failures', 'Failed volumes.', ['cluster', 'host', 'volume']),
+}
+
+
+def families():
+    return dict((key, ColumnarFamily(header)) for key, header in HEADERS.items())
+
+
+def samples(families):
+    return dict((key, list(zip(family.keys, family.values))) for key, family in families.items())
+
+
+class BeanMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.memo = BeanMemo()
+        self.mapped = []
+
+    def handler(self, families):
+        def handle(bean, host):
+            self.mapped.append(bean['Capacity'])
+            families['Capacity'].add_metric(['c1', host], bean['Capacity'])
+            for volume in bean['Volumes']:
+                families['Volumes'].add_metric(['c1', host, volume], 1)
+        return handle
+
+    def poll(self, bean, host='dn1'):
+        f = families()
+        # samples of another bean before this one, the memo only replays those of this bean.
+        f['Capacity'].add_metric(['c1', 'other'], -1)
+        self.memo.map(f, 'FSDatasetState', bean, self.handler(f), host)
+        self.memo.sweep()
+        return samples(f)
+
+    def test_hit_then_changed_bean(self):
+        bean = {'name': 'Hadoop:service=DataNode,name=FSDatasetState', 'Capacity': 100.0, 'Volumes': ['/d1']}
+        first = self.poll(bean)
+        self.assertEqual(first, {
+            'Capacity': [(('c1', 'other'), -1.0), (('c1', 'dn1'), 100.0)],
+            'Volumes': [(('c1', 'dn1', '/d1'), 1.0)],
+        })
+        # the same bean, decoded again: the samples are replayed without the handler.
+        self.assertEqual(self.poll(dict(bean, Volumes=['/d1'])), first)
+        self.assertEqual((self.memo.hits, self.memo.misses, self.mapped), (1, 1, [100.0]))
+        # a changed value and one more volume: mapped again.
+        changed = dict(bean, Capacity=90.0, Volumes=['/d1', '/d2'])
+        self.assertEqual(self.poll(changed), {
+            'Capacity': [(('c1', 'other'), -1.0), (('c1', 'dn1'), 90.0)],
+            'Volumes': [(('c1', 'dn1', '/d1'), 1.0), (('c1', 'dn1', '/d2'), 1.0)],
+        })
+        self.assertEqual((self.memo.hits, self.memo.misses, self.mapped), (1, 2, [100.0, 90.0]))
+        # then a hit of the changed bean, not of the first one.
+        self.assertEqual(self.poll(dict(changed))['Capacity'], [(('c1', 'other'), -1.0), (('c1', 'dn1'), 90.0)])
+        self.assertEqual((self.memo.hits, self.memo.misses), (2, 2))
+
+    def test_changed_args(self):
+        bean = {'name': 'Hadoop:service=DataNode,name=FSDatasetState', 'Capacity': 100.0, 'Volumes': []}
+        self.poll(bean)
+        self.assertEqual(self.poll(bean, host='dn2')['Capacity'], [(('c1', 'other'), -1.0), (('c1', 'dn2'), 100.0)])
+        self.assertEqual((self.memo.hits, self.memo.misses), (0, 2))
+
+    def test_swept_bean(self):
+        bean = {'name': 'Hadoop:service=DataNode,name=FSDatasetState', 'Capacity': 100.0, 'Volumes': []}
+        self.poll(bean)
+        # a poll without the bean forgets it.
+        self.memo.sweep()
+        self.poll(bean)
+        self.assertEqual((self.memo.hits, self.memo.misses), (0, 2))
+
+    def test_missing_family(self):
+        bean = {'name': 'Hadoop:service=DataNode,name=FSDatasetState', 'Capacity': 100.0, 'Volumes': ['/d1']}
+        self.poll(bean)
+        f = families()
+        f['Volumes'] = None
+        mapped = []
+        self.memo.map(f, 'FSDatasetState', bean, lambda bean, host: mapped.append(host), 'dn1')
+        # nothing replayed when a family of the segments is missing, the handler runs.
+        self.assertEqual((len(f['Capacity']), mapped), (0, ['dn1']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+The collectors cache of probe.Prober, with stand-in collectors which do not poll.
+Run from the repository root: python -m pytest test
+'''
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter.probe import Prober  # noqa: E402
+
+
+class Collector(object):
+    built = []
+
+    def __init__(self, cluster, url):
+        self.cluster = cluster
+        self.url = url
+        Collector.built.append(url)
+
+    def collect(self):
+        return iter([])
+
+
+class SlowCollector(Collector):
+    # set by the test: a collector is built once both probes are building one.
+    barrier = None
+
+    def __init__(self, cluster, url):
+        SlowCollector.barrier.wait(timeout=5)
+        Collector.__init__(self, cluster, url)
+
+
+def probe(prober, target, module='hdfs.datanode'):
+    return prober.probe({'target': [target], 'module': [module]})
+
+
+class ProberTest(unittest.TestCase):
+
+    def setUp(self):
+        Collector.built = []
+
+    def test_least_recently_probed_are_dropped(self):
+        prober = Prober({'hdfs': {'datanode': Collector}}, max_targets=2)
+        for target in ('dn1:9864', 'dn2:9864', 'dn1:9864', 'dn3:9864'):
+            probe(prober, target)
+        self.assertEqual(len(prober), 2)
+        self.assertEqual(list(prober._targets), [('hdfs.datanode', 'http://dn1:9864/jmx'),
+                                                 ('hdfs.datanode', 'http://dn3:9864/jmx')])
+        # dn2 was dropped, its next probe builds a collector again, and drops dn1.
+        probe(prober, 'dn2:9864')
+        self.assertEqual(Collector.built, ['http://dn1:9864/jmx', 'http://dn2:9864/jmx',
+                                           'http://dn3:9864/jmx', 'http://dn2:9864/jmx'])
+        self.assertEqual(list(prober._targets), [('hdfs.datanode', 'http://dn3:9864/jmx'),
+                                                 ('hdfs.datanode', 'http://dn2:9864/jmx')])
+
+    def test_idle_are_dropped(self):
+        prober = Prober({'hdfs': {'datanode': Collector}}, idle=0)
+        probe(prober, 'dn1:9864')
+        for target in prober._targets.values():
+            target.used -= 1
+        probe(prober, 'dn2:9864')
+        self.assertEqual(list(prober._targets), [('hdfs.datanode', 'http://dn2:9864/jmx')])
+
+    def test_first_probes_keep_one_collector(self):
+        # both probes build a collector out of the lock, the one inserted first is used by both.
+        SlowCollector.barrier = threading.Barrier(2)
+        prober = Prober({'hdfs': {'datanode': SlowCollector}})
+        entries = []
+
+        def first():
+            entries.append(prober._target('hdfs.datanode', 'http://dn1:9864/jmx', 'hadoop_cluster'))
+        threads = [threading.Thread(target=first) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(Collector.built, ['http://dn1:9864/jmx'] * 2)
+        self.assertIs(entries[0], entries[1])
+        self.assertEqual(len(prober), 1)
+
+    def test_build_does_not_hold_the_lock(self):
+        # a collector being built does not block the probes of the cached targets.
+        prober = Prober({'hdfs': {'datanode': Collector}})
+        probe(prober, 'dn1:9864')
+        building = threading.Event()
+        release = threading.Event()
+
+        class Blocked(Collector):
+            def __init__(self, cluster, url):
+                building.set()
+                release.wait(timeout=5)
+                Collector.__init__(self, cluster, url)
+        prober.modules['hdfs.blocked'] = Blocked
+        t = threading.Thread(target=probe, args=(prober, 'dn2:9864', 'hdfs.blocked'))
+        t.start()
+        try:
+            self.assertTrue(building.wait(timeout=5))
+            self.assertTrue(prober._lock.acquire(timeout=1))
+            prober._lock.release()
+            self.assertEqual(probe(prober, 'dn1:9864')[-2].samples[0].value, 0)
+        finally:
+            release.set()
+            t.join()
+        self.assertEqual(len(prober), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+scheduler.TargetGroup: the families of the targets of a module merged with an instance label.
+Run from the repository root: python -m pytest test
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prometheus_client.core import HistogramMetricFamily  # noqa: E402
+
+from hadoop_exporter import exposition, samples  # noqa: E402
+from hadoop_exporter.scheduler import EMPTY_SNAPSHOT, Snapshot, TargetGroup  # noqa: E402
+
+CAPACITY = samples.FamilyHeader('hadoop_hdfs_datanode_capacity', 'Capacity.', ['cluster', 'host'])
+UGI = samples.FamilyHeader('hadoop_hdfs_datanode_ugi_login', 'Logins.', ['cluster', 'method', 'state'])
+
+
+class Target(object):
+    '''
+    Stands for the SnapshotCollector of a target, poll() publishes the given families.
+    '''
+
+    def __init__(self):
+        self.snapshot = EMPTY_SNAPSHOT
+
+    def poll(self, timestamp, *families):
+        self.snapshot = Snapshot(tuple(samples.freeze(family) for family in families), timestamp, 0.5)
+
+
+def family(header, *series):
+    f = samples.ColumnarFamily(header)
+    for labels, value in series:
+        f.add_metric(labels, value)
+    return f
+
+
+class TargetGroupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.group = TargetGroup()
+        self.dn1, self.dn2 = Target(), Target()
+        self.group.add(self.dn1, 'dn1:9864')
+        self.group.add(self.dn2, 'dn2:9864')
+
+    def render(self):
+        return exposition.render(self.group.collect()).decode('utf-8')
+
+    def test_instance_label(self):
+        self.dn1.poll(10.0, family(CAPACITY, (['c1', 'dn1'], 100)))
+        self.dn2.poll(11.0, family(CAPACITY, (['c1', 'dn2'], 200)))
+        self.assertEqual(self.render(), (
+            '# HELP hadoop_hdfs_datanode_capacity Capacity.\n'
+            '# TYPE hadoop_hdfs_datanode_capacity gauge\n'
+            'hadoop_hdfs_datanode_capacity{cluster="c1",host="dn1",instance="dn1:9864"} 100.0\n'
+            'hadoop_hdfs_datanode_capacity{cluster="c1",host="dn2",instance="dn2:9864"} 200.0\n'))
+        self.assertEqual(self.group.snapshot.timestamp, 11.0)
+
+    def test_short_key_padded(self):
+        # a login without a state: the state is empty, the instance is not taken for the state.
+        self.dn1.poll(10.0, family(UGI, (['c1', 'Kerberos', 'success'], 3), (['c1', 'Simple'], 1)))
+        self.dn2.poll(10.0, family(UGI, (['c1', 'Simple'], 2)))
+        self.assertEqual([f.keys for f in self.group.collect()], [[
+            ('c1', 'Kerberos', 'success', 'dn1:9864'),
+            ('c1', 'Simple', '', 'dn1:9864'),
+            ('c1', 'Simple', '', 'dn2:9864'),
+        ]])
+        self.assertEqual(self.render(), (
+            '# HELP hadoop_hdfs_datanode_ugi_login Logins.\n'
+            '# TYPE hadoop_hdfs_datanode_ugi_login gauge\n'
+            'hadoop_hdfs_datanode_ugi_login{cluster="c1",instance="dn1:9864",method="Kerberos",state="success"} 3.0\n'
+            'hadoop_hdfs_datanode_ugi_login{cluster="c1",instance="dn1:9864",method="Simple",state=""} 1.0\n'
+            'hadoop_hdfs_datanode_ugi_login{cluster="c1",instance="dn2:9864",method="Simple",state=""} 2.0\n'))
+
+    def test_family_of_one_target(self):
+        self.dn1.poll(10.0, family(CAPACITY, (['c1', 'dn1'], 100)), family(UGI, (['c1', 'Simple', 'success'], 1)))
+        self.dn2.poll(10.0, family(CAPACITY, (['c1', 'dn2'], 200)))
+        self.assertEqual([(f.name, len(f)) for f in self.group.collect()],
+                         [('hadoop_hdfs_datanode_capacity', 2), ('hadoop_hdfs_datanode_ugi_login', 1)])
+
+    def test_rebuilt_after_a_poll(self):
+        self.dn1.poll(10.0, family(CAPACITY, (['c1', 'dn1'], 100)))
+        first = self.group.snapshot
+        self.assertIs(self.group.snapshot, first)
+        self.dn1.poll(20.0, family(CAPACITY, (['c1', 'dn1'], 90)))
+        self.assertIsNot(self.group.snapshot, first)
+        self.assertEqual(self.render(), (
+            '# HELP hadoop_hdfs_datanode_capacity Capacity.\n'
+            '# TYPE hadoop_hdfs_datanode_capacity gauge\n'
+            'hadoop_hdfs_datanode_capacity{cluster="c1",host="dn1",instance="dn1:9864"} 90.0\n'))
+
+    def test_remove(self):
+        self.dn1.poll(10.0, family(CAPACITY, (['c1', 'dn1'], 100)))
+        self.dn2.poll(10.0, family(CAPACITY, (['c1', 'dn2'], 200)))
+        self.group.remove(self.dn1)
+        self.assertEqual(len(self.group), 1)
+        self.assertEqual(self.render(), (
+            '# HELP hadoop_hdfs_datanode_capacity Capacity.\n'
+            '# TYPE hadoop_hdfs_datanode_capacity gauge\n'
+            'hadoop_hdfs_datanode_capacity{cluster="c1",host="dn2",instance="dn2:9864"} 200.0\n'))
+
+    def test_histogram(self):
+        def histogram(value):
+            h = HistogramMetricFamily('hadoop_rpc_latency_seconds', 'Latency.', labels=['cluster'])
+            h.add_metric(['c1'], [('1.0', value), ('+Inf', value)], value)
+            return h
+        self.dn1.poll(10.0, histogram(1))
+        self.dn2.poll(10.0, histogram(2))
+        self.assertEqual([(s.name, s.labels, s.value) for f in self.group.collect() for s in f.samples], [
+            ('hadoop_rpc_latency_seconds_bucket', {'cluster': 'c1', 'le': '1.0', 'instance': 'dn1:9864'}, 1),
+            ('hadoop_rpc_latency_seconds_bucket', {'cluster': 'c1', 'le': '+Inf', 'instance': 'dn1:9864'}, 1),
+            ('hadoop_rpc_latency_seconds_count', {'cluster': 'c1', 'instance': 'dn1:9864'}, 1),
+            ('hadoop_rpc_latency_seconds_sum', {'cluster': 'c1', 'instance': 'dn1:9864'}, 1),
+            ('hadoop_rpc_latency_seconds_bucket', {'cluster': 'c1', 'le': '1.0', 'instance': 'dn2:9864'}, 2),
+            ('hadoop_rpc_latency_seconds_bucket', {'cluster': 'c1', 'le': '+Inf', 'instance': 'dn2:9864'}, 2),
+            ('hadoop_rpc_latency_seconds_count', {'cluster': 'c1', 'instance': 'dn2:9864'}, 2),
+            ('hadoop_rpc_latency_seconds_sum', {'cluster': 'c1', 'instance': 'dn2:9864'}, 2),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
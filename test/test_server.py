@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Negotiation of the exposition format and of the compression of the responses: server.accepted_format and
+server.accepted_encoding.
+Run from the repository root: python -m pytest test
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hadoop_exporter import server  # noqa: E402
+
+PROTOBUF = 'application/vnd.google.protobuf;proto=io.prometheus.client.MetricFamily;encoding=delimited'
+
+
+class AcceptedFormatTest(unittest.TestCase):
+
+    def test_accepted_format(self):
+        for header, name in (
+                (None, 'text'),
+                ('', 'text'),
+                ('*/*', 'text'),
+                ('text/plain;version=0.0.4', 'text'),
+                # the Accept header of Prometheus with the protobuf scrape protocol first.
+                (PROTOBUF + ';q=0.6,application/openmetrics-text;version=1.0.0;q=0.5,'
+                 'text/plain;version=0.0.4;q=0.4,*/*;q=0.1', 'protobuf'),
+                ('application/openmetrics-text;version=1.0.0;q=0.5,text/plain;version=0.0.4;q=0.4', 'openmetrics'),
+                ('text/plain;q=0.5,application/openmetrics-text;q=0.9', 'openmetrics'),
+                # the first one wins between equal qualities.
+                ('text/plain,application/openmetrics-text', 'text'),
+                ('application/openmetrics-text,text/plain', 'openmetrics'),
+                # q=0 is not acceptable.
+                (PROTOBUF + ';q=0,text/plain;q=0.1', 'text'),
+                ('application/openmetrics-text;q=0', 'text'),
+                ('application/openmetrics-text;q=invalid', 'text'),
+                # only the delimited MetricFamily protobuf is served.
+                ('application/vnd.google.protobuf;proto=io.prometheus.client.MetricFamily;encoding=text,'
+                 'application/openmetrics-text;q=0.5', 'openmetrics'),
+                ('application/vnd.google.protobuf;encoding=delimited', 'text'),
+                ('Application/OpenMetrics-Text; Q=0.9, text/plain; q=0.8', 'openmetrics'),
+                ('application/vnd.google.protobuf; proto="io.prometheus.client.MetricFamily"; encoding="delimited"',
+                 'protobuf'),
+        ):
+            self.assertEqual(server.accepted_format(header), name, header)
+
+
+class AcceptedEncodingTest(unittest.TestCase):
+
+    def test_accepted_encoding(self):
+        for header, encoding in (
+                (None, None),
+                ('', None),
+                ('identity', None),
+                ('br', None),
+                ('gzip', 'gzip'),
+                ('GZIP', 'gzip'),
+                ('deflate', 'deflate'),
+                # gzip first between equal qualities, whatever the order of the header.
+                ('deflate, gzip', 'gzip'),
+                ('deflate;q=1, gzip;q=0.5', 'deflate'),
+                # q=0 is not acceptable.
+                ('gzip;q=0', None),
+                ('gzip;q=0, deflate', 'deflate'),
+                ('gzip;q=0, deflate;q=0', None),
+                # * stands for the encodings which are not listed.
+                ('*', 'gzip'),
+                ('*;q=0', None),
+                ('gzip;q=0, *', 'deflate'),
+                ('*;q=0, deflate;q=0.1', 'deflate'),
+                ('br, *;q=0.5, gzip;q=0.1', 'deflate'),
+        ):
+            self.assertEqual(server.accepted_encoding(header), encoding, header)
+
+
+if __name__ == '__main__':
+    unittest.main()